@@ -2,8 +2,9 @@
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from app.models.user import db
+from app.models.user import db, add_missing_columns
 from app.middleware.error import register_error_handlers
+from app.services import init_services
 
 
 def create_app(config_object="server.app.config.Config"):
@@ -19,9 +20,13 @@ def create_app(config_object="server.app.config.Config"):
     # Register error handlers
     register_error_handlers(app)
 
-    # Create all database tables
+    # Create all database tables, and columns added to existing ones since
     with app.app_context():
         db.create_all()
+        add_missing_columns()
+
+    # Connect to Docker, pre-pull execution images, set up git
+    init_services(app)
 
     # Register blueprints
     from app.api.auth import auth_bp
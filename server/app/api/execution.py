@@ -1,7 +1,16 @@
 # server/app/api/execution.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.services.executor_service import execute_code
+from app.services.executor_service import (
+    execute_code,
+    execute_batch,
+    stream_code,
+    submit_code,
+    get_execution_job,
+    get_execution_stats
+)
+from app.services.job_service import QueueFullError, JOB_COMPLETED, JOB_FAILED
+from app.utils.sse import format_events
 
 execution_bp = Blueprint('execution', __name__)
 
@@ -19,14 +28,115 @@ def run_code():
     language = data['language']
     code = data['code']
     input_data = data.get('input', '')
+    use_cache = bool(data.get('cache', False))
 
     try:
-        result = execute_code(user_id, language, code, input_data)
+        result = execute_code(user_id, language, code, input_data, use_cache=use_cache)
         return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 
+@execution_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def run_batch():
+    """Run one program against a list of inputs in a single sandbox"""
+    user_id = get_jwt_identity()
+    data = request.get_json()
+
+    # Validate required fields
+    if 'language' not in data or 'code' not in data or 'inputs' not in data:
+        return jsonify({'error': 'Language, code and inputs are required'}), 400
+
+    try:
+        result = execute_batch(
+            user_id,
+            data['language'],
+            data['code'],
+            data['inputs'],
+            parallelism=data.get('parallelism', 1),
+            time_budget=data.get('time_budget')
+        )
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@execution_bp.route('/stream', methods=['POST'])
+@jwt_required()
+def stream_run():
+    """Run code and stream stdout/stderr as server-sent events"""
+    user_id = get_jwt_identity()
+    data = request.get_json()
+
+    # Validate required fields
+    if 'language' not in data or 'code' not in data:
+        return jsonify({'error': 'Language and code are required'}), 400
+
+    try:
+        events = stream_code(user_id, data['language'], data['code'], data.get('input', ''))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return Response(
+        stream_with_context(format_events(events)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@execution_bp.route('/jobs', methods=['POST'])
+@jwt_required()
+def submit_job():
+    """Queue code for execution and return its execution ID immediately"""
+    user_id = get_jwt_identity()
+    data = request.get_json()
+
+    # Validate required fields
+    if 'language' not in data or 'code' not in data:
+        return jsonify({'error': 'Language and code are required'}), 400
+
+    try:
+        execution_id = submit_code(user_id, data['language'], data['code'], data.get('input', ''),
+                                   use_cache=bool(data.get('cache', False)))
+        return jsonify({'execution_id': execution_id, 'status': 'queued'}), 202
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@execution_bp.route('/jobs/<execution_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(execution_id):
+    """Poll the status of a queued execution"""
+    user_id = get_jwt_identity()
+    job = get_execution_job(user_id, execution_id)
+
+    if not job:
+        return jsonify({'error': 'Execution not found'}), 404
+
+    del job['result']
+    return jsonify(job), 200
+
+
+@execution_bp.route('/jobs/<execution_id>/result', methods=['GET'])
+@jwt_required()
+def get_job_result(execution_id):
+    """Get the result of a queued execution once it has finished"""
+    user_id = get_jwt_identity()
+    job = get_execution_job(user_id, execution_id)
+
+    if not job:
+        return jsonify({'error': 'Execution not found'}), 404
+    if job['status'] == JOB_FAILED:
+        return jsonify({'error': job['error']}), 400
+    if job['status'] != JOB_COMPLETED:
+        return jsonify({'execution_id': execution_id, 'status': job['status']}), 202
+
+    return jsonify(job['result']), 200
+
+
 @execution_bp.route('/languages', methods=['GET'])
 def list_languages():
     """Get a list of supported languages for code execution"""
@@ -37,4 +147,11 @@ def list_languages():
         # Add more supported languages as they become available
     ]
 
-    return jsonify(supported_languages), 200
\ No newline at end of file
+    return jsonify(supported_languages), 200
+
+
+@execution_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def execution_stats():
+    """Get execution subsystem counters such as container pool hits and misses"""
+    return jsonify(get_execution_stats()), 200
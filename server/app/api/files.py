@@ -1,21 +1,50 @@
 # server/app/api/files.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.storage_service import (
     list_files,
+    list_tree,
+    get_file_info,
+    get_file_source,
+    get_listing_etag,
+    search_files,
     create_file,
     read_file,
     update_file,
+    patch_file,
+    get_storage_stats,
+    get_dedup_stats,
+    bulk_operations,
     delete_file,
     create_directory,
     delete_directory,
-    ensure_user_path_exists
+    ensure_user_path_exists,
+    open_change_stream,
+    PreconditionFailedError
 )
+from app.services.archive_service import (
+    export_archive,
+    import_archive,
+    import_options,
+    download_headers,
+    get_archive_progress
+)
+from app.services.quota_service import QuotaExceededError, get_quota_tracker
+from app.utils.sse import format_events
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 files_bp = Blueprint('files', __name__)
 
+def _not_modified(etag):
+    """Return a 304 response if the request's If-None-Match covers etag, else None"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
 @files_bp.route('/list', methods=['GET'])
 @jwt_required()
 def get_files():
@@ -27,9 +56,17 @@ def get_files():
         
         # Ensure user's storage exists
         ensure_user_path_exists(user_id)
+
+        etag = get_listing_etag(user_id, path)
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
         
         result = list_files(user_id, path)
-        return jsonify(result), 200
+        response = jsonify(result)
+        if etag:
+            response.set_etag(etag)
+        return response, 200
     except ValueError as e:
         logger.error(f"Value error in get_files: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -37,6 +74,90 @@ def get_files():
         logger.error(f"Error in get_files: {str(e)}")
         return jsonify({'error': 'Failed to list files', 'message': str(e)}), 500
 
+@files_bp.route('/tree', methods=['GET'])
+@jwt_required()
+def get_tree():
+    """List a directory tree, several levels deep, in one response"""
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Listing tree for user {user_id}")
+        path = request.args.get('path', '')
+        ignore = request.args.get('ignore')
+        if ignore is not None:
+            ignore = ignore.split(',')
+
+        result = list_tree(
+            user_id,
+            path,
+            max_depth=request.args.get('depth', type=int),
+            ignore=ignore,
+            offset=request.args.get('offset', 0, type=int),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(result), 200
+    except ValueError as e:
+        logger.error(f"Value error in get_tree: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        logger.error(f"Directory not found in get_tree: {str(e)}")
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in get_tree: {str(e)}")
+        return jsonify({'error': 'Failed to list tree', 'message': str(e)}), 500
+
+@files_bp.route('/info', methods=['GET'])
+@jwt_required()
+def get_info():
+    """Get metadata for a file or directory"""
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Getting file info for user {user_id}")
+        path = request.args.get('path')
+
+        if not path:
+            return jsonify({'error': 'File path is required'}), 400
+
+        result = get_file_info(user_id, path)
+        return jsonify(result), 200
+    except ValueError as e:
+        logger.error(f"Value error in get_info: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        logger.error(f"File not found in get_info: {str(e)}")
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in get_info: {str(e)}")
+        return jsonify({'error': 'Failed to get file info', 'message': str(e)}), 500
+
+@files_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search():
+    """Search file contents"""
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Searching files for user {user_id}")
+        query = request.args.get('q', '')
+
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+
+        result = search_files(
+            user_id,
+            query,
+            regex=request.args.get('regex', 'false').lower() == 'true',
+            case_sensitive=request.args.get('case_sensitive', 'false').lower() == 'true',
+            glob=request.args.get('glob') or None,
+            limit=request.args.get('limit', type=int),
+            context=request.args.get('context', 0, type=int)
+        )
+        return jsonify(result), 200
+    except ValueError as e:
+        logger.error(f"Value error in search: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in search: {str(e)}")
+        return jsonify({'error': 'Failed to search files', 'message': str(e)}), 500
+
 @files_bp.route('/file', methods=['POST'])
 @jwt_required()
 def create_new_file():
@@ -58,6 +179,9 @@ def create_new_file():
         
         result = create_file(user_id, directory, name, content)
         return jsonify(result), 201
+    except QuotaExceededError as e:
+        logger.error(f"Quota exceeded in create_new_file: {str(e)}")
+        return jsonify({'error': str(e)}), 507
     except ValueError as e:
         logger.error(f"Value error in create_new_file: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -77,8 +201,21 @@ def update_existing_file():
         if not data or 'path' not in data or 'content' not in data:
             return jsonify({'error': 'File path and content are required'}), 400
         
-        result = update_file(user_id, data['path'], data['content'])
-        return jsonify(result), 200
+        if_match = None
+        if 'If-Match' in request.headers:
+            if_match = ['*'] if request.if_match.star_tag else list(request.if_match)
+
+        result = update_file(user_id, data['path'], data['content'], if_match=if_match)
+        response = jsonify(result)
+        if result['etag']:
+            response.set_etag(result['etag'])
+        return response, 202 if result.get('buffered') else 200
+    except PreconditionFailedError as e:
+        logger.error(f"Precondition failed in update_existing_file: {str(e)}")
+        return jsonify({'error': str(e)}), 412
+    except QuotaExceededError as e:
+        logger.error(f"Quota exceeded in update_existing_file: {str(e)}")
+        return jsonify({'error': str(e)}), 507
     except ValueError as e:
         logger.error(f"Value error in update_existing_file: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -89,10 +226,83 @@ def update_existing_file():
         logger.error(f"Error in update_existing_file: {str(e)}")
         return jsonify({'error': 'Failed to update file', 'message': str(e)}), 500
 
+@files_bp.route('/file', methods=['PATCH'])
+@jwt_required()
+def patch_existing_file():
+    """
+    Apply edits or a unified diff to a file
+    The base ETag comes from base_etag in the body or the If-Match header;
+    a file that changed since then is left alone and 412 is returned.
+    """
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Patching file for user {user_id}")
+        data = request.get_json()
+
+        if not data or 'path' not in data:
+            return jsonify({'error': 'File path is required'}), 400
+
+        base_etag = data.get('base_etag')
+        if not base_etag and request.if_match:
+            base_etag = next(iter(request.if_match), None)
+
+        result = patch_file(user_id, data['path'], base_etag,
+                            edits=data.get('edits'), diff=data.get('diff'))
+        response = jsonify(result)
+        response.set_etag(result['etag'])
+        return response, 200
+    except PreconditionFailedError as e:
+        logger.error(f"Precondition failed in patch_existing_file: {str(e)}")
+        return jsonify({'error': str(e)}), 412
+    except QuotaExceededError as e:
+        logger.error(f"Quota exceeded in patch_existing_file: {str(e)}")
+        return jsonify({'error': str(e)}), 507
+    except ValueError as e:
+        logger.error(f"Value error in patch_existing_file: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        logger.error(f"File not found in patch_existing_file: {str(e)}")
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in patch_existing_file: {str(e)}")
+        return jsonify({'error': 'Failed to patch file', 'message': str(e)}), 500
+
+@files_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def run_bulk_operations():
+    """
+    Run several create/update/delete/mkdir/move/copy operations in order
+    Per-operation results come back in one response. With atomic=true a
+    failure rolls back the operations already applied and returns 409.
+    """
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Running bulk file operations for user {user_id}")
+        data = request.get_json()
+
+        if not data or 'operations' not in data:
+            return jsonify({'error': 'Operations are required'}), 400
+
+        result = bulk_operations(user_id, data['operations'], atomic=bool(data.get('atomic', False)))
+        return jsonify(result), 409 if result['rolled_back'] else 200
+    except ValueError as e:
+        logger.error(f"Value error in run_bulk_operations: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in run_bulk_operations: {str(e)}")
+        return jsonify({'error': 'Failed to run bulk operations', 'message': str(e)}), 500
+
 @files_bp.route('/file', methods=['GET'])
 @jwt_required()
 def get_file_content():
-    """Get file content"""
+    """
+    Get file content
+    Text comes back as JSON, optionally limited to a byte range (offset,
+    length) or line range (start_line, end_line). Binary files, files too
+    large to return whole, raw=true and requests with a Range header are
+    streamed as-is instead, with Range answered by 206 Partial Content.
+    Every response carries an ETag and If-None-Match is answered with 304.
+    """
     try:
         user_id = get_jwt_identity()
         logger.debug(f"Getting file content for user {user_id}")
@@ -100,9 +310,30 @@ def get_file_content():
         
         if not path:
             return jsonify({'error': 'File path is required'}), 400
-        
-        result = read_file(user_id, path)
-        return jsonify(result), 200
+
+        ranged = any(request.args.get(name) is not None
+                     for name in ('offset', 'length', 'start_line', 'end_line'))
+        source = get_file_source(user_id, path)
+        not_modified = _not_modified(source['etag'])
+        if not_modified:
+            return not_modified
+        too_large = source['size'] > current_app.config.get('FILE_READ_MAX_BYTES', 2 * 1024 * 1024)
+        if (request.args.get('raw', 'false').lower() == 'true' or request.range is not None
+                or source['binary'] or (too_large and not ranged)):
+            return send_file(source['full_path'], mimetype=source['mime'], conditional=True,
+                             etag=source['etag'], download_name=os.path.basename(path))
+
+        result = read_file(
+            user_id,
+            path,
+            offset=request.args.get('offset', type=int),
+            length=request.args.get('length', type=int),
+            start_line=request.args.get('start_line', type=int),
+            end_line=request.args.get('end_line', type=int)
+        )
+        response = jsonify(result)
+        response.set_etag(result['etag'])
+        return response, 200
     except ValueError as e:
         logger.error(f"Value error in get_file_content: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -154,6 +385,9 @@ def create_new_directory():
         
         result = create_directory(user_id, parent_path, name)
         return jsonify(result), 201
+    except QuotaExceededError as e:
+        logger.error(f"Quota exceeded in create_new_directory: {str(e)}")
+        return jsonify({'error': str(e)}), 507
     except ValueError as e:
         logger.error(f"Value error in create_new_directory: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -183,4 +417,119 @@ def delete_existing_directory():
         return jsonify({'error': str(e)}), 404
     except Exception as e:
         logger.error(f"Error in delete_existing_directory: {str(e)}")
-        return jsonify({'error': 'Failed to delete directory', 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to delete directory', 'message': str(e)}), 500
+
+@files_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def storage_stats():
+    """Get storage subsystem counters such as bytes saved by patch-based saves"""
+    return jsonify(get_storage_stats()), 200
+
+@files_bp.route('/quota', methods=['GET'])
+@jwt_required()
+def storage_quota():
+    """Get the user's storage usage and quota, with a per-project breakdown"""
+    try:
+        tracker = get_quota_tracker()
+        if tracker is None:
+            return jsonify({'error': 'Storage quotas are disabled'}), 404
+        return jsonify(tracker.usage(get_jwt_identity())), 200
+    except Exception as e:
+        logger.error(f"Error in storage_quota: {str(e)}")
+        return jsonify({'error': 'Failed to get storage quota', 'message': str(e)}), 500
+
+@files_bp.route('/dedup', methods=['GET'])
+@jwt_required()
+def dedup_stats():
+    """Get how much of the user's storage is deduplicated against other files"""
+    try:
+        stats = get_dedup_stats(get_jwt_identity())
+        if stats is None:
+            return jsonify({'error': 'The blob store is disabled'}), 404
+        return jsonify(stats), 200
+    except Exception as e:
+        logger.error(f"Error in dedup_stats: {str(e)}")
+        return jsonify({'error': 'Failed to get dedup stats', 'message': str(e)}), 500
+
+@files_bp.route('/watch', methods=['GET'])
+@jwt_required()
+def watch_changes():
+    """Stream batches of changes at or below a path as server-sent events"""
+    try:
+        user_id = get_jwt_identity()
+        stream = open_change_stream(user_id, request.args.get('path', ''))
+        if stream is None:
+            return jsonify({'error': 'The file watcher is disabled'}), 404
+    except ValueError as e:
+        logger.error(f"Value error in watch_changes: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in watch_changes: {str(e)}")
+        return jsonify({'error': 'Failed to watch for changes', 'message': str(e)}), 500
+
+    return Response(
+        stream_with_context(format_events(stream.events())),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@files_bp.route('/archive', methods=['GET'])
+@jwt_required()
+def download_archive():
+    """Stream a directory out as a zip or tar.gz archive"""
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Downloading archive for user {user_id}")
+        result = export_archive(
+            user_id,
+            request.args.get('path', ''),
+            request.args.get('format', 'zip'),
+            progress_id=request.args.get('progress_id')
+        )
+        return _archive_response(result)
+    except ValueError as e:
+        logger.error(f"Value error in download_archive: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        logger.error(f"Directory not found in download_archive: {str(e)}")
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in download_archive: {str(e)}")
+        return jsonify({'error': 'Failed to create archive', 'message': str(e)}), 500
+
+@files_bp.route('/archive', methods=['POST'])
+@jwt_required()
+def upload_archive():
+    """
+    Extract an archive sent as the raw request body into a directory
+    format is zip or tar.gz, detected from the data if omitted; pass a
+    progress_id to poll /archive/progress/<progress_id> while uploading.
+    """
+    try:
+        user_id = get_jwt_identity()
+        logger.debug(f"Uploading archive for user {user_id}")
+        result = import_archive(user_id, request.args.get('path', ''), request.stream,
+                                content_length=request.content_length, **import_options(request.args))
+        return jsonify(result), 201
+    except QuotaExceededError as e:
+        logger.error(f"Quota exceeded in upload_archive: {str(e)}")
+        return jsonify({'error': str(e)}), 507
+    except ValueError as e:
+        logger.error(f"Value error in upload_archive: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in upload_archive: {str(e)}")
+        return jsonify({'error': 'Failed to extract archive', 'message': str(e)}), 500
+
+@files_bp.route('/archive/progress/<progress_id>', methods=['GET'])
+@jwt_required()
+def archive_progress(progress_id):
+    """Get the progress of a running or recently finished archive transfer"""
+    progress = get_archive_progress().get(get_jwt_identity(), progress_id)
+    if progress is None:
+        return jsonify({'error': 'Progress not found'}), 404
+    return jsonify(progress), 200
+
+def _archive_response(result):
+    """Wrap an export_archive result in a streaming download response"""
+    return Response(result['stream'], mimetype=result['mimetype'], headers=download_headers(result))
@@ -10,8 +10,10 @@ from app.services.git_service import (
     git_push,
     git_pull,
     git_branch,
-    git_checkout
+    git_checkout,
+    get_git_stats
 )
+from app.services.quota_service import QuotaExceededError
 
 git_bp = Blueprint('git', __name__)
 
@@ -28,6 +30,10 @@ def initialize_repo():
     try:
         result = git_init(user_id, data['path'])
         return jsonify(result), 200
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -44,6 +50,10 @@ def clone_repo():
     try:
         result = git_clone(user_id, data['url'], data['path'])
         return jsonify(result), 200
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -60,6 +70,8 @@ def get_status():
     try:
         result = git_status(user_id, path)
         return jsonify(result), 200
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -76,6 +88,10 @@ def add_files():
     try:
         result = git_add(user_id, data['path'], data['files'])
         return jsonify(result), 200
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -92,6 +108,10 @@ def commit_changes():
     try:
         result = git_commit(user_id, data['path'], data['message'])
         return jsonify(result), 200
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -110,6 +130,8 @@ def push_changes():
     try:
         result = git_push(user_id, data['path'], branch)
         return jsonify(result), 200
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -128,6 +150,10 @@ def pull_changes():
     try:
         result = git_pull(user_id, data['path'], branch)
         return jsonify(result), 200
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -144,6 +170,8 @@ def list_branches():
     try:
         result = git_branch(user_id, path)
         return jsonify(result), 200
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -162,5 +190,16 @@ def checkout_branch():
     try:
         result = git_checkout(user_id, data['path'], data['branch'], create)
         return jsonify(result), 200
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except TimeoutError:
+        return jsonify({'error': 'Repository is busy, try again shortly'}), 409
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+        return jsonify({'error': str(e)}), 400
+
+
+@git_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def git_stats():
+    """Get repository handle cache and lock counters"""
+    return jsonify(get_git_stats()), 200
@@ -1,5 +1,5 @@
 # server/app/api/projects.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.project import Project
 from app.models.user import db
@@ -7,6 +7,8 @@ from app.services.storage_service import (
     create_directory,
     ensure_user_path_exists
 )
+from app.services.archive_service import export_archive, import_archive, import_options, download_headers
+from app.services.quota_service import QuotaExceededError, get_quota_tracker
 
 projects_bp = Blueprint('projects', __name__)
 
@@ -119,4 +121,63 @@ def delete_project(project_id):
     db.session.delete(project)
     db.session.commit()
 
-    return jsonify({'message': 'Project deleted successfully'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Project deleted successfully'}), 200
+
+
+@projects_bp.route('/<int:project_id>/archive', methods=['GET'])
+@jwt_required()
+def download_project_archive(project_id):
+    """Stream a project's files out as a zip or tar.gz archive"""
+    user_id = get_jwt_identity()
+    project = Project.query.filter_by(id=project_id, user_id=user_id).first()
+
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+
+    try:
+        result = export_archive(user_id, project.path, request.args.get('format', 'zip'),
+                                progress_id=request.args.get('progress_id'))
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return Response(result['stream'], mimetype=result['mimetype'], headers=download_headers(result))
+
+
+@projects_bp.route('/<int:project_id>/archive', methods=['POST'])
+@jwt_required()
+def upload_project_archive(project_id):
+    """Extract an archive sent as the raw request body into a project"""
+    user_id = get_jwt_identity()
+    project = Project.query.filter_by(id=project_id, user_id=user_id).first()
+
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+
+    try:
+        result = import_archive(user_id, project.path, request.stream,
+                                content_length=request.content_length, **import_options(request.args))
+    except QuotaExceededError as e:
+        return jsonify({'error': str(e)}), 507
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to extract archive: {str(e)}'}), 500
+
+    return jsonify(result), 201
+
+
+@projects_bp.route('/<int:project_id>/quota', methods=['GET'])
+@jwt_required()
+def get_project_quota(project_id):
+    """Get a project's storage usage and quota"""
+    user_id = get_jwt_identity()
+    project = Project.query.filter_by(id=project_id, user_id=user_id).first()
+
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+
+    tracker = get_quota_tracker()
+    if tracker is None:
+        return jsonify({'error': 'Storage quotas are disabled'}), 404
+
+    return jsonify(tracker.project_usage(user_id, project.path)), 200
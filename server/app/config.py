@@ -16,6 +16,159 @@ class Config:
     USER_CODE_DIR = os.getenv("USER_CODE_DIR", str(PROJECT_ROOT / "user_code"))
     STORAGE_PATH = os.getenv("STORAGE_PATH", str(PROJECT_ROOT / "storage"))
 
+    # Workspace metadata index (directory listings cached per user, revalidated by directory mtime)
+    WORKSPACE_INDEX_ENABLED = os.getenv("WORKSPACE_INDEX_ENABLED", "true").lower() == "true"
+    WORKSPACE_INDEX_MAX_WORKSPACES = int(os.getenv("WORKSPACE_INDEX_MAX_WORKSPACES", 64))
+    WORKSPACE_INDEX_MAX_DIRECTORIES = int(os.getenv("WORKSPACE_INDEX_MAX_DIRECTORIES", 5000))  # per workspace
+
+    # Full-text search (trigram index per workspace, stored outside user storage)
+    SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", str(PROJECT_ROOT / "search_index"))
+    SEARCH_MAX_OPEN_INDEXES = int(os.getenv("SEARCH_MAX_OPEN_INDEXES", 32))
+    SEARCH_MAX_FILE_BYTES = int(os.getenv("SEARCH_MAX_FILE_BYTES", 1024 * 1024))  # larger files are not indexed
+    SEARCH_INDEX_REFRESH_INTERVAL = int(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", 300))  # seconds between rescans
+    SEARCH_MAX_QUERY_LENGTH = int(os.getenv("SEARCH_MAX_QUERY_LENGTH", 1000))
+    SEARCH_MAX_PATTERN_LENGTH = int(os.getenv("SEARCH_MAX_PATTERN_LENGTH", 200))  # regex queries
+    SEARCH_MAX_LINE_LENGTH = int(os.getenv("SEARCH_MAX_LINE_LENGTH", 4096))  # characters per line a regex sees
+    SEARCH_REGEX_WORKERS = int(os.getenv("SEARCH_REGEX_WORKERS", 2))  # killable regex processes; 0 runs regexes in-request
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 500))
+    SEARCH_MAX_CONTEXT = int(os.getenv("SEARCH_MAX_CONTEXT", 5))  # lines around each match
+    SEARCH_TIME_BUDGET = float(os.getenv("SEARCH_TIME_BUDGET", 2.0))  # seconds spent confirming matches
+
+    # File reads
+    FILE_READ_MAX_BYTES = int(os.getenv("FILE_READ_MAX_BYTES", 2 * 1024 * 1024))  # larger files are paged or streamed raw
+    FILE_READ_MAX_LINES = int(os.getenv("FILE_READ_MAX_LINES", 10000))  # per line-range read
+
+    # Write coalescing (autosaves of one file within the delay become one disk write)
+    FILE_WRITE_COALESCE_ENABLED = os.getenv("FILE_WRITE_COALESCE_ENABLED", "false").lower() == "true"
+    FILE_WRITE_COALESCE_DELAY = float(os.getenv("FILE_WRITE_COALESCE_DELAY", 0.5))  # seconds a save is held
+    FILE_WRITE_COALESCE_MAX_DELAY = float(os.getenv("FILE_WRITE_COALESCE_MAX_DELAY", 2.0))  # cap while saves keep coming
+
+    # Bulk file operations
+    BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", 1000))  # per request
+
+    # Archive upload and download
+    ARCHIVE_MAX_ENTRIES = int(os.getenv("ARCHIVE_MAX_ENTRIES", 20000))
+    ARCHIVE_MAX_BYTES = int(os.getenv("ARCHIVE_MAX_BYTES", 1024 * 1024 * 1024))  # uncompressed total
+    ARCHIVE_MAX_UPLOAD_BYTES = int(os.getenv("ARCHIVE_MAX_UPLOAD_BYTES", 512 * 1024 * 1024))  # compressed upload
+    ARCHIVE_PROGRESS_TTL = int(os.getenv("ARCHIVE_PROGRESS_TTL", 600))  # seconds finished progress is kept
+
+    # Storage quotas, off unless enabled; a limit of 0 means unlimited. Usage is measured
+    # from disk when the tracker starts, so users already over a limit only lose writes that add more
+    QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "false").lower() == "true"
+    QUOTA_MAX_BYTES = int(os.getenv("QUOTA_MAX_BYTES", 1024 * 1024 * 1024))  # per user
+    QUOTA_MAX_INODES = int(os.getenv("QUOTA_MAX_INODES", 100000))  # files and directories per user
+    QUOTA_PROJECT_MAX_BYTES = int(os.getenv("QUOTA_PROJECT_MAX_BYTES", 0))  # per project
+    QUOTA_PROJECT_MAX_INODES = int(os.getenv("QUOTA_PROJECT_MAX_INODES", 0))
+    QUOTA_RECONCILE_INTERVAL = int(os.getenv("QUOTA_RECONCILE_INTERVAL", 3600))  # seconds between rescans
+
+    # Content-addressed blob store; user files become hard links to shared blobs
+    BLOB_STORE_ENABLED = os.getenv("BLOB_STORE_ENABLED", "false").lower() == "true"
+    BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR")  # defaults to STORAGE_PATH/.blobs; must be on the same filesystem
+    BLOB_STORE_MIN_BYTES = int(os.getenv("BLOB_STORE_MIN_BYTES", 1024))  # smaller files are written as plain files
+    BLOB_STORE_GC_INTERVAL = int(os.getenv("BLOB_STORE_GC_INTERVAL", 3600))  # seconds between unreferenced blob sweeps
+
+    # Cold file tier; files untouched for COLD_TIER_AFTER seconds are compressed in place
+    COLD_TIER_ENABLED = os.getenv("COLD_TIER_ENABLED", "false").lower() == "true"
+    COLD_TIER_AFTER = int(os.getenv("COLD_TIER_AFTER", 30 * 24 * 3600))  # seconds since last access or change
+    COLD_TIER_CODEC = os.getenv("COLD_TIER_CODEC", "gzip")  # gzip, or zstd if the zstandard package is installed
+    COLD_TIER_LEVEL = int(os.getenv("COLD_TIER_LEVEL", 6))
+    COLD_TIER_MIN_BYTES = int(os.getenv("COLD_TIER_MIN_BYTES", 4096))  # smaller files are left alone
+    COLD_TIER_INTERVAL = int(os.getenv("COLD_TIER_INTERVAL", 3600))  # seconds between passes
+    COLD_TIER_DB = os.getenv("COLD_TIER_DB")  # defaults to STORAGE_PATH/.cold/manifest.sqlite3
+
+    # File watcher (batched change events pushed to open explorers over /api/files/watch)
+    FILE_WATCHER_ENABLED = os.getenv("FILE_WATCHER_ENABLED", "true").lower() == "true"
+    FILE_WATCHER_BACKEND = os.getenv("FILE_WATCHER_BACKEND", "auto")  # auto (inotify via watchdog if installed), watchdog or polling
+    FILE_WATCHER_DEBOUNCE = float(os.getenv("FILE_WATCHER_DEBOUNCE", 0.2))  # seconds of quiet before a batch is sent
+    FILE_WATCHER_MAX_DELAY = float(os.getenv("FILE_WATCHER_MAX_DELAY", 1.0))  # longest a change is held back
+    FILE_WATCHER_POLL_INTERVAL = float(os.getenv("FILE_WATCHER_POLL_INTERVAL", 2.0))  # seconds between rescans when polling
+    FILE_WATCHER_POLL_MAX_ENTRIES = int(os.getenv("FILE_WATCHER_POLL_MAX_ENTRIES", 50000))  # per workspace scan
+    FILE_WATCHER_IDLE_TIMEOUT = int(os.getenv("FILE_WATCHER_IDLE_TIMEOUT", 300))  # seconds a workspace is watched with no stream open
+    FILE_WATCHER_MAX_STREAMS = int(os.getenv("FILE_WATCHER_MAX_STREAMS", 8))  # per user; opening another closes the oldest
+    FILE_WATCHER_HEARTBEAT = int(os.getenv("FILE_WATCHER_HEARTBEAT", 15))  # seconds between keep-alive events
+
+    # Git repository handles (reused between requests along with their git cat-file helper processes)
+    GIT_REPO_CACHE_ENABLED = os.getenv("GIT_REPO_CACHE_ENABLED", "true").lower() == "true"
+    GIT_REPO_CACHE_MAX = int(os.getenv("GIT_REPO_CACHE_MAX", 32))  # idle handles kept across all repositories
+    GIT_REPO_CACHE_IDLE_TIMEOUT = int(os.getenv("GIT_REPO_CACHE_IDLE_TIMEOUT", 300))  # seconds before an idle handle is closed
+    GIT_LOCK_TIMEOUT = float(os.getenv("GIT_LOCK_TIMEOUT", 30))  # seconds to wait for another operation on the same repository
+
+    # Git status (one porcelain run per status, cached until the repository or its work tree changes)
+    GIT_STATUS_CACHE_ENABLED = os.getenv("GIT_STATUS_CACHE_ENABLED", "true").lower() == "true"
+    GIT_STATUS_CACHE_TTL = float(os.getenv("GIT_STATUS_CACHE_TTL", 2.0))  # seconds a result is trusted in an unwatched workspace
+    GIT_STATUS_CACHE_WATCHED_MAX_AGE = float(os.getenv("GIT_STATUS_CACHE_WATCHED_MAX_AGE", 60.0))  # when the file watcher reports changes
+    GIT_STATUS_CACHE_MAX = int(os.getenv("GIT_STATUS_CACHE_MAX", 256))  # repositories
+    GIT_STATUS_TIMEOUT = int(os.getenv("GIT_STATUS_TIMEOUT", 60))  # seconds
+
+    # File tree listing
+    FILE_TREE_MAX_DEPTH = int(os.getenv("FILE_TREE_MAX_DEPTH", 8))
+    FILE_TREE_PAGE_SIZE = int(os.getenv("FILE_TREE_PAGE_SIZE", 500))  # children listed per directory
+    FILE_TREE_MAX_ENTRIES = int(os.getenv("FILE_TREE_MAX_ENTRIES", 10000))  # entries per response
+    FILE_TREE_IGNORE = os.getenv("FILE_TREE_IGNORE", ".git,node_modules,__pycache__").split(",")
+
+    # Code execution
+    # Engine that runs code: docker (isolated containers) or local (host processes, trusted/dev only)
+    EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "docker")
+    LOCAL_EXECUTION_ROOT = os.getenv("LOCAL_EXECUTION_ROOT")  # scratch directory parent, system temp if unset
+    LOCAL_EXECUTION_ALIASES = {}  # command -> host binary, e.g. {"python": "/usr/bin/python3"}
+    EXECUTION_TIMEOUT = int(os.getenv("EXECUTION_TIMEOUT", 30))  # seconds
+    EXECUTION_STREAM_MAX_BYTES = int(os.getenv("EXECUTION_STREAM_MAX_BYTES", 1024 * 1024))
+    # Execution limits: defaults, then per-language and per-tier overrides
+    EXECUTION_LIMITS = {
+        "memory": os.getenv("EXECUTION_MEMORY_LIMIT", "128m"),
+        "memory_swap": os.getenv("EXECUTION_MEMORY_SWAP_LIMIT", "256m"),
+        "cpus": float(os.getenv("EXECUTION_CPU_LIMIT", 0.5)),
+        "pids": int(os.getenv("EXECUTION_PIDS_LIMIT", 64))
+    }
+    EXECUTION_LANGUAGE_LIMITS = {
+        "java": {"memory": "256m", "memory_swap": "512m"}
+    }
+    EXECUTION_TIER_LIMITS = {
+        "free": {},
+        "pro": {"memory": "512m", "memory_swap": "1g", "cpus": 1.0, "timeout": 60}
+    }
+    EXECUTION_ACCOUNTING_ENABLED = os.getenv("EXECUTION_ACCOUNTING_ENABLED", "true").lower() == "true"  # false skips the docker stats calls each run makes
+    EXECUTION_STATS_INTERVAL = float(os.getenv("EXECUTION_STATS_INTERVAL", 0.25))  # seconds between samples
+
+    # How code and input reach /code: bind (host temp dir), archive (put_archive) or stdin (tar into tmpfs)
+    EXECUTION_INJECTION_MODE = os.getenv("EXECUTION_INJECTION_MODE", "archive")
+
+    # Batch execution (one program, many inputs)
+    BATCH_MAX_CASES = int(os.getenv("BATCH_MAX_CASES", 100))
+    BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", 4))
+    BATCH_TIME_BUDGET = int(os.getenv("BATCH_TIME_BUDGET", 60))  # seconds for the whole batch
+
+    # Java compile cache
+    JAVA_COMPILE_CACHE_ENABLED = os.getenv("JAVA_COMPILE_CACHE_ENABLED", "true").lower() == "true"
+    JAVA_COMPILE_CACHE_DIR = os.getenv("JAVA_COMPILE_CACHE_DIR", str(PROJECT_ROOT / "compile_cache"))
+    JAVA_COMPILE_CACHE_MAX_BYTES = int(os.getenv("JAVA_COMPILE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+    # Result cache for identical (language, code, input) runs; clients opt in per request
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 300))  # seconds
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1000))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+    # Asynchronous execution jobs
+    EXECUTION_MAX_WORKERS = int(os.getenv("EXECUTION_MAX_WORKERS", 4))  # concurrent runs overall
+    EXECUTION_MAX_JOBS_PER_USER = int(os.getenv("EXECUTION_MAX_JOBS_PER_USER", 2))  # concurrent runs per user
+    EXECUTION_MAX_QUEUE_DEPTH = int(os.getenv("EXECUTION_MAX_QUEUE_DEPTH", 100))
+    EXECUTION_RESULT_TTL = int(os.getenv("EXECUTION_RESULT_TTL", 600))  # seconds
+
+    # Docker
+    DOCKER_BASE_URL = os.getenv("DOCKER_BASE_URL")  # defaults to DOCKER_HOST from the environment
+    DOCKER_MAX_POOL_SIZE = int(os.getenv("DOCKER_MAX_POOL_SIZE", 10))  # HTTP connections to the daemon
+    DOCKER_TIMEOUT = int(os.getenv("DOCKER_TIMEOUT", 60))  # seconds
+    DOCKER_HEALTH_CHECK_INTERVAL = int(os.getenv("DOCKER_HEALTH_CHECK_INTERVAL", 30))  # seconds
+    DOCKER_PREPULL_IMAGES = os.getenv("DOCKER_PREPULL_IMAGES", "true").lower() == "true"
+
+    # Warm container pool
+    CONTAINER_POOL_ENABLED = os.getenv("CONTAINER_POOL_ENABLED", "true").lower() == "true"
+    CONTAINER_POOL_SIZE = int(os.getenv("CONTAINER_POOL_SIZE", 2))  # idle sandboxes per language
+    CONTAINER_POOL_MAX_IDLE = int(os.getenv("CONTAINER_POOL_MAX_IDLE", 300))  # seconds
+    CONTAINER_POOL_MAX_USES = int(os.getenv("CONTAINER_POOL_MAX_USES", 20))  # runs before recycling
+    CONTAINER_POOL_RECYCLE_POLICY = os.getenv("CONTAINER_POOL_RECYCLE_POLICY", "reset")  # reset | recycle
+
     # CORS
     ALLOWED_ORIGINS = [
         "http://localhost:3000",
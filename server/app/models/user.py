@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import inspect, text
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -12,6 +13,8 @@ class User(db.Model):
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    tier = db.Column(db.String(32), nullable=False, default='free',
+                     server_default='free')  # selects execution limits
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -26,9 +29,32 @@ class User(db.Model):
             'id': self.id,
             'username': self.username,
             'email': self.email,
+            'tier': self.tier,
             'created_at': self.created_at.isoformat(),
         }
 
+
+# Columns added to users after its first release; create_all() never alters an existing table
+ADDED_COLUMNS = {
+    'tier': "VARCHAR(32) NOT NULL DEFAULT 'free'",
+}
+
+
+def add_missing_columns():
+    """Add ADDED_COLUMNS to a users table created before they existed"""
+    existing = {column['name'] for column in inspect(db.engine).get_columns('users')}
+    for name, definition in ADDED_COLUMNS.items():
+        if name in existing:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE users ADD COLUMN {name} {definition}"))
+        except Exception:
+            # Another worker starting at the same time may have added it first
+            if name not in {column['name'] for column in inspect(db.engine).get_columns('users')}:
+                raise
+
+
 # Import Project model after User model is defined to avoid circular imports
 from .project import Project
 
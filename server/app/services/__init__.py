@@ -14,14 +14,14 @@ def init_services(app):
         os.makedirs(storage_path, exist_ok=True)
         logger.info(f"Created storage directory at {storage_path}")
 
-    # Validate Docker availability if code execution is enabled
-    try:
-        import docker
-        client = docker.from_env()
-        client.ping()
-        logger.info("Docker service available")
-    except Exception as e:
-        logger.warning(f"Docker service unavailable, code execution may not work: {str(e)}")
+    if app.config.get('EXECUTION_BACKEND', 'docker') == 'local':
+        logger.warning("Code execution uses the local process backend; runs are not isolated")
+    else:
+        _init_docker(app)
+
+    # Compress cold files from startup on, including workspaces nobody opens
+    if app.config.get('COLD_TIER_ENABLED', False):
+        _init_cold_tier(app)
 
     # Initialize git configuration
     if app.config.get('GIT_ENABLED', True):
@@ -33,4 +33,47 @@ def init_services(app):
             git_config.set_value("user", "email", "service@cloud-ide.example.com")
             logger.info("Git service initialized")
         except Exception as e:
-            logger.warning(f"Git initialization failed: {str(e)}")
\ No newline at end of file
+            logger.warning(f"Git initialization failed: {str(e)}")
+
+
+def _init_cold_tier(app):
+    """Start the cold tier's background passes now rather than on the first storage call"""
+    try:
+        from app.services.storage_service import start_cold_tier
+        with app.app_context():
+            start_cold_tier()
+        logger.info("Cold file tier started")
+    except Exception as e:
+        logger.warning(f"Cold file tier unavailable, files will not be compressed: {str(e)}")
+
+
+def _init_docker(app):
+    """Validate Docker availability and prepare images in the background"""
+    try:
+        from app.services.docker_client import configure_docker_client, get_docker_client
+        configure_docker_client(app.config)
+        get_docker_client()
+        logger.info("Docker service available")
+    except Exception as e:
+        logger.warning(f"Docker service unavailable, code execution may not work: {str(e)}")
+    else:
+        if app.config.get('DOCKER_PREPULL_IMAGES', True):
+            import threading
+            threading.Thread(target=_prepare_execution_images, args=(app,), daemon=True).start()
+
+
+def _prepare_execution_images(app):
+    """Pull the language images and warm the container pool so first runs start fast"""
+    from app.services.docker_client import prepull_images
+    from app.services.executor_service import get_language_images
+
+    images = get_language_images()
+    prepull_images(images.values())
+
+    if app.config.get('CONTAINER_POOL_ENABLED', True):
+        from app.services.container_pool import get_container_pool
+        with app.app_context():
+            try:
+                get_container_pool(images)
+            except Exception as e:
+                logger.warning(f"Failed to warm container pool: {str(e)}")
@@ -0,0 +1,534 @@
+# server/app/services/archive_service.py
+import logging
+import os
+import stat
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+
+from flask import current_app
+
+from app.services.storage_service import (
+    charge_usage,
+    check_quota,
+    deduplicate_tree,
+    ensure_user_path_exists,
+    flush_pending_writes,
+    materialize,
+    note_change,
+    usage_before_change,
+    validate_path
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = {
+    "zip": {"mimetype": "application/zip", "extension": ".zip"},
+    "tar.gz": {"mimetype": "application/gzip", "extension": ".tar.gz"}
+}
+
+# Bytes read from a file or an upload at a time
+CHUNK_SIZE = 64 * 1024
+
+# Zip timestamps cannot predate 1980
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveProgress:
+    """
+    Tracks running archive downloads and uploads so clients can poll them
+    Finished entries are kept for ttl seconds.
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def start(self, user_id, kind, path, progress_id=None, entries_total=None, bytes_total=None):
+        progress_id = progress_id or uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            if progress_id in self._entries:
+                raise ValueError("Progress ID is already in use")
+            self._entries[progress_id] = {
+                "id": progress_id,
+                "user_id": str(user_id),
+                "kind": kind,
+                "path": path,
+                "status": "running",
+                "entries_done": 0,
+                "entries_total": entries_total,
+                "bytes_done": 0,
+                "bytes_total": bytes_total,
+                "bytes_received": 0,
+                "error": None,
+                "started": time.time(),
+                "finished": None
+            }
+        return progress_id
+
+    def advance(self, progress_id, entries=0, bytes_done=0, bytes_received=0):
+        with self._lock:
+            progress = self._entries.get(progress_id)
+            if progress:
+                progress["entries_done"] += entries
+                progress["bytes_done"] += bytes_done
+                progress["bytes_received"] += bytes_received
+
+    def finish(self, progress_id, error=None):
+        with self._lock:
+            progress = self._entries.get(progress_id)
+            if progress and progress["status"] == "running":
+                progress["status"] = "failed" if error else "completed"
+                progress["error"] = error
+                progress["finished"] = time.time()
+
+    def get(self, user_id, progress_id):
+        """A copy of one of the user's progress entries, or None"""
+        with self._lock:
+            self._expire()
+            progress = self._entries.get(progress_id)
+            if progress is None or progress["user_id"] != str(user_id):
+                return None
+            return {key: value for key, value in progress.items() if key != "user_id"}
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for progress_id in [progress_id for progress_id, progress in self._entries.items()
+                            if (progress["finished"] or progress["started"]) < cutoff]:
+            del self._entries[progress_id]
+
+
+_progress = None
+_progress_lock = threading.Lock()
+
+
+def get_archive_progress():
+    """Get the process-wide progress tracker, creating it from app config on first use"""
+    global _progress
+    with _progress_lock:
+        if _progress is None:
+            _progress = ArchiveProgress(ttl=current_app.config.get('ARCHIVE_PROGRESS_TTL', 600))
+    return _progress
+
+
+def export_archive(user_id, path, archive_format="zip", progress_id=None):
+    """
+    Prepare a streamed archive of a directory
+    The directory is walked up front to enforce ARCHIVE_MAX_ENTRIES and
+    ARCHIVE_MAX_BYTES, but file contents are only read while the returned
+    stream is consumed, a chunk at a time. Symlinks are left out.
+    """
+    try:
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {archive_format}")
+        config = current_app.config
+        user_path = ensure_user_path_exists(user_id)
+        full_path = validate_path(user_id, path) if path else user_path
+
+        if not os.path.isdir(full_path):
+            raise FileNotFoundError(f"Directory not found: {path}")
+        materialize(full_path)
+
+        entries = []
+        totals = {"bytes": 0}
+        _collect_entries(full_path, "", entries, totals,
+                         config.get('ARCHIVE_MAX_ENTRIES', 20000),
+                         config.get('ARCHIVE_MAX_BYTES', 1024 * 1024 * 1024))
+
+        progress = get_archive_progress()
+        progress_id = progress.start(user_id, "download", path, progress_id=progress_id,
+                                     entries_total=len(entries), bytes_total=totals["bytes"])
+        writer = _stream_zip if archive_format == "zip" else _stream_tar_gz
+        name = os.path.basename(os.path.normpath(full_path)) if path else "workspace"
+
+        return {
+            "stream": _tracked(writer(entries, progress, progress_id), progress, progress_id),
+            "filename": name + ARCHIVE_FORMATS[archive_format]["extension"],
+            "mimetype": ARCHIVE_FORMATS[archive_format]["mimetype"],
+            "entries": len(entries),
+            "bytes": totals["bytes"],
+            "progress_id": progress_id
+        }
+    except Exception as e:
+        logger.error(f"Error exporting archive: {str(e)}")
+        raise
+
+
+def import_archive(user_id, path, stream, archive_format=None, overwrite=False, progress_id=None,
+                   content_length=None):
+    """
+    Extract an uploaded archive into a directory as it is read
+    tar.gz uploads are extracted straight from the request stream; zip
+    keeps its index at the end, so zip uploads are spooled to a temp file
+    first. Every member path goes through validate_path, only regular
+    files and directories are extracted, and ARCHIVE_MAX_UPLOAD_BYTES,
+    ARCHIVE_MAX_ENTRIES and ARCHIVE_MAX_BYTES are enforced on the bytes
+    actually read and written, as is the user's storage quota. Existing
+    files are kept unless overwrite is set.
+    """
+    config = current_app.config
+    max_upload = config.get('ARCHIVE_MAX_UPLOAD_BYTES', 512 * 1024 * 1024)
+    if content_length is not None and content_length > max_upload:
+        raise ValueError(f"Archive exceeds the {max_upload} byte upload limit")
+
+    user_path = ensure_user_path_exists(user_id)
+    full_path = validate_path(user_id, path) if path else user_path
+    if os.path.exists(full_path) and not os.path.isdir(full_path):
+        raise ValueError(f"Not a directory: {path}")
+
+    progress = get_archive_progress()
+    progress_id = progress.start(user_id, "upload", path, progress_id=progress_id,
+                                 bytes_total=content_length)
+    reader = _UploadReader(stream, max_upload, progress, progress_id)
+    if archive_format is None:
+        archive_format = "zip" if reader.peek(4) == b"PK\x03\x04" else "tar.gz"
+    if archive_format not in ARCHIVE_FORMATS:
+        progress.finish(progress_id, error="Unsupported archive format")
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+
+    extraction = {
+        "user_id": user_id,
+        "path": path,
+        "overwrite": overwrite,
+        "max_entries": config.get('ARCHIVE_MAX_ENTRIES', 20000),
+        "max_bytes": config.get('ARCHIVE_MAX_BYTES', 1024 * 1024 * 1024),
+        "entries": 0,
+        "bytes": 0,
+        "files": 0,
+        "skipped": [],
+        "conflicts": [],
+        "progress": progress,
+        "progress_id": progress_id
+    }
+    before = usage_before_change(user_id, full_path)
+    try:
+        os.makedirs(full_path, exist_ok=True)
+        flush_pending_writes(full_path)
+        if archive_format == "zip":
+            _extract_zip(reader, extraction)
+        else:
+            _extract_tar(reader, extraction)
+        deduplicate_tree(full_path)
+        progress.finish(progress_id)
+    except (tarfile.TarError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+        progress.finish(progress_id, error=str(e))
+        logger.error(f"Error importing archive: {str(e)}")
+        raise ValueError(f"Invalid archive: {str(e)}")
+    except Exception as e:
+        progress.finish(progress_id, error=str(e))
+        logger.error(f"Error importing archive: {str(e)}")
+        raise
+    finally:
+        charge_usage(user_id, full_path, before)
+        note_change(user_id, full_path)
+
+    return {
+        "message": "Archive extracted successfully",
+        "path": path,
+        "format": archive_format,
+        "entries": extraction["entries"],
+        "files": extraction["files"],
+        "bytes": extraction["bytes"],
+        "skipped": extraction["skipped"],
+        "conflicts": extraction["conflicts"],
+        "progress_id": progress_id
+    }
+
+
+def download_headers(result):
+    """HTTP headers that serve an export_archive() result as a file download"""
+    return {
+        'Content-Disposition': f'attachment; filename="{result["filename"]}"',
+        'X-Archive-Entries': str(result['entries']),
+        'X-Archive-Bytes': str(result['bytes']),
+        'X-Archive-Progress-Id': result['progress_id'],
+        'X-Accel-Buffering': 'no'
+    }
+
+
+def import_options(args):
+    """import_archive() options from an upload's query parameters: format, overwrite and progress_id"""
+    return {
+        "archive_format": args.get('format'),
+        "overwrite": args.get('overwrite', 'false').lower() == 'true',
+        "progress_id": args.get('progress_id')
+    }
+
+
+def _collect_entries(full_path, arcname, entries, totals, max_entries, max_bytes):
+    """Walk a directory for export, checking the entry and size limits as it goes"""
+    with os.scandir(full_path) as it:
+        items = sorted(it, key=lambda entry: entry.name)
+
+    for item in items:
+        if item.is_symlink():
+            continue
+        name = f"{arcname}/{item.name}" if arcname else item.name
+        try:
+            item_stat = item.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        is_dir = stat.S_ISDIR(item_stat.st_mode)
+        if not is_dir and not stat.S_ISREG(item_stat.st_mode):
+            continue
+
+        entries.append({
+            "full_path": item.path,
+            "arcname": name,
+            "is_dir": is_dir,
+            "size": 0 if is_dir else item_stat.st_size,
+            "mode": stat.S_IMODE(item_stat.st_mode),
+            "mtime": item_stat.st_mtime
+        })
+        totals["bytes"] += entries[-1]["size"]
+        if len(entries) > max_entries:
+            raise ValueError(f"Directory has more than {max_entries} entries to archive")
+        if totals["bytes"] > max_bytes:
+            raise ValueError(f"Directory holds more than {max_bytes} bytes to archive")
+        if is_dir:
+            _collect_entries(item.path, name, entries, totals, max_entries, max_bytes)
+
+
+def _tracked(chunks, progress, progress_id):
+    """Pass a stream through, recording whether it finished or failed"""
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+        progress.finish(progress_id)
+    except GeneratorExit:
+        progress.finish(progress_id, error="Download was interrupted")
+        raise
+    except Exception as e:
+        progress.finish(progress_id, error=str(e))
+        logger.error(f"Error streaming archive: {str(e)}")
+        raise
+
+
+def _read_entry(f, size):
+    """Read up to size bytes of a file in chunks, zero-padding if it shrank since the walk"""
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            yield b"\0" * remaining
+            return
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _stream_tar_gz(entries, progress, progress_id):
+    """Yield a gzipped ustar/pax archive, one header or file chunk at a time"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for entry in entries:
+        info = tarfile.TarInfo(entry["arcname"])
+        info.mode = entry["mode"]
+        info.mtime = int(entry["mtime"])
+        if entry["is_dir"]:
+            info.type = tarfile.DIRTYPE
+            yield compressor.compress(info.tobuf(format=tarfile.PAX_FORMAT))
+        else:
+            try:
+                f = open(entry["full_path"], 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                info.size = entry["size"]
+                yield compressor.compress(info.tobuf(format=tarfile.PAX_FORMAT))
+                for chunk in _read_entry(f, entry["size"]):
+                    yield compressor.compress(chunk)
+            yield compressor.compress(b"\0" * (-entry["size"] % tarfile.BLOCKSIZE))
+        progress.advance(progress_id, entries=1, bytes_done=entry["size"])
+
+    yield compressor.compress(b"\0" * (2 * tarfile.BLOCKSIZE))
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """Write-only file that hands whatever was written back through drain()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _stream_zip(entries, progress, progress_id):
+    """Yield a zip archive as it is written, using data descriptors instead of seeking"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for entry in entries:
+            date_time = max(ZIP_EPOCH, time.localtime(entry["mtime"])[:6])
+            if entry["is_dir"]:
+                info = zipfile.ZipInfo(entry["arcname"] + "/", date_time=date_time)
+                info.external_attr = (stat.S_IFDIR | entry["mode"]) << 16 | 0x10
+                archive.writestr(info, b"")
+            else:
+                info = zipfile.ZipInfo(entry["arcname"], date_time=date_time)
+                info.external_attr = (stat.S_IFREG | entry["mode"]) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                try:
+                    f = open(entry["full_path"], 'rb')
+                except FileNotFoundError:
+                    continue
+                with f, archive.open(info, "w", force_zip64=entry["size"] >= zipfile.ZIP64_LIMIT) as dest:
+                    for chunk in _read_entry(f, entry["size"]):
+                        dest.write(chunk)
+                        yield sink.drain()
+            yield sink.drain()
+            progress.advance(progress_id, entries=1, bytes_done=entry["size"])
+    yield sink.drain()
+
+
+class _UploadReader:
+    """Read-only view of an upload stream that enforces a size limit and counts progress"""
+
+    def __init__(self, stream, limit, progress, progress_id):
+        self.stream = stream
+        self.limit = limit
+        self.progress = progress
+        self.progress_id = progress_id
+        self.received = 0
+        self._peeked = b""
+
+    def peek(self, size):
+        while len(self._peeked) < size:
+            chunk = self.stream.read(size - len(self._peeked))
+            if not chunk:
+                break
+            self._count(len(chunk))
+            self._peeked += chunk
+        return self._peeked
+
+    def read(self, size=-1):
+        if self._peeked:
+            data, self._peeked = self._peeked, b""
+            if size is not None and 0 <= size < len(data):
+                data, self._peeked = data[:size], data[size:]
+            return data
+        data = self.stream.read(size if size is not None and size >= 0 else CHUNK_SIZE)
+        self._count(len(data))
+        return data
+
+    def _count(self, size):
+        self.received += size
+        self.progress.advance(self.progress_id, bytes_received=size)
+        if self.received > self.limit:
+            raise ValueError(f"Archive exceeds the {self.limit} byte upload limit")
+
+
+def _member_path(extraction, name):
+    """Validate an archive member name and resolve it inside the target directory"""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or name.startswith(("/", "\\")) or ".." in parts or ":" in parts[0]:
+        raise ValueError(f"Unsafe path in archive: {name}")
+    relative_path = "/".join([extraction["path"]] + parts if extraction["path"] else parts)
+    return validate_path(extraction["user_id"], relative_path)
+
+
+def _count_entry(extraction, target, size=0):
+    extraction["entries"] += 1
+    extraction["bytes"] += size
+    if extraction["entries"] > extraction["max_entries"]:
+        raise ValueError(f"Archive has more than {extraction['max_entries']} entries")
+    if extraction["bytes"] > extraction["max_bytes"]:
+        raise ValueError(f"Archive expands to more than {extraction['max_bytes']} bytes")
+    # Counters are only charged once extraction ends, so check everything extracted so far
+    check_quota(extraction["user_id"], target, extraction["bytes"], extraction["entries"])
+
+
+def _extract_member(extraction, name, is_dir, source, declared_size):
+    """Extract one directory or regular file, writing files through a temp file and rename"""
+    target = _member_path(extraction, name)
+    if is_dir:
+        _count_entry(extraction, target)
+        os.makedirs(target, exist_ok=True)
+        extraction["progress"].advance(extraction["progress_id"], entries=1)
+        return
+
+    _count_entry(extraction, target, declared_size)
+    if os.path.isdir(target) or (os.path.exists(target) and not extraction["overwrite"]):
+        extraction["conflicts"].append(name)
+        return
+
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                # Declared sizes can lie; hold the member to what it claimed
+                if written > declared_size:
+                    raise ValueError(f"Archive member is larger than declared: {name}")
+                f.write(chunk)
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    extraction["files"] += 1
+    extraction["progress"].advance(extraction["progress_id"], entries=1, bytes_done=written)
+
+
+def _extract_tar(reader, extraction):
+    with tarfile.open(fileobj=reader, mode="r|*") as archive:
+        for member in archive:
+            if member.isdir():
+                _extract_member(extraction, member.name, True, None, 0)
+            elif member.isfile():
+                _extract_member(extraction, member.name, False, archive.extractfile(member), member.size)
+            else:
+                # Links, devices and fifos are never created
+                extraction["skipped"].append(member.name)
+
+
+def _extract_zip(reader, extraction):
+    with tempfile.TemporaryFile() as spool:
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spool.write(chunk)
+        spool.seek(0)
+
+        with zipfile.ZipFile(spool) as archive:
+            members = archive.infolist()
+            # Check the declared totals before writing anything
+            if len(members) > extraction["max_entries"]:
+                raise ValueError(f"Archive has more than {extraction['max_entries']} entries")
+            if sum(info.file_size for info in members) > extraction["max_bytes"]:
+                raise ValueError(f"Archive expands to more than {extraction['max_bytes']} bytes")
+
+            for info in members:
+                mode = info.external_attr >> 16
+                if info.is_dir():
+                    _extract_member(extraction, info.filename, True, None, 0)
+                # Many zip writers store permission bits without a file type
+                elif stat.S_IFMT(mode) and not stat.S_ISREG(mode):
+                    extraction["skipped"].append(info.filename)
+                else:
+                    with archive.open(info) as source:
+                        _extract_member(extraction, info.filename, False, source, info.file_size)
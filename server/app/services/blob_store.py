@@ -0,0 +1,381 @@
+# server/app/services/blob_store.py
+import errno
+import hashlib
+import logging
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import uuid
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    path TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS manifest_user ON manifest (user_id);
+CREATE INDEX IF NOT EXISTS manifest_blob ON manifest (blob);
+"""
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(full_path):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressed store for the files in user storage
+    Each distinct content (and permission mode, which hard links share) is
+    kept once as a blob under objects/, named by its SHA-256. User files
+    are hard links to their blob, so git, archives, search and everything
+    else that reads the storage tree sees ordinary files, and a blob's
+    reference count is simply its link count minus one. This relies on
+    every writer replacing files by rename rather than writing them in
+    place, which all of the storage, archive and git code paths do.
+
+    The manifest (storage-relative path -> blob) records which blob each
+    path was linked to, for per-user statistics and for releasing blobs as
+    paths are overwritten or deleted. Paths that changed behind its back
+    are detected by comparing inodes, and gc() drops them along with blobs
+    nothing links to any more. The store must be on the same filesystem as
+    the storage it serves.
+    """
+
+    def __init__(self, root, storage_path, min_bytes=1024, gc_interval=3600):
+        self.root = root
+        self.storage_path = os.path.abspath(storage_path)
+        self.min_bytes = min_bytes
+        self.gc_interval = gc_interval
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "manifest.sqlite3"), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        self.linked = 0
+        self.bytes_deduplicated = 0
+        self.released = 0
+        self.last_gc = None
+
+    def start(self):
+        if self.gc_interval and self._thread is None:
+            self._thread = threading.Thread(target=self._gc_loop, name="blob-store-gc", daemon=True)
+            self._thread.start()
+
+    def blob_path(self, blob):
+        return os.path.join(self.root, "objects", blob[:2], blob[2:])
+
+    def stage(self, directory, data, mode):
+        """
+        Put data in a temp file in directory that is backed by its blob
+        Returns (temp_path, blob). Content the store already holds is linked
+        rather than written; new content is written once and becomes the
+        blob. blob is None if the content could not be linked, in which
+        case the temp file is an ordinary copy.
+        """
+        blob = f"{hashlib.sha256(data).hexdigest()}-{stat.S_IMODE(mode):o}"
+        blob_path = self.blob_path(blob)
+        temp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(blob_path, temp_path)
+            self._count_link(len(data))
+            return temp_path, blob
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if e.errno != errno.EMLINK:
+                raise
+            # The blob has as many links as the filesystem allows; write a plain copy
+            blob = None
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, stat.S_IMODE(mode))
+            if blob:
+                blob = self._adopt_inode(temp_path, blob, len(data))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return temp_path, blob
+
+    def record(self, full_path, blob=None, size=0):
+        """Note that a path now links to blob (None: to no blob) and release the blob it linked to before"""
+        path = os.path.relpath(full_path, self.storage_path)
+        with self._lock:
+            row = self._db.execute("SELECT blob FROM manifest WHERE path = ?", (path,)).fetchone()
+            if blob:
+                self._db.execute("INSERT OR REPLACE INTO manifest (path, user_id, blob, size) "
+                                 "VALUES (?, ?, ?, ?)", (path, path.split(os.sep)[0], blob, size))
+            elif row:
+                self._db.execute("DELETE FROM manifest WHERE path = ?", (path,))
+        if row and row[0] != blob:
+            self._release(row[0])
+
+    def forget(self, full_path):
+        """Drop the manifest entries at or below a deleted path and release their blobs"""
+        path = os.path.relpath(full_path, self.storage_path)
+        # '0' sorts right after '/', so this range is everything below path/
+        below = (path, path + os.sep, path + chr(ord(os.sep) + 1))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, blob FROM manifest WHERE path = ? OR (path >= ? AND path < ?)", below
+            ).fetchall()
+            self._db.executemany("DELETE FROM manifest WHERE path = ?", [(row[0],) for row in rows])
+        for blob in {row[1] for row in rows}:
+            self._release(blob)
+
+    def adopt(self, full_path):
+        """
+        Deduplicate an existing file in place
+        Its content is hashed; if the store already has it, the file is
+        replaced by a link to the blob, otherwise the file becomes the blob.
+        Returns the bytes saved, or None if the file was skipped.
+        """
+        try:
+            file_stat = os.lstat(full_path)
+        except FileNotFoundError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < self.min_bytes:
+            return None
+
+        blob = f"{file_digest(full_path)}-{stat.S_IMODE(file_stat.st_mode):o}"
+        blob_path = self.blob_path(blob)
+        try:
+            blob_stat = os.stat(blob_path)
+        except FileNotFoundError:
+            blob_stat = None
+        if blob_stat and blob_stat.st_ino == file_stat.st_ino:
+            self.record(full_path, blob, file_stat.st_size)
+            return 0
+        if blob_stat is None:
+            blob = self._adopt_inode(full_path, blob, 0)
+            if blob:
+                self.record(full_path, blob, file_stat.st_size)
+            return 0
+
+        temp_path = os.path.join(os.path.dirname(full_path), f".{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(blob_path, temp_path)
+        except OSError as e:
+            if e.errno in (errno.EMLINK, errno.ENOENT):
+                return None
+            raise
+        try:
+            # A writer that replaced the file while it was hashed wins
+            current = os.lstat(full_path)
+            if (current.st_ino, current.st_mtime_ns) != (file_stat.st_ino, file_stat.st_mtime_ns):
+                os.remove(temp_path)
+                return None
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.record(full_path, blob, file_stat.st_size)
+        self._count_link(file_stat.st_size)
+        return file_stat.st_size
+
+    def adopt_tree(self, full_path):
+        """Deduplicate every regular file at or below a path"""
+        result = {"files": 0, "deduplicated": 0, "bytes_saved": 0}
+        for directory, dirs, files in os.walk(full_path):
+            if os.path.basename(directory) == ".git":
+                # git appends to reflogs and FETCH_HEAD in place; only its object store is immutable
+                dirs[:] = [name for name in dirs if name == "objects"]
+                continue
+            for name in files:
+                try:
+                    saved = self.adopt(os.path.join(directory, name))
+                except OSError as e:
+                    logger.warning(f"Could not deduplicate {os.path.join(directory, name)}: {str(e)}")
+                    continue
+                if saved is None:
+                    continue
+                result["files"] += 1
+                if saved:
+                    result["deduplicated"] += 1
+                    result["bytes_saved"] += saved
+        if os.path.isfile(full_path):
+            saved = self.adopt(full_path)
+            if saved is not None:
+                result.update(files=1, deduplicated=int(saved > 0), bytes_saved=saved)
+        return result
+
+    def gc(self):
+        """Remove blobs no file links to and manifest entries for paths that no longer link to their blob"""
+        removed_blobs = removed_bytes = 0
+        objects = os.path.join(self.root, "objects")
+        for prefix in os.listdir(objects):
+            with os.scandir(os.path.join(objects, prefix)) as it:
+                for entry in it:
+                    try:
+                        blob_stat = entry.stat(follow_symlinks=False)
+                        if blob_stat.st_nlink <= 1:
+                            os.remove(entry.path)
+                            removed_blobs += 1
+                            removed_bytes += blob_stat.st_size
+                    except FileNotFoundError:
+                        continue
+
+        with self._lock:
+            rows = self._db.execute("SELECT path, blob FROM manifest").fetchall()
+        stale = []
+        for path, blob in rows:
+            try:
+                if os.lstat(os.path.join(self.storage_path, path)).st_ino != os.stat(self.blob_path(blob)).st_ino:
+                    stale.append((path,))
+            except FileNotFoundError:
+                stale.append((path,))
+        with self._lock:
+            self._db.executemany("DELETE FROM manifest WHERE path = ?", stale)
+            self.last_gc = {"blobs_removed": removed_blobs, "bytes_removed": removed_bytes,
+                            "stale_paths": len(stale)}
+        return self.last_gc
+
+    def stats(self, user_id=None):
+        """Logical and physical bytes of deduplicated files, or for one user how much is shared"""
+        with self._lock:
+            if user_id is not None:
+                paths, logical, blobs = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(DISTINCT blob) FROM manifest "
+                    "WHERE user_id = ?", (str(user_id),)
+                ).fetchone()
+                shared = self._db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM manifest m WHERE user_id = ? AND EXISTS "
+                    "(SELECT 1 FROM manifest o WHERE o.blob = m.blob AND o.path != m.path)", (str(user_id),)
+                ).fetchone()[0]
+                return {"paths": paths, "blobs": blobs, "logical_bytes": logical, "shared_bytes": shared}
+
+            paths, logical, blobs = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(DISTINCT blob) FROM manifest"
+            ).fetchone()
+            physical = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM manifest GROUP BY blob)"
+            ).fetchone()[0]
+            return {
+                "paths": paths,
+                "blobs": blobs,
+                "logical_bytes": logical,
+                "physical_bytes": physical,
+                "dedup_ratio": round(logical / physical, 3) if physical else None,
+                "linked": self.linked,
+                "bytes_deduplicated": self.bytes_deduplicated,
+                "released": self.released,
+                "last_gc": self.last_gc
+            }
+
+    def shutdown(self):
+        self._closed.set()
+        with self._lock:
+            self._db.close()
+
+    def _adopt_inode(self, full_path, blob, linked_size):
+        """
+        Make a file the blob for its content, or link it to the existing blob
+        Returns the blob name, or None if the file could not be linked.
+        """
+        blob_path = self.blob_path(blob)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(full_path, blob_path)
+            return blob
+        except FileExistsError:
+            pass
+        # Another writer created the blob first; link to theirs instead
+        if not linked_size:
+            return None
+        temp_path = os.path.join(os.path.dirname(full_path), f".{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(blob_path, temp_path)
+            os.replace(temp_path, full_path)
+        except OSError:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            return None
+        self._count_link(linked_size)
+        return blob
+
+    def _count_link(self, size):
+        with self._lock:
+            self.linked += 1
+            self.bytes_deduplicated += size
+
+    def _release(self, blob):
+        """Remove a blob once nothing links to it"""
+        try:
+            if os.stat(self.blob_path(blob)).st_nlink <= 1:
+                os.remove(self.blob_path(blob))
+                with self._lock:
+                    self.released += 1
+        except FileNotFoundError:
+            pass
+
+    def _gc_loop(self):
+        while not self._closed.wait(self.gc_interval):
+            try:
+                self.gc()
+            except Exception as e:
+                logger.warning(f"Blob store garbage collection failed: {str(e)}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Get the process-wide blob store, or None if it is disabled"""
+    global _store
+    config = current_app.config
+    if not config.get('BLOB_STORE_ENABLED', False):
+        return None
+    with _store_lock:
+        if _store is None:
+            storage_path = config.get('STORAGE_PATH', 'storage')
+            _store = BlobStore(
+                config.get('BLOB_STORE_DIR') or os.path.join(storage_path, '.blobs'),
+                storage_path,
+                min_bytes=config.get('BLOB_STORE_MIN_BYTES', 1024),
+                gc_interval=config.get('BLOB_STORE_GC_INTERVAL', 3600)
+            )
+            _store.start()
+    return _store
+
+
+def shutdown_blob_store():
+    """Close the store and forget it"""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store:
+        store.shutdown()
+
+
+def peek_blob_store():
+    """Return the store if it has been created, without creating it"""
+    return _store
@@ -0,0 +1,434 @@
+# server/app/services/cold_tier.py
+import contextlib
+import logging
+import os
+import sqlite3
+import stat
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from flask import current_app
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cold_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    physical_size INTEGER NOT NULL,
+    logical_size INTEGER NOT NULL,
+    codec TEXT
+);
+"""
+
+# A cold file starts with this header: magic, codec and the logical size.
+# The leading NUL makes anything that sniffs for text treat it as binary.
+MAGIC = b"\0CIDE-COLD\0"
+HEADER = struct.Struct(">11scQ")
+CODECS = {b"g": "gzip", b"z": "zstd"}
+CHUNK_SIZE = 1024 * 1024
+
+
+def _compressor(codec, level):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def _decompressor(codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise OSError("File is compressed with zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(31)
+
+
+def read_header(f):
+    """(codec, logical_size) if the open file is cold, else None; leaves f after the header"""
+    header = f.read(HEADER.size)
+    if len(header) == HEADER.size and header.startswith(MAGIC):
+        _, codec, logical_size = HEADER.unpack(header)
+        if codec in CODECS:
+            return CODECS[codec], logical_size
+    f.seek(0)
+    return None
+
+
+def iter_logical(f):
+    """Yield a file's content, decompressing it if it is cold"""
+    header = read_header(f)
+    if header:
+        yield from _iter_decompressed(f, header[0])
+    else:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+
+def _iter_decompressed(f, codec):
+    """Yield the decompressed content of a cold file whose header has been read"""
+    decompressor = _decompressor(codec)
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+        yield decompressor.decompress(chunk)
+    if hasattr(decompressor, "flush"):
+        yield decompressor.flush()
+
+
+def decode(data, limit):
+    """
+    Decompress the content of a cold file read whole into memory
+    Returns data unchanged if it is not cold, or None if it expands past limit bytes.
+    """
+    if not data.startswith(MAGIC) or len(data) < HEADER.size:
+        return data
+    _, codec, logical_size = HEADER.unpack(data[:HEADER.size])
+    if codec not in CODECS:
+        return data
+    if logical_size > limit:
+        return None
+    try:
+        return _decompressor(CODECS[codec]).decompress(data[HEADER.size:])
+    except Exception as e:
+        logger.warning(f"Could not decompress cold file content: {str(e)}")
+        return None
+
+
+class ColdTier:
+    """
+    Compresses files nobody has touched for a while, in place
+    A background pass walks each user's storage and rewrites regular files
+    whose access and modification times are both older than cold_after
+    seconds as a small header plus a gzip or zstd stream, keeping their
+    mode and timestamps. Git repositories are skipped, since git reads
+    the work tree itself, as are hard-linked (deduplicated) files, whose
+    space compressing one copy would not free. Files that would not
+    shrink by min_saving are remembered and left alone.
+
+    The storage service thaws a cold file back to plain content when it
+    is read, and lists cold files with their logical size, which the
+    manifest records alongside the compressed size and mtime that
+    identify the compressed version.
+    """
+
+    def __init__(self, storage_path, db_path, cold_after=30 * 24 * 3600, min_bytes=4096, codec="gzip",
+                 level=6, min_saving=0.1, interval=3600, app=None, lock_for=None, on_change=None):
+        self.storage_path = os.path.abspath(storage_path)
+        self.cold_after = cold_after
+        self.min_bytes = min_bytes
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed; compressing cold files with gzip")
+            codec = "gzip"
+        self.codec = codec
+        self.level = level
+        self.min_saving = min_saving
+        self.interval = interval
+        self.app = app
+        self.lock_for = lock_for or (lambda full_path: contextlib.nullcontext())
+        self.on_change = on_change  # on_change(full_path, bytes_delta)
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        self.compressed = 0
+        self.thaws = 0
+        self.thaw_seconds = 0.0
+        self.last_run = None
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run_loop, name="cold-tier", daemon=True)
+            self._thread.start()
+
+    def cold_entries(self, full_path, children_only=False):
+        """Manifest rows at or below a path as {storage-relative path: (mtime, physical, logical)}"""
+        path = os.path.relpath(full_path, self.storage_path)
+        query = "SELECT path, mtime, physical_size, logical_size FROM cold_files " \
+                "WHERE codec IS NOT NULL AND (path = ? OR (path >= ? AND path < ?))"
+        params = [path, path + os.sep, path + chr(ord(os.sep) + 1)]
+        if children_only:
+            query += " AND instr(substr(path, ?), ?) = 0"
+            params += [len(path) + 2, os.sep]
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def compress(self, full_path, file_stat=None):
+        """Compress one file in place; returns the bytes saved, or None if it was left alone"""
+        with self.lock_for(full_path):
+            try:
+                current = os.lstat(full_path)
+            except FileNotFoundError:
+                return None
+            if file_stat and _identity(current) != _identity(file_stat):
+                return None
+            file_stat = current
+
+            directory = os.path.dirname(full_path)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+            try:
+                with open(full_path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                    header = read_header(source)
+                    if header:
+                        # Compressed by an earlier pass whose manifest entry was lost
+                        self._record(full_path, file_stat, header[0], header[1])
+                        return None
+                    target.write(HEADER.pack(MAGIC, self.codec[0].encode(), file_stat.st_size))
+                    compressor = _compressor(self.codec, self.level)
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                        target.write(compressor.compress(chunk))
+                    target.write(compressor.flush())
+                    target.flush()
+                    physical_size = target.tell()
+                    if physical_size > file_stat.st_size * (1 - self.min_saving):
+                        self._record(full_path, file_stat, None)
+                        return None
+                    os.fsync(target.fileno())
+                os.chmod(temp_path, stat.S_IMODE(file_stat.st_mode))
+                os.utime(temp_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+                if _identity(os.lstat(full_path)) != _identity(file_stat):
+                    return None
+                os.replace(temp_path, full_path)
+            finally:
+                if os.path.lexists(temp_path):
+                    os.remove(temp_path)
+
+            self._record(full_path, os.lstat(full_path), self.codec, file_stat.st_size)
+            with self._lock:
+                self.compressed += 1
+
+        saved = file_stat.st_size - physical_size
+        if self.on_change:
+            self.on_change(full_path, -saved)
+        return saved
+
+    def thaw(self, full_path):
+        """Decompress a cold file back in place; returns True if it was cold"""
+        started = time.perf_counter()
+        with self.lock_for(full_path):
+            try:
+                file_stat = os.lstat(full_path)
+                source = open(full_path, 'rb')
+            except (FileNotFoundError, IsADirectoryError):
+                self._forget(full_path)
+                return False
+            directory = os.path.dirname(full_path)
+            with source:
+                header = read_header(source)
+                if header is None:
+                    self._forget(full_path)
+                    return False
+                fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, 'wb') as target:
+                        for chunk in _iter_decompressed(source, header[0]):
+                            target.write(chunk)
+                        target.flush()
+                        if target.tell() != header[1]:
+                            raise OSError(f"Cold file is damaged: {full_path}")
+                        os.fsync(target.fileno())
+                    os.chmod(temp_path, stat.S_IMODE(file_stat.st_mode))
+                    # A thawed file was just accessed, so the next pass leaves it alone
+                    os.utime(temp_path, ns=(time.time_ns(), file_stat.st_mtime_ns))
+                    os.replace(temp_path, full_path)
+                finally:
+                    if os.path.lexists(temp_path):
+                        os.remove(temp_path)
+            self._forget(full_path)
+
+        with self._lock:
+            self.thaws += 1
+            self.thaw_seconds += time.perf_counter() - started
+        if self.on_change:
+            self.on_change(full_path, header[1] - file_stat.st_size)
+        return True
+
+    def thaw_tree(self, full_path):
+        """Thaw every cold file at or below a path; cheap when there are none"""
+        thawed = 0
+        for path in self.cold_entries(full_path):
+            if self.thaw(os.path.join(self.storage_path, path)):
+                thawed += 1
+        return thawed
+
+    def forget(self, full_path):
+        """Drop manifest entries at or below a deleted path"""
+        path = os.path.relpath(full_path, self.storage_path)
+        with self._lock:
+            self._db.execute("DELETE FROM cold_files WHERE path = ? OR (path >= ? AND path < ?)",
+                             (path, path + os.sep, path + chr(ord(os.sep) + 1)))
+
+    def run(self):
+        """Compress every cold file in every user's storage once"""
+        with self._run_lock:
+            started = time.time()
+            cutoff = started - self.cold_after
+            result = {"files": 0, "bytes_saved": 0, "stale": self._prune()}
+            for user_id in sorted(os.listdir(self.storage_path)):
+                user_path = os.path.join(self.storage_path, user_id)
+                # .blobs, .cold and other dot directories are not user storage
+                if user_id.startswith(".") or not os.path.isdir(user_path):
+                    continue
+                for full_path, file_stat in self._candidates(user_path, cutoff):
+                    try:
+                        saved = self.compress(full_path, file_stat)
+                    except OSError as e:
+                        logger.warning(f"Could not compress cold file {full_path}: {str(e)}")
+                        continue
+                    if saved is not None:
+                        result["files"] += 1
+                        result["bytes_saved"] += saved
+            result["took"] = round(time.time() - started, 3)
+            self.last_run = result
+            return result
+
+    def stats(self):
+        with self._lock:
+            files, logical, physical = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(logical_size), 0), COALESCE(SUM(physical_size), 0) "
+                "FROM cold_files WHERE codec IS NOT NULL"
+            ).fetchone()
+            return {
+                "codec": self.codec,
+                "cold_after": self.cold_after,
+                "files": files,
+                "logical_bytes": logical,
+                "physical_bytes": physical,
+                "bytes_saved": logical - physical,
+                "compressed": self.compressed,
+                "thaws": self.thaws,
+                "mean_thaw_ms": round(self.thaw_seconds / self.thaws * 1000, 3) if self.thaws else None,
+                "last_run": self.last_run
+            }
+
+    def shutdown(self):
+        self._closed.set()
+        with self._lock:
+            self._db.close()
+
+    def _candidates(self, user_path, cutoff):
+        """Regular files below user_path untouched since cutoff, outside git repositories"""
+        with self._lock:
+            known = dict(self._db.execute(
+                "SELECT path, mtime FROM cold_files WHERE path >= ? AND path < ?",
+                (self._key(user_path) + os.sep, self._key(user_path) + chr(ord(os.sep) + 1))
+            ).fetchall())
+        for directory, dirs, files in os.walk(user_path):
+            if ".git" in dirs or ".git" in files:
+                dirs[:] = []
+                continue
+            for name in files:
+                full_path = os.path.join(directory, name)
+                try:
+                    file_stat = os.lstat(full_path)
+                except FileNotFoundError:
+                    continue
+                if (not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < self.min_bytes
+                        or file_stat.st_nlink > 1 or max(file_stat.st_atime, file_stat.st_mtime) > cutoff):
+                    continue
+                # Already cold, or found not worth compressing at this mtime
+                if known.get(self._key(full_path)) == file_stat.st_mtime:
+                    continue
+                yield full_path, file_stat
+
+    def _prune(self):
+        """Drop manifest entries for files that were deleted or rewritten since they were recorded"""
+        with self._lock:
+            rows = self._db.execute("SELECT path, mtime FROM cold_files").fetchall()
+        stale = []
+        for path, mtime in rows:
+            try:
+                if os.lstat(os.path.join(self.storage_path, path)).st_mtime != mtime:
+                    stale.append((path,))
+            except FileNotFoundError:
+                stale.append((path,))
+        with self._lock:
+            self._db.executemany("DELETE FROM cold_files WHERE path = ?", stale)
+        return len(stale)
+
+    def _record(self, full_path, file_stat, codec, logical_size=None):
+        """Record a cold file, or with codec None one found not worth compressing"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cold_files (path, mtime, physical_size, logical_size, codec) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self._key(full_path), file_stat.st_mtime, file_stat.st_size,
+                 file_stat.st_size if logical_size is None else logical_size, codec)
+            )
+
+    def _forget(self, full_path):
+        with self._lock:
+            self._db.execute("DELETE FROM cold_files WHERE path = ?", (self._key(full_path),))
+
+    def _key(self, full_path):
+        return os.path.relpath(full_path, self.storage_path)
+
+    def _run_loop(self):
+        while not self._closed.wait(self.interval):
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        self.run()
+                else:
+                    self.run()
+            except Exception as e:
+                logger.warning(f"Cold tier pass failed: {str(e)}")
+
+
+def _identity(file_stat):
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+_tier = None
+_tier_lock = threading.Lock()
+
+
+def get_cold_tier(lock_for=None, on_change=None):
+    """Get the process-wide cold tier, or None if it is disabled"""
+    global _tier
+    config = current_app.config
+    if not config.get('COLD_TIER_ENABLED', False):
+        return None
+    with _tier_lock:
+        if _tier is None:
+            storage_path = config.get('STORAGE_PATH', 'storage')
+            _tier = ColdTier(
+                storage_path,
+                config.get('COLD_TIER_DB') or os.path.join(storage_path, '.cold', 'manifest.sqlite3'),
+                cold_after=config.get('COLD_TIER_AFTER', 30 * 24 * 3600),
+                min_bytes=config.get('COLD_TIER_MIN_BYTES', 4096),
+                codec=config.get('COLD_TIER_CODEC', 'gzip'),
+                level=config.get('COLD_TIER_LEVEL', 6),
+                interval=config.get('COLD_TIER_INTERVAL', 3600),
+                app=current_app._get_current_object(),
+                lock_for=lock_for,
+                on_change=on_change
+            )
+            _tier.start()
+    return _tier
+
+
+def shutdown_cold_tier():
+    """Close the tier and forget it"""
+    global _tier
+    with _tier_lock:
+        tier, _tier = _tier, None
+    if tier:
+        tier.shutdown()
+
+
+def peek_cold_tier():
+    """Return the tier if it has been created, without creating it"""
+    return _tier
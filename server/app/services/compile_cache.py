@@ -0,0 +1,173 @@
+# server/app/services/compile_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+
+
+class CompileCache:
+    """
+    Content-addressed on-disk cache of compiled artifacts
+    Entries live in <root>/<key[:2]>/<key>/ and are evicted least recently
+    used first once the cache grows past max_bytes. Each entry remembers how
+    long the original compile took so hits can report the time saved.
+    """
+
+    def __init__(self, root, max_bytes=256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+        os.makedirs(root, exist_ok=True)
+        self._entries = self._scan()
+
+    @staticmethod
+    def make_key(image, file_name, source):
+        """Key an entry by toolchain image, source file name and source text"""
+        digest = hashlib.sha256()
+        for part in (image, file_name, source):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Look up compiled artifacts
+        Returns ({file_name: bytes}, compile_time) or None on a miss
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, META_FILE)) as f:
+                meta = json.load(f)
+            files = {}
+            for name in meta["files"]:
+                with open(os.path.join(entry_dir, name), "rb") as f:
+                    files[name] = f.read()
+            # Touch the entry so LRU eviction keeps it
+            os.utime(os.path.join(entry_dir, META_FILE))
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.time_saved += meta["compile_time"]
+            if key in self._entries:
+                self._entries[key] = (time.time(), self._entries[key][1])
+        return files, meta["compile_time"]
+
+    def put(self, key, files, compile_time):
+        """Store compiled artifacts for key"""
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=self.root, prefix=".staging-")
+        try:
+            size = 0
+            for name, data in files.items():
+                with open(os.path.join(staging_dir, name), "wb") as f:
+                    f.write(data)
+                size += len(data)
+            with open(os.path.join(staging_dir, META_FILE), "w") as f:
+                json.dump({"files": sorted(files), "compile_time": compile_time, "size": size}, f)
+            os.rename(staging_dir, entry_dir)
+        except OSError as e:
+            # Another worker may have stored the same entry first
+            logger.debug(f"Compile cache store skipped for {key}: {str(e)}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time(), size)
+            self._evict()
+
+    def hit_ratio(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return round(self.hits / lookups, 3) if lookups else None
+
+    def stats(self):
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "time_saved": round(self.time_saved, 3),
+                "entries": len(self._entries),
+                "bytes": sum(size for _, size in self._entries.values()),
+                "max_bytes": self.max_bytes
+            }
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _scan(self):
+        """Rebuild the entry table from disk"""
+        entries = {}
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix.startswith(".") or not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                meta_path = os.path.join(prefix_dir, key, META_FILE)
+                try:
+                    with open(meta_path) as f:
+                        size = json.load(f)["size"]
+                    entries[key] = (os.path.getmtime(meta_path), size)
+                except (OSError, ValueError, KeyError):
+                    continue
+        return entries
+
+    def _evict(self):
+        """Remove least recently used entries until under max_bytes (lock held)"""
+        total = sum(size for _, size in self._entries.values())
+        if total <= self.max_bytes:
+            return
+
+        for key, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del self._entries[key]
+            total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_compile_cache():
+    """Get the process-wide compile cache, creating it from app config on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = current_app.config
+            _cache = CompileCache(
+                config.get('JAVA_COMPILE_CACHE_DIR'),
+                max_bytes=config.get('JAVA_COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+            )
+    return _cache
+
+
+def peek_compile_cache():
+    """Return the compile cache if it has been created, without creating it"""
+    return _cache
@@ -0,0 +1,453 @@
+# server/app/services/container_pool.py
+import atexit
+import io
+import logging
+import socket
+import tarfile
+import threading
+import time
+from collections import deque
+
+import docker
+from flask import current_app
+
+from app.services.docker_client import get_docker_client
+from app.services.resource_accounting import docker_limits, resolve_limits
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_WORKDIR = "/code"
+
+# Exit status used by coreutils `timeout` when the wall-clock limit is hit
+TIMEOUT_EXIT_CODE = 124
+
+RECYCLE_POLICIES = ("reset", "recycle")
+
+# bind: host temp dir mounted at /code (single-use containers only)
+# archive: in-memory tar copied in with put_archive
+# stdin: in-memory tar streamed over stdin into a tmpfs mounted at /code
+INJECTION_MODES = ("bind", "archive", "stdin")
+
+# Mount options for the in-memory work directory used by stdin injection
+TMPFS_OPTIONS = "size=64m,mode=1777"
+
+# Exit status of RESET_SCRIPT when processes other than PID 1 survive it
+RESET_LEFTOVER_EXIT_CODE = 3
+
+# Kills everything a run left behind, background processes included, then
+# wipes the scratch directories and checks that only PID 1 (and this shell)
+# remain. Orphans end up as zombies under `sleep infinity`, which never reaps
+# them, so those count as leftovers too: they hold PIDs against the limit.
+RESET_SCRIPT = f"""
+kill -9 -1 2>/dev/null
+rm -rf {SANDBOX_WORKDIR}/* {SANDBOX_WORKDIR}/.[!.]* /tmp/* /tmp/.[!.]* /dev/shm/* 2>/dev/null
+for attempt in 1 2 3 4 5 6 7 8 9 10; do
+    leftover=""
+    for entry in /proc/[0-9]*; do
+        pid=${{entry#/proc/}}
+        [ "$pid" = 1 ] || [ "$pid" = $$ ] || leftover="$leftover $pid"
+    done
+    [ -z "$leftover" ] && exit 0
+    sleep 0.05
+done
+echo "leftover processes:$leftover"
+exit {RESET_LEFTOVER_EXIT_CODE}
+"""
+
+
+def make_tar(files, directory=None):
+    """
+    Build an in-memory tar archive from a {name: str|bytes} mapping
+    With directory, members are placed under that directory, which is created
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        if directory:
+            info = tarfile.TarInfo(name=directory)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o777
+            info.mtime = int(time.time())
+            tar.addfile(info)
+        for name, content in files.items():
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            info = tarfile.TarInfo(name=f"{directory}/{name}" if directory else name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def read_tar(data, suffixes):
+    """Extract top-level files whose names end with one of suffixes from a tar archive"""
+    files = {}
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r") as tar:
+        for member in tar:
+            parts = member.name.split("/")
+            # get_archive prefixes members with the archived directory's name
+            if member.isfile() and len(parts) == 2 and parts[1].endswith(tuple(suffixes)):
+                files[parts[1]] = tar.extractfile(member).read()
+    return files
+
+
+def send_and_close(sock, data):
+    """Write data to an attach or exec socket, then signal end of input"""
+    raw = getattr(sock, "_sock", sock)
+    raw.sendall(data)
+    raw.shutdown(socket.SHUT_WR)
+
+
+def _with_timeout(command, timeout):
+    """Wrap a shell command so it is killed after the wall-clock timeout"""
+    return ["timeout", "-k", "1", str(timeout), "sh", "-c", command]
+
+
+class Sandbox:
+    """
+    A long-running, network-disabled container that runs code through exec
+    Files reach /code either through put_archive ('archive') or as a tar
+    streamed over exec stdin into a tmpfs ('stdin'); neither touches the
+    host filesystem.
+    """
+
+    def __init__(self, image, language, injection="archive", limits=None):
+        self.image = image
+        self.language = language
+        self.injection = "stdin" if injection == "stdin" else "archive"
+        self.limits = dict(limits or resolve_limits(language))
+        self.uses = 0
+        # Set once a command hits its timeout or a reset finds processes it
+        # could not kill, since those may still be running in the sandbox
+        self.tainted = False
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+        options = {}
+        if self.injection == "stdin":
+            options["tmpfs"] = {SANDBOX_WORKDIR: TMPFS_OPTIONS}
+
+        self.container = get_docker_client().containers.run(
+            image=image,
+            command=["sleep", "infinity"],
+            working_dir=SANDBOX_WORKDIR,
+            detach=True,
+            network_disabled=True,
+            labels={"cloud-ide.sandbox": language},
+            **options,
+            **docker_limits(self.limits)
+        )
+
+    def apply_limits(self, limits):
+        """Update memory and CPU limits in place when a run needs different ones"""
+        wanted = {key: limits[key] for key in ("memory", "memory_swap", "cpus")}
+        current = {key: self.limits[key] for key in wanted}
+        if wanted == current:
+            return
+        self.container.update(**docker_limits(limits, include_pids=False))
+        self.limits.update(wanted)
+
+    def inject(self, files):
+        """Copy files into the sandbox work directory"""
+        data = make_tar(files)
+        if self.injection == "stdin":
+            self._exec_with_stdin(["tar", "-xf", "-", "-C", SANDBOX_WORKDIR], data)
+        else:
+            self.container.put_archive(SANDBOX_WORKDIR, data)
+
+    def run(self, command, timeout):
+        """
+        Run a shell command inside the sandbox
+        Returns (exit_code, stdout, stderr, timed_out)
+        """
+        exit_code, output = self.container.exec_run(
+            _with_timeout(command, timeout),
+            workdir=SANDBOX_WORKDIR,
+            demux=True
+        )
+        stdout, stderr = output if output else (None, None)
+        timed_out = exit_code == TIMEOUT_EXIT_CODE
+        self.tainted = self.tainted or timed_out
+        return (
+            exit_code,
+            (stdout or b"").decode("utf-8", errors="replace"),
+            (stderr or b"").decode("utf-8", errors="replace"),
+            timed_out
+        )
+
+    def stream(self, command, timeout):
+        """
+        Run a shell command inside the sandbox, yielding demultiplexed
+        (stdout, stderr) byte chunks as they are produced
+        Returns (exit_code, timed_out) when the command finishes
+        """
+        api = self.container.client.api
+        exec_id = api.exec_create(
+            self.container.id,
+            _with_timeout(command, timeout),
+            workdir=SANDBOX_WORKDIR
+        )["Id"]
+        yield from api.exec_start(exec_id, stream=True, demux=True)
+        exit_code = api.exec_inspect(exec_id)["ExitCode"]
+        timed_out = exit_code == TIMEOUT_EXIT_CODE
+        self.tainted = self.tainted or timed_out
+        return exit_code, timed_out
+
+    def collect(self, suffixes):
+        """Read back work directory files whose names end with one of suffixes"""
+        if self.injection == "stdin":
+            # put_archive/get_archive do not see inside tmpfs mounts
+            exit_code, output = self.container.exec_run(
+                ["tar", "-cf", "-", "-C", SANDBOX_WORKDIR, "."], demux=True)
+            if exit_code != 0:
+                raise RuntimeError(f"Failed to read files from sandbox {self.container.short_id}")
+            return read_tar(output[0] or b"", suffixes)
+
+        chunks, _ = self.container.get_archive(SANDBOX_WORKDIR)
+        return read_tar(b"".join(chunks), suffixes)
+
+    def reset(self):
+        """
+        Kill leftover processes and wipe the work directory and /tmp so the
+        next lease starts clean; marks the sandbox tainted if any process
+        other than PID 1 survives
+        """
+        exit_code, output = self.container.exec_run(["sh", "-c", RESET_SCRIPT], workdir="/")
+        if exit_code == RESET_LEFTOVER_EXIT_CODE:
+            logger.warning(f"Sandbox {self.container.short_id} still has processes after reset: "
+                           f"{(output or b'').decode('utf-8', errors='replace').strip()}")
+            self.tainted = True
+        elif exit_code != 0:
+            raise RuntimeError(f"Failed to reset sandbox {self.container.short_id}")
+        self.last_used = time.time()
+
+    def _exec_with_stdin(self, command, data):
+        """Run a command with data as its stdin and wait for it to exit cleanly"""
+        api = self.container.client.api
+        exec_id = api.exec_create(self.container.id, command, stdin=True)["Id"]
+        sock = api.exec_start(exec_id, socket=True)
+        try:
+            send_and_close(sock, data)
+            raw = getattr(sock, "_sock", sock)
+            while raw.recv(4096):
+                pass
+        finally:
+            sock.close()
+
+        # The exit code can lag slightly behind the end of the output stream
+        for _ in range(50):
+            info = api.exec_inspect(exec_id)
+            if not info["Running"]:
+                break
+            time.sleep(0.02)
+        if info["ExitCode"] != 0:
+            raise RuntimeError(f"Failed to inject files into sandbox {self.container.short_id}")
+
+    def destroy(self):
+        """Remove the underlying container"""
+        try:
+            self.container.remove(force=True)
+        except docker.errors.APIError as e:
+            logger.warning(f"Failed to remove sandbox {self.container.short_id}: {str(e)}")
+
+
+class ContainerPool:
+    """
+    Per-language pool of pre-started sandboxes
+    Leases hand out an idle sandbox when one is available (hit) and start a new
+    one otherwise (miss). Returned sandboxes are reset and reused until they
+    reach max_uses, or discarded straight away with the 'recycle' policy.
+    """
+
+    def __init__(self, images, size=2, max_idle=300, max_uses=20, recycle_policy="reset",
+                 injection="archive", limits=None):
+        if recycle_policy not in RECYCLE_POLICIES:
+            raise ValueError(f"Unknown recycle policy: {recycle_policy}")
+        if injection not in INJECTION_MODES:
+            raise ValueError(f"Unknown injection mode: {injection}")
+
+        self.images = dict(images)
+        self.size = size
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.recycle_policy = recycle_policy
+        self.injection = injection
+        # Limits sandboxes are started with, per language
+        self.limits = dict(limits or {})
+
+        self._idle = {language: deque() for language in self.images}
+        self._lock = threading.Lock()
+        self._replenishing = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.expired = 0
+
+    def lease(self, language, limits=None):
+        """Take a sandbox for a single run, adjusted to limits if given"""
+        if language not in self.images:
+            raise ValueError(f"Unsupported language: {language}")
+
+        expired = []
+        sandbox = None
+        with self._lock:
+            idle = self._idle[language]
+            while idle:
+                candidate = idle.popleft()
+                if time.time() - candidate.last_used > self.max_idle:
+                    expired.append(candidate)
+                    continue
+                sandbox = candidate
+                break
+
+            if sandbox:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.expired += len(expired)
+
+        for candidate in expired:
+            candidate.destroy()
+
+        if sandbox is None:
+            sandbox = Sandbox(self.images[language], language, self.injection,
+                              self.limits.get(language))
+
+        self._replenish_async(language)
+
+        if limits:
+            try:
+                sandbox.apply_limits(limits)
+            except Exception:
+                self._discard(sandbox)
+                raise
+        return sandbox
+
+    def release(self, sandbox, healthy=True):
+        """Return a sandbox after a run, resetting or recycling it"""
+        sandbox.uses += 1
+
+        if (not healthy or sandbox.tainted or self.recycle_policy == "recycle"
+                or sandbox.uses >= self.max_uses):
+            self._discard(sandbox)
+            self._replenish_async(sandbox.language)
+            return
+
+        try:
+            sandbox.reset()
+        except Exception as e:
+            logger.warning(f"Sandbox reset failed, recycling: {str(e)}")
+            self._discard(sandbox)
+            self._replenish_async(sandbox.language)
+            return
+        if sandbox.tainted:
+            self._discard(sandbox)
+            self._replenish_async(sandbox.language)
+            return
+
+        with self._lock:
+            idle = self._idle[sandbox.language]
+            if len(idle) < self.size:
+                idle.append(sandbox)
+                return
+        sandbox.destroy()
+
+    def warm(self):
+        """Start sandboxes for every language up to the pool size"""
+        for language in self.images:
+            self._replenish_async(language)
+
+    def stats(self):
+        """Pool counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "recycled": self.recycled,
+                "expired": self.expired,
+                "idle": {language: len(idle) for language, idle in self._idle.items()},
+                "size": self.size,
+                "max_idle": self.max_idle,
+                "max_uses": self.max_uses,
+                "recycle_policy": self.recycle_policy,
+                "injection": self.injection
+            }
+
+    def shutdown(self):
+        """Remove all idle sandboxes"""
+        with self._lock:
+            sandboxes = [s for idle in self._idle.values() for s in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for sandbox in sandboxes:
+            sandbox.destroy()
+
+    def _discard(self, sandbox):
+        with self._lock:
+            self.recycled += 1
+        sandbox.destroy()
+
+    def _replenish_async(self, language):
+        with self._lock:
+            if language in self._replenishing or len(self._idle[language]) >= self.size:
+                return
+            self._replenishing.add(language)
+
+        thread = threading.Thread(target=self._replenish, args=(language,), daemon=True)
+        thread.start()
+
+    def _replenish(self, language):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._idle[language]) >= self.size:
+                        return
+                sandbox = Sandbox(self.images[language], language, self.injection,
+                                  self.limits.get(language))
+                with self._lock:
+                    self._idle[language].append(sandbox)
+        except Exception as e:
+            logger.warning(f"Failed to warm {language} sandbox: {str(e)}")
+        finally:
+            with self._lock:
+                self._replenishing.discard(language)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_container_pool(images):
+    """Get the process-wide container pool, creating it from app config on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = current_app.config
+            _pool = ContainerPool(
+                images,
+                size=config.get('CONTAINER_POOL_SIZE', 2),
+                max_idle=config.get('CONTAINER_POOL_MAX_IDLE', 300),
+                max_uses=config.get('CONTAINER_POOL_MAX_USES', 20),
+                recycle_policy=config.get('CONTAINER_POOL_RECYCLE_POLICY', 'reset'),
+                injection=config.get('EXECUTION_INJECTION_MODE', 'archive'),
+                limits={language: resolve_limits(language) for language in images}
+            )
+            atexit.register(_pool.shutdown)
+            _pool.warm()
+    return _pool
+
+
+def shutdown_container_pool():
+    """Remove the pool's sandboxes and forget it so the next use rebuilds it from config"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown()
+
+
+def peek_container_pool():
+    """Return the pool if it has been created, without creating it"""
+    return _pool
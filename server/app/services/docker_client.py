@@ -0,0 +1,155 @@
+# server/app/services/docker_client.py
+import logging
+import threading
+import time
+
+import docker
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_factory = None
+_client_lock = threading.Lock()
+_last_health_check = 0.0
+_healthy = None
+_image_status = {}
+_image_ids = {}
+
+# Defaults used until configure_docker_client() is called with app config
+_settings = {
+    "base_url": None,
+    "max_pool_size": 10,
+    "timeout": 60,
+    "health_check_interval": 30
+}
+
+
+def configure_docker_client(config):
+    """Apply Docker settings from the app config"""
+    _settings["base_url"] = config.get('DOCKER_BASE_URL') or None
+    _settings["max_pool_size"] = config.get('DOCKER_MAX_POOL_SIZE', 10)
+    _settings["timeout"] = config.get('DOCKER_TIMEOUT', 60)
+    _settings["health_check_interval"] = config.get('DOCKER_HEALTH_CHECK_INTERVAL', 30)
+
+
+def set_docker_client(client):
+    """
+    Replace the shared client, e.g. with a local stand-in for the Docker API in tests
+    Passing None drops the current client so the next call reconnects
+    """
+    global _client, _last_health_check, _healthy
+    with _client_lock:
+        _client = client
+        _last_health_check = time.time() if client is not None else 0.0
+        _healthy = True if client is not None else None
+
+
+def set_docker_client_factory(factory):
+    """Use factory() instead of the environment to build the shared client"""
+    global _client_factory
+    _client_factory = factory
+    set_docker_client(None)
+
+
+def get_docker_client():
+    """
+    Get the process-wide Docker client
+    The client keeps one HTTP connection pool for the whole process and is
+    pinged at most every health_check_interval seconds; a client that fails
+    its health check is replaced.
+    """
+    global _client, _last_health_check, _healthy
+    with _client_lock:
+        now = time.time()
+        if _client is not None and now - _last_health_check < _settings["health_check_interval"]:
+            return _client
+
+        if _client is not None:
+            try:
+                _client.ping()
+                _last_health_check = now
+                _healthy = True
+                return _client
+            except Exception as e:
+                logger.warning(f"Docker health check failed, reconnecting: {str(e)}")
+                _close_quietly(_client)
+                _client = None
+
+        try:
+            _client = _create_client()
+            _client.ping()
+            _healthy = True
+        except Exception:
+            _healthy = False
+            _client = None
+            raise
+        _last_health_check = now
+        return _client
+
+
+def prepull_images(images):
+    """
+    Make sure every image is present locally, pulling the missing ones
+    Returns {image: status} where status is 'present', 'pulled' or an error message
+    """
+    client = get_docker_client()
+    for image in images:
+        try:
+            client.images.get(image)
+            status = "present"
+        except docker.errors.ImageNotFound:
+            try:
+                repository, _, tag = image.partition(":")
+                client.images.pull(repository, tag=tag or "latest")
+                client.images.get(image)
+                status = "pulled"
+            except Exception as e:
+                status = f"error: {str(e)}"
+        except Exception as e:
+            status = f"error: {str(e)}"
+
+        _image_status[image] = status
+        _image_ids.pop(image, None)
+        logger.info(f"Docker image {image}: {status}")
+    return dict(_image_status)
+
+
+def get_image_id(image):
+    """
+    Get the local image ID (content digest) for an image tag
+    IDs are remembered until the image is pulled again
+    """
+    image_id = _image_ids.get(image)
+    if image_id is None:
+        image_id = get_docker_client().images.get(image).id
+        _image_ids[image] = image_id
+    return image_id
+
+
+def docker_stats():
+    """Health of the shared client and status of pre-pulled images"""
+    return {
+        "healthy": _healthy,
+        "last_health_check": _last_health_check or None,
+        "base_url": _settings["base_url"],
+        "max_pool_size": _settings["max_pool_size"],
+        "images": dict(_image_status)
+    }
+
+
+def _create_client():
+    if _client_factory is not None:
+        return _client_factory()
+    if _settings["base_url"]:
+        return docker.DockerClient(base_url=_settings["base_url"],
+                                   timeout=_settings["timeout"],
+                                   max_pool_size=_settings["max_pool_size"])
+    return docker.from_env(timeout=_settings["timeout"],
+                           max_pool_size=_settings["max_pool_size"])
+
+
+def _close_quietly(client):
+    try:
+        client.close()
+    except Exception:
+        pass
@@ -0,0 +1,735 @@
+# server/app/services/execution_backends.py
+import contextlib
+import logging
+import math
+import os
+import selectors
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import docker
+import requests
+from flask import current_app
+
+from app.services.container_pool import (
+    INJECTION_MODES,
+    SANDBOX_WORKDIR,
+    TMPFS_OPTIONS,
+    Sandbox,
+    get_container_pool,
+    make_tar,
+    peek_container_pool,
+    read_tar,
+    send_and_close,
+    shutdown_container_pool
+)
+from app.services.docker_client import docker_stats, get_docker_client, get_image_id
+from app.services.resource_accounting import (
+    PHASES,
+    ResourceMonitor,
+    docker_limits,
+    parse_size
+)
+
+logger = logging.getLogger(__name__)
+
+# Exit status reported for a process killed by a signal, as shells and Docker do
+SIGNAL_EXIT_BASE = 128
+
+
+def build_result(execution_id, image, stdout, stderr, exit_code, timed_out, execution_time,
+                 phases=None, usage=None, limits=None):
+    """
+    Build the execution result returned to API clients
+    execution_time covers the whole backend round trip; phases splits it into
+    create (lease or start plus injection), run and collect, and resources
+    carries CPU time and memory (bytes) when they could be measured:
+    peak_memory is a true high-water mark, sampled_memory the largest of a
+    few working set samples (see ResourceMonitor)
+    """
+    phases = phases or {}
+    usage = usage or {}
+    return {
+        "execution_id": execution_id,
+        "language": language_from_image(image),
+        "stdout": stdout,
+        "stderr": stderr,
+        "exit_code": exit_code,
+        "timed_out": timed_out,
+        "execution_time": round(execution_time, 3),
+        "phases": {
+            phase: round(phases[phase], 3) if phase in phases else None
+            for phase in PHASES
+        },
+        "resources": {
+            "cpu_time": usage.get("cpu_time"),
+            "peak_memory": usage.get("peak_memory"),
+            "sampled_memory": usage.get("sampled_memory"),
+            "limits": limits
+        }
+    }
+
+
+def language_from_image(image):
+    """Get language name from a language image"""
+    if "python" in image:
+        return "python"
+    elif "node" in image:
+        return "javascript"
+    elif "openjdk" in image:
+        return "java"
+    return "unknown"
+
+
+class ExecutionBackend:
+    """
+    An engine that runs prepared shell commands against a set of files
+    run() executes one command and returns (result, collected files);
+    stream() is a generator of (stdout, stderr) byte chunks that returns
+    (exit_code, timed_out); session() yields a sandbox with inject(), run(),
+    stream() and collect() for several commands over the same files.
+    Every engine reports results through build_result().
+    """
+
+    name = None
+
+    def run(self, image, execution_id, run_command, files, input_data, limits, collect=()):
+        raise NotImplementedError
+
+    def stream(self, image, command, files, limits):
+        raise NotImplementedError
+
+    def session(self, image, limits):
+        raise NotImplementedError
+
+    def environment_id(self, image):
+        """Identify the exact toolchain behind image, for keying cached results"""
+        raise NotImplementedError
+
+    def format_error(self, error):
+        return f"Execution error: {str(error)}"
+
+    def stats(self):
+        return {}
+
+    def shutdown(self):
+        pass
+
+
+class DockerBackend(ExecutionBackend):
+    """
+    Runs code in network-disabled Docker containers
+    Runs use warm sandboxes from the container pool when it is enabled and
+    single-use containers otherwise.
+    """
+
+    name = "docker"
+
+    def __init__(self, images, pooled=True, injection="archive", accounting=True,
+                 stats_interval=0.25):
+        if injection not in INJECTION_MODES:
+            raise ValueError(f"Unknown injection mode: {injection}")
+        self.images = images
+        self.pooled = pooled
+        self.injection = injection
+        self.accounting = accounting
+        self.stats_interval = stats_interval
+
+    @classmethod
+    def from_config(cls, config, images):
+        return cls(
+            images,
+            pooled=config.get('CONTAINER_POOL_ENABLED', True),
+            injection=config.get('EXECUTION_INJECTION_MODE', 'archive'),
+            accounting=config.get('EXECUTION_ACCOUNTING_ENABLED', True),
+            stats_interval=config.get('EXECUTION_STATS_INTERVAL', 0.25)
+        )
+
+    def run(self, image, execution_id, run_command, files, input_data, limits, collect=()):
+        """
+        Execute code in a Docker container with the specified image
+        files maps work directory file names to their content. Files left in the
+        work directory whose names end with one of the collect suffixes are read
+        back after the run. Returns (result, {file_name: bytes})
+        """
+        command = f"{run_command} < input.txt"
+        if self.pooled:
+            return self._run_in_pool(image, execution_id, command, files,
+                                     input_data, limits, collect)
+
+        collected = {}
+        phases = {}
+        usage = {}
+        start_time = time.time()
+        exit_code = None
+        timed_out = False
+        try:
+            with self._one_off_container(image, command, {**files, 'input.txt': input_data},
+                                         limits) as (container, read_back):
+                run_start = time.time()
+                phases["create"] = run_start - start_time
+                monitor = self._start_monitor(container, fresh=True)
+
+                # Wait for container to finish with timeout
+                try:
+                    exit_code = container.wait(timeout=limits["timeout"]).get('StatusCode')
+                except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+                    timed_out = True
+                    container.kill()
+                finally:
+                    if monitor:
+                        usage = monitor.stop()
+
+                collect_start = time.time()
+                phases["run"] = collect_start - run_start
+
+                # Get container logs
+                stdout = container.logs(stdout=True, stderr=False).decode('utf-8', errors='replace')
+                stderr = container.logs(stdout=False, stderr=True).decode('utf-8', errors='replace')
+
+                if collect:
+                    collected = read_back(collect)
+
+        except docker.errors.ContainerError as e:
+            stdout = ""
+            stderr = str(e)
+        except Exception as e:
+            stdout = ""
+            stderr = self.format_error(e)
+
+        end_time = time.time()
+        if "run" in phases:
+            phases["collect"] = end_time - collect_start
+
+        result = build_result(execution_id, image, stdout, stderr,
+                              exit_code, timed_out, end_time - start_time,
+                              phases, usage, limits)
+        return result, collected
+
+    def stream(self, image, command, files, limits):
+        """Run command, yielding (stdout, stderr) chunks; returns (exit_code, timed_out)"""
+        if self.pooled:
+            with self.session(image, limits) as sandbox:
+                sandbox.inject(files)
+                return (yield from sandbox.stream(command, limits["timeout"]))
+        return (yield from self._stream_from_container(image, command, files, limits))
+
+    @contextlib.contextmanager
+    def session(self, image, limits):
+        """
+        Yield a sandbox leased from the pool, or a dedicated one when pooling is off
+        Sandboxes that timed out or were abandoned mid-run are recycled, not reused
+        """
+        language = language_from_image(image)
+        pool = get_container_pool(self.images) if self.pooled else None
+        sandbox = pool.lease(language, limits) if pool else Sandbox(
+            image, language, self.injection, limits)
+        healthy = False
+        try:
+            yield sandbox
+            healthy = True
+        finally:
+            if pool:
+                pool.release(sandbox, healthy=healthy)
+            else:
+                sandbox.destroy()
+
+    def environment_id(self, image):
+        return get_image_id(image)
+
+    def format_error(self, error):
+        if isinstance(error, docker.errors.APIError):
+            return f"Docker API error: {str(error)}"
+        return super().format_error(error)
+
+    def stats(self):
+        pool = peek_container_pool()
+        return {
+            "pool": pool.stats() if pool else None,
+            "docker": docker_stats()
+        }
+
+    def shutdown(self):
+        shutdown_container_pool()
+
+    def _run_in_pool(self, image, execution_id, command, files, input_data, limits, collect=()):
+        """Execute code in a warm sandbox leased from the container pool"""
+        collected = {}
+        phases = {}
+        usage = {}
+
+        start_time = time.time()
+        exit_code = None
+        timed_out = False
+        try:
+            with self.session(image, limits) as sandbox:
+                sandbox.inject({**files, 'input.txt': input_data})
+                monitor = self._start_monitor(sandbox.container)
+
+                run_start = time.time()
+                phases["create"] = run_start - start_time
+                try:
+                    exit_code, stdout, stderr, timed_out = sandbox.run(command, limits["timeout"])
+                finally:
+                    if monitor:
+                        usage = monitor.stop()
+                collect_start = time.time()
+                phases["run"] = collect_start - run_start
+
+                if collect:
+                    collected = sandbox.collect(collect)
+        except Exception as e:
+            stdout = ""
+            stderr = self.format_error(e)
+
+        end_time = time.time()
+        if "run" in phases:
+            phases["collect"] = end_time - collect_start
+
+        result = build_result(execution_id, image, stdout, stderr,
+                              exit_code, timed_out, end_time - start_time,
+                              phases, usage, limits)
+        return result, collected
+
+    def _start_monitor(self, container, fresh=False):
+        """Start sampling container resource use, if accounting is enabled"""
+        if not self.accounting:
+            return None
+        return ResourceMonitor(container, interval=self.stats_interval, fresh=fresh).start()
+
+    @contextlib.contextmanager
+    def _one_off_container(self, image, command, files, limits):
+        """
+        Start a single-use container running command with files in its work directory
+        Depending on the injection mode the files are bind-mounted from a host
+        temp directory ('bind'), copied into the container before it starts
+        ('archive'), or streamed as a tar over stdin into a tmpfs ('stdin').
+        Yields (container, read_back) where read_back(suffixes) returns work
+        directory files after the run; the container is removed on exit.
+        """
+        mode = self.injection
+        client = get_docker_client()
+        options = dict(
+            image=image,
+            working_dir=SANDBOX_WORKDIR,
+            network_disabled=True,
+            **docker_limits(limits)
+        )
+        temp_dir = None
+        container = None
+        try:
+            if mode == 'bind':
+                temp_dir = tempfile.mkdtemp()
+                for name, content in files.items():
+                    file_mode = 'wb' if isinstance(content, bytes) else 'w'
+                    with open(os.path.join(temp_dir, name), file_mode) as f:
+                        f.write(content)
+                container = client.containers.run(
+                    command=["sh", "-c", command],
+                    volumes={temp_dir: {'bind': SANDBOX_WORKDIR, 'mode': 'rw'}},
+                    detach=True,
+                    **options
+                )
+            elif mode == 'stdin':
+                container = client.containers.create(
+                    command=["sh", "-c", f"tar -xf - -C {SANDBOX_WORKDIR} && {command}"],
+                    tmpfs={SANDBOX_WORKDIR: TMPFS_OPTIONS},
+                    stdin_open=True,
+                    stdin_once=True,
+                    **options
+                )
+                sock = container.attach_socket(params={'stdin': 1, 'stream': 1})
+                try:
+                    container.start()
+                    send_and_close(sock, make_tar(files))
+                finally:
+                    sock.close()
+            else:
+                container = client.containers.create(command=["sh", "-c", command], **options)
+                container.put_archive("/", make_tar(files, directory=SANDBOX_WORKDIR.lstrip("/")))
+                container.start()
+
+            def read_back(suffixes):
+                if temp_dir:
+                    collected = {}
+                    for name in os.listdir(temp_dir):
+                        if name.endswith(tuple(suffixes)):
+                            with open(os.path.join(temp_dir, name), 'rb') as f:
+                                collected[name] = f.read()
+                    return collected
+                if mode == 'archive':
+                    chunks, _ = container.get_archive(SANDBOX_WORKDIR)
+                    return read_tar(b"".join(chunks), suffixes)
+                # The tmpfs is gone once the container exits
+                return {}
+
+            yield container, read_back
+        finally:
+            # Clean up
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except docker.errors.APIError:
+                    pass
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _stream_from_container(self, image, command, files, limits):
+        """Run in a fresh container, yielding (stdout, stderr) chunks from its attach stream"""
+        with self._one_off_container(image, command, files, limits) as (container, _):
+            killed = threading.Event()
+
+            def kill():
+                killed.set()
+                try:
+                    container.kill()
+                except docker.errors.APIError:
+                    pass
+
+            watchdog = threading.Timer(limits["timeout"], kill)
+            watchdog.start()
+            try:
+                yield from container.attach(stdout=True, stderr=True, stream=True,
+                                            demux=True, logs=True)
+                exit_code = container.wait().get('StatusCode')
+                return exit_code, killed.is_set()
+            finally:
+                watchdog.cancel()
+
+
+class LocalProcess:
+    """
+    A shell command running in its own session and process group
+    The whole group is killed with SIGKILL once timeout seconds have passed,
+    and again when the shell exits so background children cannot linger.
+    """
+
+    def __init__(self, command, cwd, env, timeout, stdout, stderr):
+        self.popen = subprocess.Popen(
+            ["sh", "-c", command],
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            start_new_session=True
+        )
+        self.timed_out = False
+        self.reaped = False
+        self._lock = threading.Lock()
+        self._watchdog = threading.Timer(timeout, self._expire)
+        self._watchdog.daemon = True
+        self._watchdog.start()
+
+    def wait(self):
+        """
+        Wait for the shell to exit, then reap it
+        Returns (exit_code, usage) where usage holds the CPU time and peak
+        resident memory of the shell and the children it waited for
+        """
+        # Wait without reaping so the group ID cannot be reused before the kill below
+        os.waitid(os.P_PID, self.popen.pid, os.WEXITED | os.WNOWAIT)
+        with self._lock:
+            self._watchdog.cancel()
+            self._kill_group()
+            _, status, rusage = os.wait4(self.popen.pid, 0)
+            self.reaped = True
+
+        exit_code = os.waitstatus_to_exitcode(status)
+        if exit_code < 0:
+            exit_code = SIGNAL_EXIT_BASE - exit_code
+        # Stop Popen from trying to reap the process again
+        self.popen.returncode = exit_code
+        return exit_code, {
+            "cpu_time": round(rusage.ru_utime + rusage.ru_stime, 3),
+            "peak_memory": rusage.ru_maxrss * 1024  # kilobytes on Linux
+        }
+
+    def kill(self):
+        with self._lock:
+            if not self.reaped:
+                self._kill_group()
+
+    def _expire(self):
+        with self._lock:
+            if not self.reaped:
+                self.timed_out = True
+                self._kill_group()
+
+    def _kill_group(self):
+        try:
+            os.killpg(self.popen.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class LocalSession:
+    """
+    A scratch work directory on the host that commands run in as local processes
+    Output is captured in files next to, not inside, the work directory.
+    """
+
+    def __init__(self, backend, language, limits):
+        self.backend = backend
+        self.language = language
+        self.limits = limits
+        self.tainted = False
+        self.usage = {}
+        self.root = tempfile.mkdtemp(dir=backend.root, prefix="run-")
+        self.work_dir = os.path.join(self.root, "code")
+        os.mkdir(self.work_dir)
+
+    def inject(self, files):
+        """Write files into the work directory"""
+        for name, content in files.items():
+            file_mode = 'wb' if isinstance(content, bytes) else 'w'
+            with open(os.path.join(self.work_dir, name), file_mode) as f:
+                f.write(content)
+
+    def run(self, command, timeout):
+        """
+        Run a shell command in the work directory
+        Returns (exit_code, stdout, stderr, timed_out)
+        """
+        fd, stdout_path = tempfile.mkstemp(dir=self.root, prefix="stdout-")
+        os.close(fd)
+        fd, stderr_path = tempfile.mkstemp(dir=self.root, prefix="stderr-")
+        os.close(fd)
+        try:
+            with open(stdout_path, 'wb') as stdout, open(stderr_path, 'wb') as stderr:
+                process = self._start(command, timeout, stdout, stderr)
+                exit_code, self.usage = process.wait()
+            with open(stdout_path, 'rb') as f:
+                stdout = f.read().decode('utf-8', errors='replace')
+            with open(stderr_path, 'rb') as f:
+                stderr = f.read().decode('utf-8', errors='replace')
+        finally:
+            os.remove(stdout_path)
+            os.remove(stderr_path)
+
+        self.backend.count(process.timed_out)
+        return exit_code, stdout, stderr, process.timed_out
+
+    def stream(self, command, timeout):
+        """
+        Run a shell command, yielding (stdout, stderr) byte chunks as they are produced
+        Returns (exit_code, timed_out) when the command finishes
+        """
+        process = self._start(command, timeout, subprocess.PIPE, subprocess.PIPE)
+        pipes = {process.popen.stdout: 0, process.popen.stderr: 1}
+        selector = selectors.DefaultSelector()
+        try:
+            for pipe in pipes:
+                selector.register(pipe, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    chunk = os.read(key.fd, 64 * 1024)
+                    if not chunk:
+                        selector.unregister(key.fileobj)
+                        continue
+                    yield (chunk, None) if pipes[key.fileobj] == 0 else (None, chunk)
+
+            exit_code, self.usage = process.wait()
+            self.backend.count(process.timed_out)
+            return exit_code, process.timed_out
+        finally:
+            selector.close()
+            if not process.reaped:
+                # Abandoned mid-stream
+                process.kill()
+                process.wait()
+            for pipe in pipes:
+                pipe.close()
+
+    def collect(self, suffixes):
+        """Read back work directory files whose names end with one of suffixes"""
+        collected = {}
+        for name in os.listdir(self.work_dir):
+            path = os.path.join(self.work_dir, name)
+            if name.endswith(tuple(suffixes)) and os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    collected[name] = f.read()
+        return collected
+
+    def destroy(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _start(self, command, timeout, stdout, stderr):
+        limited = f"{self.backend.ulimits(self.language, self.limits, timeout)}{command}"
+        env = self.backend.environment(self.work_dir)
+        return LocalProcess(limited, self.work_dir, env, timeout, stdout, stderr)
+
+
+class LocalProcessBackend(ExecutionBackend):
+    """
+    Runs code as local processes, for trusted and development deployments only
+    There is no filesystem or network isolation. Each run gets a scratch
+    directory, a minimal environment, ulimits for CPU time and memory, its own
+    session and process group, and a wall-clock kill of the whole group.
+    The cpus and pids limits are not enforced: without cgroups a CPU share
+    cannot be expressed, and RLIMIT_NPROC counts every process of the user.
+    """
+
+    name = "local"
+
+    # The JVM sizes its heap from physical memory rather than from rlimits and
+    # fails at startup under a data segment cap, so Java is bounded by CPU
+    # time and the wall clock alone
+    UNCAPPED_MEMORY_LANGUAGES = ("java",)
+
+    def __init__(self, root=None, aliases=None):
+        self.root = tempfile.mkdtemp(dir=root, prefix="cloud-ide-local-")
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.timeouts = 0
+
+        # Commands used by the language images may be named differently on the host
+        self.bin_dir = os.path.join(self.root, "bin")
+        os.mkdir(self.bin_dir)
+        aliases = dict(aliases or {})
+        if "python" not in aliases and not shutil.which("python"):
+            aliases["python"] = sys.executable
+        for name, target in aliases.items():
+            os.symlink(target, os.path.join(self.bin_dir, name))
+
+    @classmethod
+    def from_config(cls, config, images):
+        return cls(root=config.get('LOCAL_EXECUTION_ROOT') or None,
+                   aliases=config.get('LOCAL_EXECUTION_ALIASES'))
+
+    def run(self, image, execution_id, run_command, files, input_data, limits, collect=()):
+        """Execute code as a local process. Returns (result, {file_name: bytes})"""
+        collected = {}
+        phases = {}
+        usage = {}
+
+        start_time = time.time()
+        exit_code = None
+        timed_out = False
+        try:
+            with self.session(image, limits) as session:
+                session.inject({**files, 'input.txt': input_data})
+
+                run_start = time.time()
+                phases["create"] = run_start - start_time
+                exit_code, stdout, stderr, timed_out = session.run(
+                    f"{run_command} < input.txt", limits["timeout"])
+                usage = session.usage
+                collect_start = time.time()
+                phases["run"] = collect_start - run_start
+
+                if collect:
+                    collected = session.collect(collect)
+        except Exception as e:
+            stdout = ""
+            stderr = self.format_error(e)
+
+        end_time = time.time()
+        if "run" in phases:
+            phases["collect"] = end_time - collect_start
+
+        result = build_result(execution_id, image, stdout, stderr,
+                              exit_code, timed_out, end_time - start_time,
+                              phases, usage, limits)
+        return result, collected
+
+    def stream(self, image, command, files, limits):
+        """Run command, yielding (stdout, stderr) chunks; returns (exit_code, timed_out)"""
+        with self.session(image, limits) as session:
+            session.inject(files)
+            return (yield from session.stream(command, limits["timeout"]))
+
+    @contextlib.contextmanager
+    def session(self, image, limits):
+        session = LocalSession(self, language_from_image(image), limits)
+        try:
+            yield session
+        finally:
+            session.destroy()
+
+    def environment_id(self, image):
+        return f"local:{image}"
+
+    def ulimits(self, language, limits, timeout):
+        """Shell prefix that caps core dumps, CPU time and (usually) memory"""
+        settings = [("-c", 0), ("-t", math.ceil(timeout) + 1)]
+        if language not in self.UNCAPPED_MEMORY_LANGUAGES:
+            settings.append(("-d", parse_size(limits["memory"]) // 1024))
+        # One option per ulimit call, which is all dash accepts
+        applied = " && ".join(f"ulimit {flag} {value}" for flag, value in settings)
+        return f"{applied} || exit 125; "
+
+    def environment(self, work_dir):
+        """Environment for user code; the server's own variables are not passed on"""
+        return {
+            "PATH": f"{self.bin_dir}{os.pathsep}{os.environ.get('PATH', os.defpath)}",
+            "HOME": work_dir,
+            "TMPDIR": work_dir,
+            "LANG": "C.UTF-8"
+        }
+
+    def count(self, timed_out):
+        with self._lock:
+            self.runs += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "local": {
+                    "runs": self.runs,
+                    "timeouts": self.timeouts,
+                    "active_sessions": sum(1 for name in os.listdir(self.root)
+                                           if name.startswith("run-")),
+                    "root": self.root
+                }
+            }
+
+    def shutdown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+BACKENDS = {
+    "docker": DockerBackend,
+    "local": LocalProcessBackend
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_execution_backend():
+    """Get the process-wide execution backend selected by EXECUTION_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            # Imported here because executor_service imports this module
+            from app.services.executor_service import get_language_images
+
+            config = current_app.config
+            name = config.get('EXECUTION_BACKEND', 'docker')
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown execution backend: {name}")
+            _backend = BACKENDS[name].from_config(config, get_language_images())
+            logger.info(f"Using the {name} execution backend")
+    return _backend
+
+
+def shutdown_execution_backend():
+    """Release the backend's resources; the next get_execution_backend() builds a new one"""
+    global _backend
+    with _backend_lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        backend.shutdown()
+
+
+def peek_execution_backend():
+    """Return the execution backend if it has been created, without creating it"""
+    return _backend
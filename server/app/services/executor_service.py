@@ -1,34 +1,208 @@
 # server/app/services/executor_service.py
-import os
-import subprocess
-import tempfile
+import codecs
 import uuid
-import docker
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 import time
 import json
+import logging
+from app.services.compile_cache import get_compile_cache, peek_compile_cache
+from app.services.execution_backends import build_result, get_execution_backend
+from app.services.job_service import get_job_queue, peek_job_queue
+from app.services.resource_accounting import get_resource_accounting, resolve_limits
+from app.services.result_cache import ResultCache, get_result_cache, peek_result_cache
+from app.models.user import User
 
+logger = logging.getLogger(__name__)
 
-def execute_code(user_id, language, code, input_data=""):
+
+def execute_code(user_id, language, code, input_data="", execution_id=None, use_cache=False,
+                 queue_time=0.0):
     """
     Execute code in a specified language
     Returns execution result including stdout, stderr, and execution time
+    With use_cache, an identical earlier run that exited cleanly may be
+    returned instead, flagged with cached=True
+    queue_time is how long the run waited before starting, for accounting
     """
     if language not in get_supported_languages():
         raise ValueError(f"Unsupported language: {language}")
 
     # Create a unique execution ID
+    execution_id = execution_id or str(uuid.uuid4())
+
+    tier = _get_user_tier(user_id)
+    limits = resolve_limits(language, tier)
+
+    cache_key = None
+    if use_cache and current_app.config.get('RESULT_CACHE_ENABLED', True):
+        cache_key = _get_result_cache_key(language, code, input_data, limits)
+        cached = get_result_cache().get(cache_key) if cache_key else None
+        if cached:
+            return _cached_result(cached, execution_id, queue_time, tier, limits)
+
+    result = _run_code(execution_id, language, code, input_data, limits)
+    result["cached"] = False
+    result["phases"]["queue"] = round(queue_time, 3)
+    result["resources"]["tier"] = tier
+    get_resource_accounting().record(language, tier, result["phases"], result["resources"])
+
+    # Only successful runs are stored, so errors and timeouts are always re-run
+    if cache_key:
+        get_result_cache().put(cache_key, result)
+    return result
+
+
+def _run_code(execution_id, language, code, input_data, limits):
+    """Dispatch a run to the language's execution path"""
+    if language == "java" and current_app.config.get('JAVA_COMPILE_CACHE_ENABLED', True):
+        return _execute_java_cached(execution_id, code, input_data, limits)
+
+    image, run_command, file_name, code = _prepare_run(language, code)
+    result, _ = get_execution_backend().run(image, execution_id, run_command,
+                                            {file_name: code}, input_data, limits)
+    return result
+
+
+def _get_user_tier(user_id):
+    """Get the user's plan tier, which selects their execution limits"""
+    try:
+        user = User.query.get(user_id)
+    except Exception as e:
+        logger.debug(f"Could not look up tier for user {user_id}: {str(e)}")
+        return "free"
+    return getattr(user, "tier", None) or "free"
+
+
+def stream_code(user_id, language, code, input_data=""):
+    """
+    Execute code and stream its output while it runs
+    Returns a generator of (event, data) tuples: 'stdout' and 'stderr' chunks,
+    an optional 'truncated' notice, and a final 'result' summary
+    """
+    if language not in get_supported_languages():
+        raise ValueError(f"Unsupported language: {language}")
+
     execution_id = str(uuid.uuid4())
+    limits = resolve_limits(language, _get_user_tier(user_id))
+    image, run_command, file_name, code = _prepare_run(language, code)
+    return _stream_run(image, execution_id, run_command, file_name, code, input_data, limits)
 
-    # Choose execution method based on language
-    if language == "python":
-        return _execute_python(execution_id, code, input_data)
-    elif language == "javascript":
-        return _execute_javascript(execution_id, code, input_data)
-    elif language == "java":
-        return _execute_java(execution_id, code, input_data)
+
+def execute_batch(user_id, language, code, inputs, parallelism=1, time_budget=None):
+    """
+    Run one program against many inputs inside a single sandbox
+    The code is injected (and Java compiled) once, then each input runs in turn,
+    or up to `parallelism` at a time, until all finish or the overall time
+    budget runs out; cases that never started are reported as skipped.
+    time_budget must be a positive number of seconds, capped at BATCH_TIME_BUDGET.
+    Returns per-case stdout, stderr, exit code and timing
+    """
+    if language not in get_supported_languages():
+        raise ValueError(f"Unsupported language: {language}")
+
+    config = current_app.config
+    max_cases = config.get('BATCH_MAX_CASES', 100)
+    if not isinstance(inputs, list) or not inputs:
+        raise ValueError("At least one input is required")
+    if len(inputs) > max_cases:
+        raise ValueError(f"At most {max_cases} inputs are allowed per batch")
+
+    try:
+        parallelism = int(parallelism)
+    except (TypeError, ValueError):
+        raise ValueError("parallelism must be a whole number")
+    parallelism = max(1, min(parallelism, config.get('BATCH_MAX_PARALLELISM', 4)))
+    max_budget = config.get('BATCH_TIME_BUDGET', 60)
+    if time_budget is None:
+        time_budget = max_budget
     else:
-        raise ValueError(f"Language {language} is supported but not implemented")
+        try:
+            time_budget = float(time_budget)
+        except (TypeError, ValueError):
+            raise ValueError("time_budget must be a number of seconds")
+        # Written so that NaN fails too
+        if not time_budget > 0:
+            raise ValueError("time_budget must be positive")
+        time_budget = min(time_budget, max_budget)
+    limits = resolve_limits(language, _get_user_tier(user_id))
+    timeout = limits["timeout"]
+
+    execution_id = str(uuid.uuid4())
+    image, run_command, file_name, code = _prepare_run(language, code)
+    files = {file_name: code}
+
+    start_time = time.time()
+    deadline = start_time + time_budget
+    backend = get_execution_backend()
+    compile_info = None
+    cases = None
+    error = None
+    try:
+        # Sandboxes that hit a timeout are discarded rather than reused
+        with backend.session(image, limits) as sandbox:
+            sandbox.inject(files)
+
+            if language == "java":
+                class_name = file_name[:-len(".java")]
+                compile_info = _compile_java_in_sandbox(backend, sandbox, image, file_name, code,
+                                                        min(timeout, time_budget))
+                run_command = f"java {class_name}"
+
+            if not compile_info or compile_info["ok"]:
+                cases = _run_batch_cases(sandbox, run_command, inputs,
+                                         parallelism, deadline, timeout)
+    except Exception as e:
+        error = backend.format_error(e)
+
+    if cases is None:
+        cases = [_skipped_case(index) for index in range(len(inputs))]
+
+    return {
+        "execution_id": execution_id,
+        "language": language,
+        "cases": cases,
+        "compile": compile_info,
+        "error": error,
+        "parallelism": parallelism,
+        "time_budget": time_budget,
+        "budget_exhausted": any(case["status"] == "skipped" for case in cases) and not error,
+        "execution_time": round(time.time() - start_time, 3)
+    }
+
+
+def submit_code(user_id, language, code, input_data="", use_cache=False):
+    """
+    Queue code for asynchronous execution
+    Returns the execution ID to poll for the result
+    """
+    if language not in get_supported_languages():
+        raise ValueError(f"Unsupported language: {language}")
+
+    return get_job_queue().submit(user_id, language, code, input_data, use_cache=use_cache)
+
+
+def get_execution_job(user_id, execution_id):
+    """
+    Get the status of a queued execution, or None if it is unknown or expired
+    Times are reported in seconds relative to submission
+    """
+    job = get_job_queue().get_job(user_id, execution_id)
+    if not job:
+        return None
+
+    submitted_at = job["submitted_at"]
+    started_at = job["started_at"]
+    finished_at = job["finished_at"]
+    return {
+        "execution_id": job["execution_id"],
+        "language": job["language"],
+        "status": job["status"],
+        "wait_time": round((started_at or time.time()) - submitted_at, 3),
+        "run_time": round(finished_at - started_at, 3) if finished_at and started_at else None,
+        "result": job["result"],
+        "error": job["error"]
+    }
 
 
 def get_supported_languages():
@@ -36,21 +210,58 @@ def get_supported_languages():
     return ["python", "javascript", "java"]
 
 
-def _execute_python(execution_id, code, input_data):
-    """Execute Python code in a Docker container"""
-    return _execute_in_container("python:3.9-slim", execution_id,
-                                 "python", "main.py", code, input_data)
+def get_language_images():
+    """Map each supported language to its sandbox image"""
+    return {
+        "python": "python:3.9-slim",
+        "javascript": "node:16-slim",
+        "java": "openjdk:11-slim"
+    }
+
 
+def _get_result_cache_key(language, code, input_data, limits):
+    """Key a run for the result cache, or None if the toolchain cannot be identified"""
+    try:
+        image_id = get_execution_backend().environment_id(get_language_images()[language])
+    except Exception as e:
+        logger.warning(f"Result cache disabled for this run: {str(e)}")
+        return None
+    return ResultCache.make_key(language, image_id, code, input_data, limits)
+
+
+def _cached_result(cached, execution_id, queue_time, tier, limits):
+    """
+    Present a cached result as this request's
+    Nothing ran, so the original run's phase timings, resource usage and
+    compile cache figures are dropped; only the queue wait is reported.
+    """
+    cached["execution_id"] = execution_id
+    cached["cached"] = True
+    cached["phases"] = {phase: None for phase in cached["phases"]}
+    cached["phases"]["queue"] = round(queue_time, 3)
+    cached["resources"] = {"cpu_time": None, "peak_memory": None, "sampled_memory": None,
+                           "limits": limits, "tier": tier}
+    cached.pop("compile_cache", None)
+    return cached
 
-def _execute_javascript(execution_id, code, input_data):
-    """Execute JavaScript code in a Docker container"""
-    return _execute_in_container("node:16-slim", execution_id,
-                                 "node", "main.js", code, input_data)
 
+def _prepare_run(language, code):
+    """
+    Work out how to run code in a language
+    Returns (image, run_command, file_name, code)
+    """
+    images = get_language_images()
+    if language == "python":
+        return images["python"], "python main.py", "main.py", code
+    elif language == "javascript":
+        return images["javascript"], "node main.js", "main.js", code
+    elif language == "java":
+        return (images["java"],) + _prepare_java(code)
+    raise ValueError(f"Language {language} is supported but not implemented")
 
-def _execute_java(execution_id, code, input_data):
-    """Execute Java code in a Docker container"""
-    # Java needs special handling for class name
+
+def _prepare_java(code):
+    """Prepare Java code, which needs special handling for the class name"""
     main_class_name = _extract_java_class_name(code)
     if not main_class_name:
         main_class_name = "Main"  # Default class name
@@ -58,10 +269,48 @@ def _execute_java(execution_id, code, input_data):
         if "public class" not in code:
             code = f"public class {main_class_name} {{\n{code}\n}}"
 
-    result = _execute_in_container("openjdk:11-slim", execution_id,
-                                   "bash", "-c",
-                                   f"javac {main_class_name}.java && java {main_class_name}",
-                                   code, input_data, file_name=f"{main_class_name}.java")
+    return (f"javac {main_class_name}.java && java {main_class_name}",
+            f"{main_class_name}.java", code)
+
+
+def _execute_java_cached(execution_id, code, input_data, limits):
+    """
+    Execute Java code, reusing compiled classes when the same source was compiled before
+    Misses compile in a run of their own and store the resulting .class files
+    before the program runs, so nothing the program does can reach the cache;
+    hits skip javac
+    """
+    image = get_language_images()["java"]
+    _, file_name, code = _prepare_java(code)
+    class_name = file_name[:-len(".java")]
+
+    backend = get_execution_backend()
+    cache = get_compile_cache()
+    key = cache.make_key(_toolchain(backend, image), file_name, code)
+    cached = cache.get(key)
+
+    if cached:
+        classes, time_saved = cached
+    else:
+        time_saved = 0.0
+        compiled, classes = backend.run(image, execution_id, f"javac {file_name}",
+                                        {file_name: code}, "", limits, collect=(".class",))
+        if compiled["exit_code"] != 0 or compiled["timed_out"] or not classes:
+            # Compile errors are reported as the run's result
+            compiled["compile_cache"] = {"hit": False, "time_saved": 0.0, "hit_ratio": cache.hit_ratio()}
+            return compiled
+        # The run phase is javac alone, which is what later hits save
+        cache.put(key, classes, compiled["phases"]["run"] or compiled["execution_time"])
+
+    result, _ = backend.run(image, execution_id, f"java {class_name}",
+                            classes, input_data, limits)
+    if not cached:
+        result["execution_time"] = round(result["execution_time"] + compiled["execution_time"], 3)
+    result["compile_cache"] = {
+        "hit": cached is not None,
+        "time_saved": round(time_saved, 3),
+        "hit_ratio": cache.hit_ratio()
+    }
     return result
 
 
@@ -74,87 +323,157 @@ def _extract_java_class_name(code):
     return None
 
 
-def _execute_in_container(image, execution_id, command, file_arg, code, input_data, file_name=None):
-    """Execute code in a Docker container with the specified image"""
-    client = docker.from_env()
+def _toolchain(backend, image):
+    """Name the compiler a backend uses for image; local JDKs differ from the image's"""
+    return image if backend.name == "docker" else f"{backend.name}:{image}"
+
+
+def _compile_java_in_sandbox(backend, sandbox, image, file_name, code, timeout):
+    """
+    Compile Java source already injected into a sandbox, or inject cached classes
+    Returns a summary with 'ok' set when classes are ready to run
+    """
+    cache = get_compile_cache() if current_app.config.get('JAVA_COMPILE_CACHE_ENABLED', True) else None
+    key = cache.make_key(_toolchain(backend, image), file_name, code) if cache else None
+    cached = cache.get(key) if cache else None
 
-    # Create a temporary directory for code and input files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Write code to file
-        code_file = file_name or f"main.{_get_file_extension(file_arg)}"
-        code_path = os.path.join(temp_dir, code_file)
-        with open(code_path, 'w') as f:
-            f.write(code)
+    if cached:
+        classes, time_saved = cached
+        sandbox.inject(classes)
+        return {"ok": True, "cache_hit": True, "time_saved": round(time_saved, 3),
+                "compile_time": 0.0, "stderr": "", "timed_out": False}
 
-        # Write input to file if provided
-        input_path = os.path.join(temp_dir, 'input.txt')
-        with open(input_path, 'w') as f:
-            f.write(input_data)
+    start_time = time.time()
+    exit_code, _, stderr, timed_out = sandbox.run(f"javac {file_name}", timeout)
+    compile_time = time.time() - start_time
+
+    if exit_code == 0 and cache:
+        classes = sandbox.collect((".class",))
+        if classes:
+            cache.put(key, classes, compile_time)
+
+    return {"ok": exit_code == 0, "cache_hit": False, "time_saved": 0.0,
+            "compile_time": round(compile_time, 3), "stderr": stderr, "timed_out": timed_out}
 
-        # Setup container with mounted volume and limited resources
-        start_time = time.time()
-        try:
-            container = client.containers.run(
-                image=image,
-                command=f"{command} {file_arg} < /code/input.txt",
-                volumes={temp_dir: {'bind': '/code', 'mode': 'rw'}},
-                working_dir="/code",
-                mem_limit="128m",
-                memswap_limit="256m",
-                cpus=0.5,
-                detach=True,
-                network_disabled=True
-            )
-
-            # Wait for container to finish with timeout
-            timeout = current_app.config.get('EXECUTION_TIMEOUT', 30)
-            container.wait(timeout=timeout)
-
-            # Get container logs
-            stdout = container.logs(stdout=True, stderr=False).decode('utf-8')
-            stderr = container.logs(stdout=False, stderr=True).decode('utf-8')
-
-            # Clean up
-            container.remove(force=True)
-
-        except docker.errors.ContainerError as e:
-            stdout = ""
-            stderr = str(e)
-        except docker.errors.APIError as e:
-            stdout = ""
-            stderr = f"Docker API error: {str(e)}"
-        except Exception as e:
-            stdout = ""
-            stderr = f"Execution error: {str(e)}"
-
-        execution_time = time.time() - start_time
 
+def _run_batch_cases(sandbox, command, inputs, parallelism, deadline, timeout):
+    """
+    Run each input through command on stdin, for every case that starts before the deadline
+    A case's input is injected under a random name just before it runs and
+    unlinked once the shell has opened it, so cases cannot read or
+    overwrite each other's inputs through the shared work directory.
+    """
+
+    def run_case(index):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return _skipped_case(index)
+
+        start_time = time.time()
+        input_name = f".input-{uuid.uuid4().hex}"
+        sandbox.inject({input_name: str(inputs[index])})
+        exit_code, stdout, stderr, timed_out = sandbox.run(
+            f"{{ rm -f {input_name}; {command}; }} < {input_name}", round(min(timeout, remaining), 3))
         return {
-            "execution_id": execution_id,
-            "language": _get_language_from_image(image),
+            "index": index,
+            "status": "completed",
             "stdout": stdout,
             "stderr": stderr,
-            "execution_time": round(execution_time, 3)
+            "exit_code": exit_code,
+            "timed_out": timed_out,
+            "execution_time": round(time.time() - start_time, 3)
         }
 
+    if parallelism == 1:
+        return [run_case(index) for index in range(len(inputs))]
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        return list(executor.map(run_case, range(len(inputs))))
+
+
+def _skipped_case(index):
+    """Result for a batch case that never ran"""
+    return {
+        "index": index,
+        "status": "skipped",
+        "stdout": "",
+        "stderr": "",
+        "exit_code": None,
+        "timed_out": False,
+        "execution_time": 0.0
+    }
+
+
+def _stream_run(image, execution_id, run_command, file_name, code, input_data, limits):
+    """Stream a run's output, capped at EXECUTION_STREAM_MAX_BYTES"""
+    max_bytes = current_app.config.get('EXECUTION_STREAM_MAX_BYTES', 1024 * 1024)
+    backend = get_execution_backend()
+    runner = backend.stream(image, f"{run_command} < input.txt",
+                            {file_name: code, 'input.txt': input_data}, limits)
+    return _relay_output(runner, backend, image, execution_id, max_bytes)
+
+
+def _relay_output(runner, backend, image, execution_id, max_bytes):
+    """Decode runner chunks into events, stopping the run once max_bytes is forwarded"""
+    decoders = {
+        'stdout': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        'stderr': codecs.getincrementaldecoder('utf-8')(errors='replace')
+    }
+    start_time = time.time()
+    exit_code = None
+    timed_out = False
+    truncated = False
+    forwarded = 0
+    error = None
+
+    try:
+        while not truncated:
+            try:
+                chunks = next(runner)
+            except StopIteration as stop:
+                exit_code, timed_out = stop.value
+                break
+
+            for stream_name, chunk in zip(('stdout', 'stderr'), chunks):
+                if not chunk:
+                    continue
+                if forwarded + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - forwarded]
+                    truncated = True
+                forwarded += len(chunk)
+                text = decoders[stream_name].decode(chunk)
+                if text:
+                    yield stream_name, text
+    except Exception as e:
+        error = backend.format_error(e)
+    finally:
+        # Stops the run if it is still going and gives back its sandbox
+        runner.close()
+
+    if truncated:
+        yield 'truncated', {'limit': max_bytes}
+    if error:
+        yield 'stderr', error
+
+    result = build_result(execution_id, image, "", error or "",
+                          exit_code, timed_out, time.time() - start_time)
+    del result['stdout'], result['stderr']
+    result['output_bytes'] = forwarded
+    result['truncated'] = truncated
+    yield 'result', result
+
 
-def _get_file_extension(file_arg):
-    """Get file extension based on the command"""
-    if file_arg.endswith(".py"):
-        return "py"
-    elif file_arg.endswith(".js"):
-        return "js"
-    elif file_arg.endswith(".java"):
-        return "java"
-    return "txt"
-
-
-def _get_language_from_image(image):
-    """Get language name from Docker image"""
-    if "python" in image:
-        return "python"
-    elif "node" in image:
-        return "javascript"
-    elif "openjdk" in image:
-        return "java"
-    return "unknown"
\ No newline at end of file
+def get_execution_stats():
+    """Get counters for the execution subsystem"""
+    backend = get_execution_backend()
+    queue = peek_job_queue()
+    compile_cache = peek_compile_cache()
+    result_cache = peek_result_cache()
+    return {
+        "backend": backend.name,
+        **backend.stats(),
+        "jobs": queue.stats() if queue else None,
+        "compile_cache": compile_cache.stats() if compile_cache else None,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "resources": get_resource_accounting().stats()
+    }
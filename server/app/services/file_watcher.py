@@ -0,0 +1,561 @@
+# server/app/services/file_watcher.py
+import logging
+import os
+import queue
+import stat
+import threading
+import time
+
+from flask import current_app
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional; workspaces are polled without it
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+# What a pending change becomes when another arrives for the same path
+# before the batch is sent; None means the two cancel out
+_MERGE = {
+    (CREATED, MODIFIED): CREATED,
+    (CREATED, DELETED): None,
+    (DELETED, CREATED): MODIFIED
+}
+
+# Changes inside a repository's .git directory are reported as one change
+# to .git itself; when polling, only these files are compared
+GIT_DIR = ".git"
+GIT_STATE_FILES = ("HEAD", "index", "packed-refs", os.path.join("refs", "heads"))
+
+
+class WatchStream:
+    """
+    One client's feed of change batches for paths at or below a prefix
+    Batches wait in a bounded queue; a client that falls behind has the
+    backlog replaced by a single resync event telling it to reload.
+    """
+
+    def __init__(self, watcher, user_id, path="", max_batches=64):
+        self.watcher = watcher
+        self.user_id = str(user_id)
+        self.path = path
+        self.opened_at = time.time()
+        self._queue = queue.Queue(max_batches)
+        self._overflowed = False
+        self._closed = threading.Event()
+
+    def matches(self, path):
+        return not self.path or path == self.path or path.startswith(self.path + os.sep)
+
+    def put(self, events):
+        events = [event for event in events if self.matches(event["path"])]
+        if not events or self._closed.is_set():
+            return
+        try:
+            self._queue.put_nowait(events)
+        except queue.Full:
+            self._overflowed = True
+
+    def events(self, heartbeat=None):
+        """
+        Yield (event, data) pairs until the stream is closed
+        "changes" carries a batch, "resync" means batches were dropped and
+        "heartbeat" is sent after heartbeat seconds of quiet (the watcher's
+        by default), so a client that went away is noticed on the next write.
+        """
+        heartbeat = heartbeat or self.watcher.heartbeat
+        try:
+            yield "ready", {"path": self.path, "backend": self.watcher.backend}
+            while not self._closed.is_set():
+                try:
+                    batch = self._queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    batch = None
+                if self._overflowed:
+                    self._overflowed = False
+                    self._drain()
+                    yield "resync", {"path": self.path}
+                elif batch:
+                    yield "changes", {"events": batch}
+                elif not self._closed.is_set():
+                    yield "heartbeat", {"time": time.time()}
+                self.watcher.touch(self.user_id)
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            self._drain()
+            try:
+                # Wake the generator if it is waiting for a batch
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self.watcher.close_stream(self)
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+
+class _Workspace:
+    """Watch state for one user's storage root (all fields guarded by the watcher's lock)"""
+
+    def __init__(self, user_id, root):
+        self.user_id = user_id
+        self.root = root
+        self.streams = []
+        self.pending = {}
+        self.first_pending = None
+        self.last_pending = None
+        self.last_active = time.monotonic()
+        self.observed = None     # watchdog watch handle, if inotify is used
+        self.snapshot = None     # last polling scan, if polling is used
+        self.next_poll = 0.0
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Feeds watchdog events for one workspace into the watcher"""
+
+    def __init__(self, watcher, workspace):
+        super().__init__()
+        self.watcher = watcher
+        self.workspace = workspace
+
+    def on_any_event(self, event):
+        # Directory modifications only echo changes to their entries, which
+        # arrive as their own events; open and close events change nothing
+        if event.event_type == "moved":
+            self._add(event.src_path, DELETED, event.is_directory)
+            self._add(event.dest_path, CREATED, event.is_directory)
+        elif event.event_type in (CREATED, DELETED) or (event.event_type == MODIFIED and not event.is_directory):
+            self._add(event.src_path, event.event_type, event.is_directory)
+
+    def _add(self, full_path, change, is_directory):
+        path = os.path.relpath(os.fsdecode(full_path), self.workspace.root)
+        if path == "." or path.startswith(os.pardir + os.sep) or path == os.pardir:
+            return
+        self.watcher._add(self.workspace, path, change, is_directory)
+
+
+class FileWatcher:
+    """
+    Turns changes under the workspaces people have open into debounced batches
+    A workspace is watched while a client has a change stream open on it,
+    or for idle_timeout seconds after watch() or its last stream closed.
+    With the watchdog package installed changes come from inotify (or the
+    platform's equivalent); otherwise, or if a workspace cannot be watched
+    that way, its tree is rescanned every poll_interval seconds. Changes
+    are held until debounce seconds pass without another, or max_delay
+    seconds after the first, so a git checkout or an npm install arrives
+    as a few batches rather than thousands of events.
+
+    Each batch goes to the workspace's streams and to every callback given
+    to subscribe(), as callback(user_id, events). Events are dicts with
+    path (relative to the user's storage root), change (created, modified
+    or deleted), type (file or directory) and origin: "storage" when the
+    path is exactly as the storage service last published it through
+    publish(), else "filesystem".
+    """
+
+    def __init__(self, storage_path, backend="auto", debounce=0.2, max_delay=1.0, poll_interval=2.0,
+                 poll_max_entries=50000, idle_timeout=300, max_streams=8, heartbeat=15, app=None):
+        if backend not in ("auto", "watchdog", "polling"):
+            raise ValueError(f"Unknown file watcher backend: {backend}")
+        if backend == "watchdog" and Observer is None:
+            logger.warning("watchdog is not installed; polling workspaces for changes instead")
+        self.storage_path = storage_path
+        self.backend = "watchdog" if backend != "polling" and Observer is not None else "polling"
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.poll_max_entries = poll_max_entries
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self.heartbeat = heartbeat
+        self.app = app
+        self._lock = threading.Lock()
+        self._workspaces = {}
+        self._subscribers = []
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._observer = None
+        self._thread = None
+
+        self.batches = 0
+        self.events = 0
+        self.polls = 0
+        self.poll_time = 0.0
+        self.expired = 0
+
+    def start(self):
+        if self._thread is None:
+            if self.backend == "watchdog":
+                self._observer = Observer()
+                self._observer.daemon = True
+                self._observer.start()
+            self._thread = threading.Thread(target=self._run_loop, name="file-watcher", daemon=True)
+            self._thread.start()
+
+    def subscribe(self, callback):
+        """Call callback(user_id, events) with every batch from every watched workspace"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def watch(self, user_id):
+        """Start watching a user's storage if it is not watched already, and keep it from going idle"""
+        with self._lock:
+            workspace = self._workspace(user_id)
+            workspace.last_active = time.monotonic()
+        self._wake.set()
+
+    def touch(self, user_id):
+        with self._lock:
+            workspace = self._workspaces.get(str(user_id))
+            if workspace:
+                workspace.last_active = time.monotonic()
+
+    def is_watched(self, user_id):
+        with self._lock:
+            return str(user_id) in self._workspaces
+
+    def open_stream(self, user_id, path=""):
+        """Open a change stream on a user's storage; past max_streams the user's oldest is closed"""
+        stream = WatchStream(self, user_id, path)
+        with self._lock:
+            workspace = self._workspace(user_id)
+            workspace.streams.append(stream)
+            workspace.last_active = time.monotonic()
+            evicted = workspace.streams[:-self.max_streams] if self.max_streams else []
+        for old in evicted:
+            old.close()
+        self._wake.set()
+        return stream
+
+    def close_stream(self, stream):
+        with self._lock:
+            workspace = self._workspaces.get(stream.user_id)
+            if workspace and stream in workspace.streams:
+                workspace.streams.remove(stream)
+                workspace.last_active = time.monotonic()
+
+    def publish(self, user_id, path):
+        """
+        Report a change the server made itself, so watchers hear of it without
+        waiting for the next poll; ignored unless the workspace is watched
+        """
+        with self._lock:
+            workspace = self._workspaces.get(str(user_id))
+        if workspace is None:
+            return
+        path = _git_path(path)
+        full_path = os.path.join(workspace.root, path)
+        signature = _signature(full_path)
+        if signature is None:
+            change, is_directory = DELETED, False
+        else:
+            change, is_directory = MODIFIED, signature[0]
+        self._add(workspace, path, change, is_directory, published=signature)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "workspaces": len(self._workspaces),
+                "polled_workspaces": sum(1 for workspace in self._workspaces.values()
+                                         if workspace.observed is None),
+                "streams": sum(len(workspace.streams) for workspace in self._workspaces.values()),
+                "subscribers": len(self._subscribers),
+                "batches": self.batches,
+                "events": self.events,
+                "polls": self.polls,
+                "poll_time": round(self.poll_time, 3),
+                "expired": self.expired
+            }
+
+    def shutdown(self):
+        self._closed.set()
+        self._wake.set()
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+            self._workspaces.clear()
+        for workspace in workspaces:
+            for stream in list(workspace.streams):
+                stream.close()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _workspace(self, user_id):
+        """Get or start watching a user's storage (lock held)"""
+        key = str(user_id)
+        workspace = self._workspaces.get(key)
+        if workspace is None:
+            workspace = _Workspace(key, os.path.join(self.storage_path, key))
+            if self._observer is not None:
+                try:
+                    workspace.observed = self._observer.schedule(_EventHandler(self, workspace),
+                                                                 workspace.root, recursive=True)
+                except OSError as e:
+                    # Typically the inotify watch limit; fall back to polling this workspace
+                    logger.warning(f"Cannot watch {workspace.root} for changes, polling it instead: {str(e)}")
+            self._workspaces[key] = workspace
+        return workspace
+
+    def _add(self, workspace, path, change, is_directory, published=False):
+        """Merge one change into a workspace's pending batch"""
+        repository_path = _git_path(path)
+        if repository_path != path:
+            path, change, is_directory = repository_path, MODIFIED, True
+        now = time.monotonic()
+        with self._lock:
+            pending = workspace.pending.get(path)
+            if pending is None:
+                workspace.pending[path] = {"change": change, "is_directory": is_directory, "published": published}
+            else:
+                merged = _MERGE.get((pending["change"], change), change)
+                if merged is None:
+                    del workspace.pending[path]
+                else:
+                    pending["change"] = merged
+                    pending["is_directory"] = is_directory
+                    if published is not False:
+                        pending["published"] = published
+            if workspace.first_pending is None:
+                workspace.first_pending = now
+            workspace.last_pending = now
+        self._wake.set()
+
+    def _run_loop(self):
+        while not self._closed.is_set():
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        timeout = self._tick()
+                else:
+                    timeout = self._tick()
+            except Exception as e:
+                logger.warning(f"File watcher pass failed: {str(e)}")
+                timeout = 1.0
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _tick(self):
+        """Poll, send and expire whatever is due; returns seconds until something next is"""
+        now = time.monotonic()
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+
+        deadlines = [now + max(self.idle_timeout, 1)]
+        for workspace in workspaces:
+            if workspace.observed is None:
+                if workspace.next_poll <= now:
+                    self._poll(workspace)
+                    workspace.next_poll = time.monotonic() + self.poll_interval
+                deadlines.append(workspace.next_poll)
+
+        now = time.monotonic()
+        for workspace in workspaces:
+            with self._lock:
+                if workspace.first_pending is None:
+                    continue
+                due = min(workspace.last_pending + self.debounce, workspace.first_pending + self.max_delay)
+                if due > now:
+                    deadlines.append(due)
+                    continue
+                pending, workspace.pending = workspace.pending, {}
+                workspace.first_pending = workspace.last_pending = None
+                streams = list(workspace.streams)
+                subscribers = list(self._subscribers)
+            self._deliver(workspace, pending, streams, subscribers)
+
+        self._expire_idle(now)
+        return max(0.01, min(deadlines) - time.monotonic())
+
+    def _deliver(self, workspace, pending, streams, subscribers):
+        events = []
+        for path in sorted(pending):
+            entry = pending[path]
+            published = entry["published"]
+            events.append({
+                "path": path,
+                "change": entry["change"],
+                "type": "directory" if entry["is_directory"] else "file",
+                "origin": "storage" if published is not False
+                and published == _signature(os.path.join(workspace.root, path)) else "filesystem"
+            })
+        if not events:
+            return
+        self.batches += 1
+        self.events += len(events)
+        for callback in subscribers:
+            try:
+                callback(workspace.user_id, events)
+            except Exception as e:
+                logger.warning(f"File watcher subscriber failed for user {workspace.user_id}: {str(e)}")
+        for stream in streams:
+            stream.put(events)
+
+    def _poll(self, workspace):
+        """Rescan a polled workspace and queue what changed since the last scan"""
+        start = time.monotonic()
+        snapshot, truncated = _scan(workspace.root, self.poll_max_entries)
+        self.polls += 1
+        self.poll_time += time.monotonic() - start
+        previous, workspace.snapshot = workspace.snapshot, snapshot
+        if previous is None:
+            return
+        if truncated:
+            logger.warning(f"Polling stopped after {self.poll_max_entries} entries in {workspace.root}")
+
+        # Entries of a directory that appeared or vanished are covered by the directory's own event
+        created = {path for path in snapshot if path not in previous}
+        for path in created:
+            if os.path.dirname(path) not in created:
+                self._add(workspace, path, CREATED, snapshot[path][0])
+        for path, state in snapshot.items():
+            if path not in created and previous[path] != state:
+                self._add(workspace, path, MODIFIED, state[0])
+        if not truncated:
+            deleted = {path for path in previous if path not in snapshot}
+            for path in deleted:
+                if os.path.dirname(path) not in deleted:
+                    self._add(workspace, path, DELETED, previous[path][0])
+
+    def _expire_idle(self, now):
+        with self._lock:
+            idle = [workspace for workspace in self._workspaces.values()
+                    if not workspace.streams and now - workspace.last_active > self.idle_timeout]
+            for workspace in idle:
+                del self._workspaces[workspace.user_id]
+                self.expired += 1
+        for workspace in idle:
+            if workspace.observed is not None:
+                try:
+                    self._observer.unschedule(workspace.observed)
+                except (KeyError, OSError):
+                    pass
+
+
+def _git_path(path):
+    """Map a path inside a repository's .git directory to the .git directory itself"""
+    parts = path.split(os.sep)
+    if GIT_DIR in parts[:-1]:
+        return os.sep.join(parts[:parts.index(GIT_DIR) + 1])
+    return path
+
+
+def _signature(full_path):
+    """(is_directory, inode, size, mtime) for a path, or None if it does not exist"""
+    try:
+        path_stat = os.lstat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return stat.S_ISDIR(path_stat.st_mode), path_stat.st_ino, path_stat.st_size, path_stat.st_mtime_ns
+
+
+def _git_state(git_dir):
+    """Modification times of the files in a .git directory that mark a status change"""
+    state = []
+    for name in GIT_STATE_FILES:
+        try:
+            state.append(os.stat(os.path.join(git_dir, name)).st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError):
+            state.append(None)
+    return tuple(state)
+
+
+def _scan(root, max_entries):
+    """
+    Map every path below root to (is_directory, state) for polling
+    A file's state is its size and mtime; a directory's is None, since its
+    entries report their own changes, and a .git directory's is _git_state().
+    Returns the map and whether the scan stopped at max_entries.
+    """
+    snapshot = {}
+    stack = [""]
+    while stack:
+        path = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, path) if path else root)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with it:
+            for entry in it:
+                entry_path = os.path.join(path, entry.name) if path else entry.name
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if not stat.S_ISDIR(entry_stat.st_mode):
+                    snapshot[entry_path] = (False, (entry_stat.st_size, entry_stat.st_mtime_ns))
+                elif entry.name == GIT_DIR:
+                    snapshot[entry_path] = (True, _git_state(entry.path))
+                else:
+                    snapshot[entry_path] = (True, None)
+                    stack.append(entry_path)
+                if max_entries and len(snapshot) >= max_entries:
+                    return snapshot, True
+    return snapshot, False
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_file_watcher(on_change=None):
+    """
+    Get the process-wide file watcher, or None if it is disabled
+    on_change is subscribed when the watcher is first created.
+    """
+    global _watcher
+    config = current_app.config
+    if not config.get('FILE_WATCHER_ENABLED', True):
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = FileWatcher(
+                config.get('STORAGE_PATH', 'storage'),
+                backend=config.get('FILE_WATCHER_BACKEND', 'auto'),
+                debounce=config.get('FILE_WATCHER_DEBOUNCE', 0.2),
+                max_delay=config.get('FILE_WATCHER_MAX_DELAY', 1.0),
+                poll_interval=config.get('FILE_WATCHER_POLL_INTERVAL', 2.0),
+                poll_max_entries=config.get('FILE_WATCHER_POLL_MAX_ENTRIES', 50000),
+                idle_timeout=config.get('FILE_WATCHER_IDLE_TIMEOUT', 300),
+                max_streams=config.get('FILE_WATCHER_MAX_STREAMS', 8),
+                heartbeat=config.get('FILE_WATCHER_HEARTBEAT', 15),
+                app=current_app._get_current_object()
+            )
+            if on_change:
+                _watcher.subscribe(on_change)
+            _watcher.start()
+    return _watcher
+
+
+def shutdown_file_watcher():
+    """Stop the watcher, closing its streams, and forget it"""
+    global _watcher
+    with _watcher_lock:
+        watcher, _watcher = _watcher, None
+    if watcher:
+        watcher.shutdown()
+
+
+def peek_file_watcher():
+    """Return the watcher if it has been created, without creating it"""
+    return _watcher
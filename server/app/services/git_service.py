@@ -2,24 +2,89 @@
 import os
 import git
 import shutil
+from contextlib import contextmanager
 from flask import current_app
-from app.services.storage_service import validate_path, ensure_user_path_exists
+from app.services.repo_cache import get_repo_cache, peek_repo_cache
+from app.services.repo_status import get_status_cache, peek_status_cache, read_status
+from app.services.storage_service import (
+    validate_path,
+    ensure_user_path_exists,
+    materialize,
+    check_quota,
+    usage_before_change,
+    charge_usage,
+    deduplicate_tree,
+    note_change
+)
+from app.utils.locks import LockTable
+
+# Per-repository read/write locks keyed by work tree path
+_repo_locks = LockTable()
+
+
+@contextmanager
+def _open_repo(absolute_path, write=False):
+    """
+    Hold a repository's lock and a handle on it for the length of a block
+    Reads share the lock and writes take it alone, so status and branch
+    requests never see an add, commit or checkout half done and two writes
+    never race on the index. Raises TimeoutError if the lock is not free
+    within GIT_LOCK_TIMEOUT seconds.
+    """
+    lock = _repo_locks.write if write else _repo_locks.read
+    with lock(absolute_path, timeout=_lock_timeout()):
+        try:
+            cache = get_repo_cache()
+            if cache is not None:
+                with cache.repo(absolute_path) as repo:
+                    yield repo
+            else:
+                repo = git.Repo(absolute_path)
+                try:
+                    yield repo
+                finally:
+                    repo.close()
+        finally:
+            if write:
+                status_cache = peek_status_cache()
+                if status_cache:
+                    status_cache.invalidate(absolute_path)
+
+
+def _lock_timeout():
+    return current_app.config.get('GIT_LOCK_TIMEOUT', 30)
+
+
+def _check_growth_quota(user_id, absolute_path):
+    """
+    Refuse a git operation that may add files if the user is already at a quota
+    How much git will write is only known afterwards, so this asks whether
+    one more byte and file would fit; the operation is charged once it ends.
+    """
+    check_quota(user_id, absolute_path, 1, 1)
 
 
 def git_init(user_id, path):
     """Initialize a new Git repository"""
     absolute_path = validate_path(user_id, path)
+    # git reads the work tree directly, so cold files must be thawed first
+    materialize(absolute_path)
+    _check_growth_quota(user_id, absolute_path)
 
-    # Ensure the directory exists
-    if not os.path.exists(absolute_path):
-        os.makedirs(absolute_path, exist_ok=True)
+    with _repo_locks.write(absolute_path, timeout=_lock_timeout()):
+        before = usage_before_change(user_id, absolute_path)
 
-    # Check if it's already a git repository
-    if os.path.exists(os.path.join(absolute_path, '.git')):
-        return {"message": "Repository already initialized", "path": path}
+        # Ensure the directory exists
+        if not os.path.exists(absolute_path):
+            os.makedirs(absolute_path, exist_ok=True)
 
-    # Initialize new repository
-    repo = git.Repo.init(absolute_path)
+        # Check if it's already a git repository
+        if os.path.exists(os.path.join(absolute_path, '.git')):
+            return {"message": "Repository already initialized", "path": path}
+
+        # Initialize new repository
+        git.Repo.init(absolute_path).close()
+        charge_usage(user_id, absolute_path, before)
 
     return {
         "message": "Repository initialized successfully",
@@ -35,18 +100,29 @@ def git_clone(user_id, url, path):
     # Validate the destination path is within user's storage area
     absolute_path = validate_path(user_id, path)
 
-    # Check if directory already exists
-    if os.path.exists(absolute_path):
-        if os.listdir(absolute_path):  # Directory not empty
-            raise ValueError(f"Destination path is not empty: {path}")
-        # Remove existing directory
-        shutil.rmtree(absolute_path)
+    with _repo_locks.write(absolute_path, timeout=_lock_timeout()):
+        # Check if directory already exists
+        if os.path.exists(absolute_path):
+            if os.listdir(absolute_path):  # Directory not empty
+                raise ValueError(f"Destination path is not empty: {path}")
+            # Remove existing directory
+            shutil.rmtree(absolute_path)
+
+        _check_growth_quota(user_id, absolute_path)
+
+        # Create parent directory if necessary
+        os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
 
-    # Create parent directory if necessary
-    os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+        # Clone repository
+        before = usage_before_change(user_id, absolute_path)
+        try:
+            git.Repo.clone_from(url, absolute_path).close()
+        finally:
+            charge_usage(user_id, absolute_path, before)
 
-    # Clone repository
-    repo = git.Repo.clone_from(url, absolute_path)
+    # Many users clone the same repositories; share identical files between them
+    deduplicate_tree(absolute_path)
+    note_change(user_id, absolute_path)
 
     return {
         "message": "Repository cloned successfully",
@@ -57,66 +133,51 @@ def git_clone(user_id, url, path):
 def git_status(user_id, path):
     """Get the status of a Git repository"""
     absolute_path = validate_path(user_id, path)
+    materialize(absolute_path)
 
     # Check if it's a git repository
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
-
-    # Get basic information
-    active_branch = repo.active_branch.name
-    is_dirty = repo.is_dirty()
-
-    # Get untracked files
-    untracked_files = repo.untracked_files
-
-    # Get modified, added, and deleted files
-    modified_files = []
-    staged_files = []
-    deleted_files = []
-
-    for item in repo.index.diff(None):
-        if item.change_type == 'M':
-            modified_files.append(item.a_path)
-        elif item.change_type == 'D':
-            deleted_files.append(item.a_path)
-
-    for item in repo.index.diff('HEAD'):
-        staged_files.append(item.a_path)
-
-    return {
-        "branch": active_branch,
-        "is_dirty": is_dirty,
-        "untracked_files": untracked_files,
-        "modified_files": modified_files,
-        "staged_files": staged_files,
-        "deleted_files": deleted_files
-    }
+    # One git status run covers the branch, staged, unstaged and untracked
+    # files; the result is cached until the repository or its work tree changes
+    with _repo_locks.read(absolute_path, timeout=_lock_timeout()):
+        status_cache = get_status_cache()
+        if status_cache is not None:
+            return status_cache.get(user_id, absolute_path)
+        return read_status(absolute_path, timeout=current_app.config.get('GIT_STATUS_TIMEOUT', 60))
 
 
 def git_add(user_id, path, files):
     """Add files to Git staging area"""
     absolute_path = validate_path(user_id, path)
+    materialize(absolute_path)
 
     # Check if it's a git repository
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
-
-    # Add files
-    if files == ['.']:  # Add all files
-        repo.git.add('.')
-        message = "All files added to staging area"
-    else:
-        for file in files:
-            file_path = os.path.join(absolute_path, file)
-            if not os.path.exists(file_path):
-                raise ValueError(f"File does not exist: {file}")
-            relative_file = os.path.relpath(file_path, absolute_path)
-            repo.git.add(relative_file)
-        message = f"{len(files)} file(s) added to staging area"
+    _check_growth_quota(user_id, absolute_path)
+
+    with _open_repo(absolute_path, write=True) as repo:
+        # Staging only writes objects under .git
+        git_dir = os.path.join(absolute_path, '.git')
+        before = usage_before_change(user_id, git_dir)
+        try:
+            # Add files
+            if files == ['.']:  # Add all files
+                repo.git.add('.')
+                message = "All files added to staging area"
+            else:
+                for file in files:
+                    file_path = os.path.join(absolute_path, file)
+                    if not os.path.exists(file_path):
+                        raise ValueError(f"File does not exist: {file}")
+                    relative_file = os.path.relpath(file_path, absolute_path)
+                    repo.git.add(relative_file)
+                message = f"{len(files)} file(s) added to staging area"
+        finally:
+            charge_usage(user_id, git_dir, before)
 
     return {
         "message": message,
@@ -127,22 +188,28 @@ def git_add(user_id, path, files):
 def git_commit(user_id, path, message):
     """Commit changes to the repository"""
     absolute_path = validate_path(user_id, path)
+    materialize(absolute_path)
 
     # Check if it's a git repository
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
+    with _open_repo(absolute_path, write=True) as repo:
+        # Check if there are staged changes
+        if not repo.index.diff('HEAD'):
+            raise ValueError("No changes staged for commit")
 
-    # Check if there are staged changes
-    if not repo.index.diff('HEAD'):
-        raise ValueError("No changes staged for commit")
+        # Configure author (use user ID as author)
+        author = f"user-{user_id} <user-{user_id}@cloud-ide.example.com>"
 
-    # Configure author (use user ID as author)
-    author = f"user-{user_id} <user-{user_id}@cloud-ide.example.com>"
-
-    # Commit changes
-    commit = repo.index.commit(message, author=author, committer=author)
+        # Commit changes
+        _check_growth_quota(user_id, absolute_path)
+        git_dir = os.path.join(absolute_path, '.git')
+        before = usage_before_change(user_id, git_dir)
+        try:
+            commit = repo.index.commit(message, author=author, committer=author)
+        finally:
+            charge_usage(user_id, git_dir, before)
 
     return {
         "message": "Changes committed successfully",
@@ -159,16 +226,16 @@ def git_push(user_id, path, branch='main'):
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
-
-    # Check if remote exists
-    try:
-        origin = repo.remote('origin')
-    except ValueError:
-        raise ValueError("No remote repository configured")
+    # Pushing updates the remote-tracking refs
+    with _open_repo(absolute_path, write=True) as repo:
+        # Check if remote exists
+        try:
+            origin = repo.remote('origin')
+        except ValueError:
+            raise ValueError("No remote repository configured")
 
-    # Push to remote
-    push_info = origin.push(branch)
+        # Push to remote
+        push_info = origin.push(branch)
 
     # Check for errors
     for info in push_info:
@@ -184,21 +251,28 @@ def git_push(user_id, path, branch='main'):
 def git_pull(user_id, path, branch='main'):
     """Pull changes from remote repository"""
     absolute_path = validate_path(user_id, path)
+    materialize(absolute_path)
 
     # Check if it's a git repository
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
-
-    # Check if remote exists
-    try:
-        origin = repo.remote('origin')
-    except ValueError:
-        raise ValueError("No remote repository configured")
-
-    # Pull from remote
-    pull_info = origin.pull(branch)
+    with _open_repo(absolute_path, write=True) as repo:
+        # Check if remote exists
+        try:
+            origin = repo.remote('origin')
+        except ValueError:
+            raise ValueError("No remote repository configured")
+
+        # Pull from remote
+        _check_growth_quota(user_id, absolute_path)
+        before = usage_before_change(user_id, absolute_path)
+        try:
+            origin.pull(branch)
+        finally:
+            charge_usage(user_id, absolute_path, before)
+            # The work tree changed behind the storage service's back
+            note_change(user_id, absolute_path)
 
     return {
         "message": "Changes pulled from remote repository",
@@ -214,13 +288,12 @@ def git_branch(user_id, path):
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
-
-    # Get local branches
-    local_branches = [str(branch) for branch in repo.heads]
+    with _open_repo(absolute_path) as repo:
+        # Get local branches
+        local_branches = [str(branch) for branch in repo.heads]
 
-    # Get active branch
-    active_branch = str(repo.active_branch)
+        # Get active branch
+        active_branch = str(repo.active_branch)
 
     return {
         "active_branch": active_branch,
@@ -231,26 +304,43 @@ def git_branch(user_id, path):
 def git_checkout(user_id, path, branch, create=False):
     """Checkout a branch"""
     absolute_path = validate_path(user_id, path)
+    materialize(absolute_path)
 
     # Check if it's a git repository
     if not os.path.exists(os.path.join(absolute_path, '.git')):
         raise ValueError(f"Not a git repository: {path}")
 
-    repo = git.Repo(absolute_path)
-
-    # Check if the branch exists
-    if branch in [str(b) for b in repo.heads]:
-        # Checkout existing branch
-        repo.git.checkout(branch)
-        message = f"Switched to branch '{branch}'"
-    elif create:
-        # Create and checkout new branch
-        repo.git.checkout('-b', branch)
-        message = f"Created and switched to branch '{branch}'"
-    else:
-        raise ValueError(f"Branch '{branch}' does not exist")
+    with _open_repo(absolute_path, write=True) as repo:
+        # Check if the branch exists
+        if branch in [str(b) for b in repo.heads]:
+            # Checkout existing branch
+            _check_growth_quota(user_id, absolute_path)
+            before = usage_before_change(user_id, absolute_path)
+            try:
+                repo.git.checkout(branch)
+            finally:
+                charge_usage(user_id, absolute_path, before)
+                note_change(user_id, absolute_path)
+            message = f"Switched to branch '{branch}'"
+        elif create:
+            # Create and checkout new branch; only a ref is written
+            repo.git.checkout('-b', branch)
+            message = f"Created and switched to branch '{branch}'"
+        else:
+            raise ValueError(f"Branch '{branch}' does not exist")
 
     return {
         "message": message,
         "branch": branch
-    }
\ No newline at end of file
+    }
+
+
+def get_git_stats():
+    """Counters for the repository handle and status caches and the repository locks"""
+    repo_cache = peek_repo_cache()
+    status_cache = peek_status_cache()
+    return {
+        "repo_cache": repo_cache.stats() if repo_cache else None,
+        "status_cache": status_cache.stats() if status_cache else None,
+        "locks": _repo_locks.stats()
+    }
@@ -0,0 +1,221 @@
+# server/app/services/job_service.py
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be accepted because the queue is at capacity"""
+
+
+class ExecutionJobQueue:
+    """
+    Runs execution jobs on a bounded worker pool
+    At most max_workers jobs run at once overall and at most per_user_limit
+    per user; a user's extra jobs wait in that user's own queue so a burst
+    from one user cannot take every worker. Finished jobs are kept for
+    result_ttl seconds.
+    """
+
+    def __init__(self, app, run_job, max_workers=4, per_user_limit=2,
+                 max_queue_depth=100, result_ttl=600):
+        self._app = app
+        self._run_job = run_job
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.max_queue_depth = max_queue_depth
+        self.result_ttl = result_ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="execution-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._waiting = {}   # user_id -> deque of job ids not yet handed to the executor
+        self._active = {}    # user_id -> number of jobs handed to the executor
+        self._queued = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    def submit(self, user_id, language, code, input_data="", use_cache=False):
+        """Queue a job and return its execution ID straight away"""
+        user_key = str(user_id)
+        execution_id = str(uuid.uuid4())
+
+        with self._lock:
+            self._evict_expired()
+            if self._queued >= self.max_queue_depth:
+                self.rejected += 1
+                raise QueueFullError("Execution queue is full, try again later")
+
+            self._jobs[execution_id] = {
+                "execution_id": execution_id,
+                "user_id": user_key,
+                "language": language,
+                "code": code,
+                "input": input_data,
+                "use_cache": use_cache,
+                "status": JOB_QUEUED,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._waiting.setdefault(user_key, deque()).append(execution_id)
+            self._queued += 1
+            self.submitted += 1
+            self._dispatch(user_key)
+
+        return execution_id
+
+    def get_job(self, user_id, execution_id):
+        """Get a job owned by user_id, or None if unknown or expired"""
+        with self._lock:
+            self._evict_expired()
+            job = self._jobs.get(execution_id)
+            if not job or job["user_id"] != str(user_id):
+                return None
+            return dict(job)
+
+    def stats(self):
+        """Queue depth, wait time and run time counters"""
+        with self._lock:
+            started = self.completed + self.failed
+            running = sum(self._active.values())
+            return {
+                "queue_depth": self._queued,
+                "running": running,
+                "retained": len(self._jobs),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+                "wait_time": {
+                    "avg": round(self._wait_total / started, 3) if started else None,
+                    "max": round(self._wait_max, 3)
+                },
+                "run_time": {
+                    "avg": round(self._run_total / started, 3) if started else None,
+                    "max": round(self._run_max, 3)
+                },
+                "max_workers": self.max_workers,
+                "per_user_limit": self.per_user_limit
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, user_key):
+        """Hand waiting jobs to the executor while the user is under the limit (lock held)"""
+        waiting = self._waiting.get(user_key)
+        while waiting and self._active.get(user_key, 0) < self.per_user_limit:
+            execution_id = waiting.popleft()
+            self._active[user_key] = self._active.get(user_key, 0) + 1
+            self._executor.submit(self._run, execution_id)
+        if not waiting:
+            self._waiting.pop(user_key, None)
+
+    def _run(self, execution_id):
+        with self._lock:
+            job = self._jobs[execution_id]
+            job["status"] = JOB_RUNNING
+            job["started_at"] = time.time()
+            self._queued -= 1
+            wait_time = job["started_at"] - job["submitted_at"]
+
+        result = None
+        error = None
+        try:
+            with self._app.app_context():
+                result = self._run_job(job["user_id"], job["language"], job["code"],
+                                       job["input"], execution_id=execution_id,
+                                       use_cache=job["use_cache"], queue_time=wait_time)
+        except Exception as e:
+            logger.error(f"Execution job {execution_id} failed: {str(e)}")
+            error = str(e)
+
+        with self._lock:
+            job["finished_at"] = time.time()
+            job["status"] = JOB_FAILED if error else JOB_COMPLETED
+            job["result"] = result
+            job["error"] = error
+            # Code and input are no longer needed once the job has run
+            job["code"] = None
+            job["input"] = None
+
+            run_time = job["finished_at"] - job["started_at"]
+            if error:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self._wait_total += wait_time
+            self._wait_max = max(self._wait_max, wait_time)
+            self._run_total += run_time
+            self._run_max = max(self._run_max, run_time)
+
+            user_key = job["user_id"]
+            self._active[user_key] -= 1
+            if not self._active[user_key]:
+                del self._active[user_key]
+            self._dispatch(user_key)
+
+    def _evict_expired(self):
+        """Drop finished jobs older than result_ttl (lock held)"""
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            execution_id for execution_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for execution_id in expired:
+            del self._jobs[execution_id]
+        self.evicted += len(expired)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Get the process-wide job queue, creating it from app config on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            # Imported here to keep executor_service free to import this module
+            from app.services.executor_service import execute_code
+
+            config = current_app.config
+            _queue = ExecutionJobQueue(
+                current_app._get_current_object(),
+                execute_code,
+                max_workers=config.get('EXECUTION_MAX_WORKERS', 4),
+                per_user_limit=config.get('EXECUTION_MAX_JOBS_PER_USER', 2),
+                max_queue_depth=config.get('EXECUTION_MAX_QUEUE_DEPTH', 100),
+                result_ttl=config.get('EXECUTION_RESULT_TTL', 600)
+            )
+    return _queue
+
+
+def peek_job_queue():
+    """Return the job queue if it has been created, without creating it"""
+    return _queue
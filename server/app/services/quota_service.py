@@ -0,0 +1,263 @@
+# server/app/services/quota_service.py
+import logging
+import os
+import stat
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceededError(Exception):
+    """Raised when a write would take a user or project past its storage quota"""
+
+
+def measure_usage(full_path):
+    """Bytes and inodes used by a path and, for a directory, everything below it"""
+    try:
+        path_stat = os.lstat(full_path)
+    except FileNotFoundError:
+        return 0, 0
+    if not stat.S_ISDIR(path_stat.st_mode):
+        return path_stat.st_size, 1
+
+    total_bytes, inodes = 0, 1
+    stack = [full_path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    inodes += 1
+                    if stat.S_ISDIR(entry_stat.st_mode):
+                        stack.append(entry.path)
+                    else:
+                        total_bytes += entry_stat.st_size
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return total_bytes, inodes
+
+
+def project_of(path):
+    """The project directory a storage-relative path belongs to, or None"""
+    parts = path.split(os.sep)
+    if len(parts) >= 3 and parts[0] == "projects":
+        return os.sep.join(parts[:3])
+    return None
+
+
+class QuotaTracker:
+    """
+    Running byte and inode counters per user and per project
+    A user's counters are built by one scan of their storage on first use.
+    After that, storage and git mutations move them by the usage they
+    measured before and after each change. A background reconcile rescans
+    each user every reconcile_interval seconds to correct any drift, such
+    as from files written by code running in the workspace. A limit of 0
+    means unlimited.
+    """
+
+    def __init__(self, storage_path, max_bytes=0, max_inodes=0, project_max_bytes=0,
+                 project_max_inodes=0, reconcile_interval=3600):
+        self.storage_path = storage_path
+        self.max_bytes = max_bytes
+        self.max_inodes = max_inodes
+        self.project_max_bytes = project_max_bytes
+        self.project_max_inodes = project_max_inodes
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._users = {}
+        self._closed = threading.Event()
+        self._thread = None
+
+        self.scans = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.reconcile_interval and self._thread is None:
+            self._thread = threading.Thread(target=self._reconcile_loop, name="quota-reconcile",
+                                            daemon=True)
+            self._thread.start()
+
+    def track(self, user_id):
+        """Build a user's counters if they have not been scanned yet"""
+        self._counters(user_id)
+
+    def usage(self, user_id):
+        """A user's usage, limits and per-project breakdown"""
+        counters = self._counters(user_id)
+        with self._lock:
+            return {
+                "bytes": counters["bytes"],
+                "inodes": counters["inodes"],
+                "max_bytes": self.max_bytes or None,
+                "max_inodes": self.max_inodes or None,
+                "projects": {
+                    project: {
+                        "bytes": usage["bytes"],
+                        "inodes": usage["inodes"],
+                        "max_bytes": self.project_max_bytes or None,
+                        "max_inodes": self.project_max_inodes or None
+                    }
+                    for project, usage in counters["projects"].items()
+                },
+                "reconciled_at": counters["reconciled_at"]
+            }
+
+    def project_usage(self, user_id, project):
+        return self.usage(user_id)["projects"].get(project) or {
+            "bytes": 0,
+            "inodes": 0,
+            "max_bytes": self.project_max_bytes or None,
+            "max_inodes": self.project_max_inodes or None
+        }
+
+    def check(self, user_id, path, bytes_delta, inodes_delta, user_scope=True):
+        """
+        Raise QuotaExceededError if growing path by the given amounts would
+        pass the user's or its project's limits; shrinking is always allowed.
+        user_scope=False checks only the project, for moves within a user.
+        """
+        if not (self.max_bytes or self.max_inodes or self.project_max_bytes or self.project_max_inodes):
+            return
+        counters = self._counters(user_id)
+        project = project_of(path)
+        with self._lock:
+            scopes = [("Storage", counters, self.max_bytes, self.max_inodes)] if user_scope else []
+            if project:
+                usage = counters["projects"].get(project, {"bytes": 0, "inodes": 0})
+                scopes.append((f"Project {project}", usage, self.project_max_bytes,
+                               self.project_max_inodes))
+            for scope, usage, max_bytes, max_inodes in scopes:
+                if max_bytes and bytes_delta > 0 and usage["bytes"] + bytes_delta > max_bytes:
+                    self.rejected += 1
+                    raise QuotaExceededError(
+                        f"{scope} quota exceeded: {usage['bytes'] + bytes_delta} of {max_bytes} bytes")
+                if max_inodes and inodes_delta > 0 and usage["inodes"] + inodes_delta > max_inodes:
+                    self.rejected += 1
+                    raise QuotaExceededError(
+                        f"{scope} quota exceeded: {usage['inodes'] + inodes_delta} of {max_inodes} files")
+
+    def adjust(self, user_id, path, bytes_delta, inodes_delta):
+        """Move a user's counters after a change; users not yet scanned are left to their first scan"""
+        if not bytes_delta and not inodes_delta:
+            return
+        with self._lock:
+            counters = self._users.get(str(user_id))
+            if counters is None:
+                return
+            counters["bytes"] += bytes_delta
+            counters["inodes"] += inodes_delta
+            project = project_of(path)
+            if project:
+                usage = counters["projects"].setdefault(project, {"bytes": 0, "inodes": 0})
+                usage["bytes"] += bytes_delta
+                usage["inodes"] += inodes_delta
+                return
+            # A change above project level, such as deleting projects/, cannot
+            # be split between the projects it covers, so measure them again
+            prefix = path.rstrip(os.sep) + os.sep if path else ""
+            nested = [name for name in counters["projects"] if name.startswith(prefix)]
+
+        for name in nested:
+            project_bytes, project_inodes = measure_usage(os.path.join(self.storage_path, str(user_id), name))
+            with self._lock:
+                if project_inodes:
+                    counters["projects"][name] = {"bytes": project_bytes, "inodes": project_inodes}
+                else:
+                    counters["projects"].pop(name, None)
+
+    def reconcile(self, user_id):
+        """Rescan a user's storage and replace their counters"""
+        root = os.path.join(self.storage_path, str(user_id))
+        total_bytes, inodes = measure_usage(root)
+        projects = {}
+        projects_root = os.path.join(root, "projects")
+        for owner in _subdirectories(projects_root):
+            for name in _subdirectories(os.path.join(projects_root, owner)):
+                project_bytes, project_inodes = measure_usage(os.path.join(projects_root, owner, name))
+                projects[os.path.join("projects", owner, name)] = {
+                    "bytes": project_bytes,
+                    "inodes": project_inodes
+                }
+
+        counters = {
+            "bytes": total_bytes,
+            # The storage root itself is not charged
+            "inodes": max(0, inodes - 1),
+            "projects": projects,
+            "reconciled_at": time.time()
+        }
+        with self._lock:
+            self.scans += 1
+            self._users[str(user_id)] = counters
+        return counters
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "scans": self.scans,
+                "rejected": self.rejected,
+                "reconcile_interval": self.reconcile_interval
+            }
+
+    def shutdown(self):
+        self._closed.set()
+
+    def _counters(self, user_id):
+        with self._lock:
+            counters = self._users.get(str(user_id))
+        return counters if counters is not None else self.reconcile(user_id)
+
+    def _reconcile_loop(self):
+        while not self._closed.wait(self.reconcile_interval):
+            with self._lock:
+                users = list(self._users)
+            for user_id in users:
+                try:
+                    self.reconcile(user_id)
+                except Exception as e:
+                    logger.warning(f"Quota reconcile failed for user {user_id}: {str(e)}")
+
+
+def _subdirectories(path):
+    try:
+        with os.scandir(path) as it:
+            return [entry.name for entry in it if entry.is_dir(follow_symlinks=False)]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_quota_tracker():
+    """Get the process-wide quota tracker, or None if quotas are disabled"""
+    global _tracker
+    config = current_app.config
+    if not config.get('QUOTA_ENABLED', False):
+        return None
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = QuotaTracker(
+                config.get('STORAGE_PATH', 'storage'),
+                max_bytes=config.get('QUOTA_MAX_BYTES', 1024 * 1024 * 1024),
+                max_inodes=config.get('QUOTA_MAX_INODES', 100000),
+                project_max_bytes=config.get('QUOTA_PROJECT_MAX_BYTES', 0),
+                project_max_inodes=config.get('QUOTA_PROJECT_MAX_INODES', 0),
+                reconcile_interval=config.get('QUOTA_RECONCILE_INTERVAL', 3600)
+            )
+            _tracker.start()
+    return _tracker
+
+
+def peek_quota_tracker():
+    """Return the tracker if it has been created, without creating it"""
+    return _tracker
@@ -0,0 +1,195 @@
+# server/app/services/repo_cache.py
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import git
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class RepoCache:
+    """
+    Open git.Repo handles kept between requests
+    Opening a Repo rediscovers its configuration and each handle starts
+    its own git cat-file helper processes on first use, so handles are
+    reused instead. A handle serves one caller at a time: repo() takes an
+    idle one for the repository or opens a new one, and puts it back when
+    the block ends. At most max_handles idle handles are kept, evicting the
+    least recently used, and handles idle for idle_timeout seconds are
+    closed, which ends their helper processes. A handle whose .git
+    directory was replaced since it was opened, or whose block failed in
+    git, is closed rather than reused.
+    """
+
+    def __init__(self, max_handles=32, idle_timeout=300):
+        self.max_handles = max_handles
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()  # repository path -> [(repo, identity, released_at)], most recent last
+        self._count = 0
+        self._closed = threading.Event()
+        self._thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def start(self):
+        if self.idle_timeout and self._thread is None:
+            self._thread = threading.Thread(target=self._expire_loop, name="repo-cache", daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def repo(self, path):
+        """Use a handle on the repository whose work tree is at path for the length of a block"""
+        repo, identity = self._checkout(path)
+        healthy = False
+        try:
+            yield repo
+            healthy = True
+        except Exception as e:
+            # A git failure may have left the helper processes mid-conversation;
+            # errors raised by the caller's own checks leave the handle usable
+            healthy = not isinstance(e, (git.exc.GitError, OSError))
+            raise
+        finally:
+            if healthy:
+                self._checkin(path, repo, identity)
+            else:
+                _close(repo)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "handles": self._count,
+                "repositories": len(self._idle),
+                "max_handles": self.max_handles,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+                "expired": self.expired
+            }
+
+    def shutdown(self):
+        self._closed.set()
+        with self._lock:
+            handles = [handle for cached in self._idle.values() for handle in cached]
+            self._idle.clear()
+            self._count = 0
+        for repo, _, _ in handles:
+            _close(repo)
+
+    def _checkout(self, path):
+        identity = _identity(path)
+        stale = []
+        found = None
+        with self._lock:
+            handles = self._idle.get(path)
+            while handles and found is None:
+                repo, handle_identity, _ = handles.pop()
+                self._count -= 1
+                if handle_identity == identity:
+                    found = repo
+                else:
+                    stale.append(repo)
+            if handles is not None and not handles:
+                del self._idle[path]
+            if found is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        for repo in stale:
+            _close(repo)
+        return (found if found is not None else git.Repo(path)), identity
+
+    def _checkin(self, path, repo, identity):
+        evicted = []
+        with self._lock:
+            if self._closed.is_set() or not self.max_handles:
+                evicted.append(repo)
+            else:
+                self._idle.setdefault(path, []).append((repo, identity, time.monotonic()))
+                self._idle.move_to_end(path)
+                self._count += 1
+                while self._count > self.max_handles:
+                    oldest = next(iter(self._idle))
+                    handles = self._idle[oldest]
+                    evicted.append(handles.pop(0)[0])
+                    if not handles:
+                        del self._idle[oldest]
+                    self._count -= 1
+                    self.evicted += 1
+        for old in evicted:
+            _close(old)
+
+    def _expire_loop(self):
+        while not self._closed.wait(max(1, self.idle_timeout / 2)):
+            cutoff = time.monotonic() - self.idle_timeout
+            expired = []
+            with self._lock:
+                for path in list(self._idle):
+                    handles = self._idle[path]
+                    expired += [repo for repo, _, released_at in handles if released_at < cutoff]
+                    handles[:] = [handle for handle in handles if handle[2] >= cutoff]
+                    if not handles:
+                        del self._idle[path]
+                self._count -= len(expired)
+                self.expired += len(expired)
+            for repo in expired:
+                _close(repo)
+
+
+def _identity(path):
+    """Device and inode of a work tree's .git, which change if the repository is recreated"""
+    try:
+        git_stat = os.stat(os.path.join(path, '.git'))
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return git_stat.st_dev, git_stat.st_ino
+
+
+def _close(repo):
+    try:
+        repo.close()
+    except Exception as e:
+        logger.warning(f"Failed to close repository handle: {str(e)}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_repo_cache():
+    """Get the process-wide repository handle cache, or None if handles are not reused"""
+    global _cache
+    config = current_app.config
+    if not config.get('GIT_REPO_CACHE_ENABLED', True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = RepoCache(
+                max_handles=config.get('GIT_REPO_CACHE_MAX', 32),
+                idle_timeout=config.get('GIT_REPO_CACHE_IDLE_TIMEOUT', 300)
+            )
+            _cache.start()
+    return _cache
+
+
+def shutdown_repo_cache():
+    """Close every cached handle and forget the cache"""
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache:
+        cache.shutdown()
+
+
+def peek_repo_cache():
+    """Return the cache if it has been created, without creating it"""
+    return _cache
@@ -0,0 +1,252 @@
+# server/app/services/repo_status.py
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.services.file_watcher import peek_file_watcher
+from app.utils.locks import LockTable
+
+logger = logging.getLogger(__name__)
+
+STATUS_COMMAND = ["git", "--no-optional-locks", "status", "--porcelain=v2", "-z", "--branch",
+                  "--untracked-files=all"]
+
+
+def read_status(path, timeout=60):
+    """
+    Status of the repository whose work tree is at path, in one git process
+    --no-optional-locks keeps git from rewriting the index while it looks,
+    so concurrent reads never contend for index.lock.
+    """
+    result = subprocess.run(STATUS_COMMAND, cwd=path, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise ValueError(f"git status failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return parse_porcelain_v2(result.stdout.decode('utf-8', 'replace'))
+
+
+def parse_porcelain_v2(output):
+    """
+    Turn `git status --porcelain=v2 -z --branch` output into the status schema
+    Staged files are those whose index differs from HEAD; modified and
+    deleted files differ between the index and the work tree; unmerged
+    files count as modified. branch is None when HEAD is detached.
+    """
+    branch = None
+    untracked_files = []
+    modified_files = []
+    staged_files = []
+    deleted_files = []
+    tracked_changes = False
+
+    tokens = iter(output.split("\0"))
+    for token in tokens:
+        if not token:
+            continue
+        kind = token[0]
+        if kind == "#":
+            if token.startswith("# branch.head "):
+                head = token[len("# branch.head "):]
+                branch = None if head == "(detached)" else head
+        elif kind == "?":
+            untracked_files.append(token[2:])
+        elif kind in "12":
+            # 1 XY sub mH mI mW hH hI path; renames add a score before the path
+            # and the original path as the next token
+            fields = token.split(" ", 8 if kind == "1" else 9)
+            if kind == "2":
+                next(tokens, None)
+            staged, worktree = fields[1]
+            path = fields[-1]
+            tracked_changes = True
+            if staged != ".":
+                staged_files.append(path)
+            if worktree == "M":
+                modified_files.append(path)
+            elif worktree == "D":
+                deleted_files.append(path)
+        elif kind == "u":
+            tracked_changes = True
+            modified_files.append(token.split(" ", 10)[-1])
+
+    return {
+        "branch": branch,
+        "is_dirty": tracked_changes,
+        "untracked_files": untracked_files,
+        "modified_files": modified_files,
+        "staged_files": staged_files,
+        "deleted_files": deleted_files
+    }
+
+
+class StatusCache:
+    """
+    Repository status results kept until something that affects them changes
+    An entry is checked against the stat of .git/HEAD, .git/index,
+    packed-refs and the current branch's ref file, so git operations from
+    any source invalidate it. Work tree edits do not touch those files, so
+    entries are also dropped by invalidate(), which the storage service
+    calls for every write, and by file watcher events. Edits the server
+    cannot see, such as from running code, are covered by the watcher while
+    a workspace is watched (for up to watched_max_age seconds) and by ttl
+    otherwise. Concurrent misses on one repository share a single run.
+    """
+
+    def __init__(self, storage_path, ttl=2.0, watched_max_age=60.0, max_entries=256, timeout=60):
+        self.storage_path = storage_path
+        self.ttl = ttl
+        self.watched_max_age = watched_max_age
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # work tree path -> {"version": int, "entry": cached result or None}
+        self._runs = LockTable()
+        self._watcher = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.run_time = 0.0
+
+    def get(self, user_id, path):
+        """Status for the repository at path, from the cache when it is still valid"""
+        watcher = peek_file_watcher()
+        if watcher is not None and watcher is not self._watcher:
+            self._watcher = watcher
+            watcher.subscribe(self._note_watched)
+        watched = watcher is not None and watcher.is_watched(user_id)
+        max_age = self.watched_max_age if watched else self.ttl
+
+        result = self._lookup(path, max_age)
+        if result is not None:
+            return result
+        with self._runs.write(path):
+            # Another request may have filled the entry while this one waited
+            result = self._lookup(path, max_age)
+            if result is not None:
+                return result
+            with self._lock:
+                slot = self._slot(path)
+                version = slot["version"]
+                self.misses += 1
+            signature = _signature(path)
+            start = time.monotonic()
+            result = read_status(path, timeout=self.timeout)
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.run_time += elapsed
+                # An invalidation that arrived during the run means the result may already be stale
+                if self._slots.get(path) is slot and slot["version"] == version:
+                    slot["entry"] = {"result": result, "signature": signature, "computed_at": time.monotonic()}
+        return _copy(result)
+
+    def invalidate(self, full_path):
+        """Drop cached status for repositories containing, or inside, a changed path"""
+        full_path = os.path.normpath(full_path)
+        with self._lock:
+            for path, slot in self._slots.items():
+                if full_path == path or full_path.startswith(path + os.sep) or path.startswith(full_path + os.sep):
+                    slot["version"] += 1
+                    if slot["entry"] is not None:
+                        slot["entry"] = None
+                        self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "repositories": sum(1 for slot in self._slots.values() if slot["entry"] is not None),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "mean_run_ms": round(self.run_time / self.misses * 1000, 1) if self.misses else None
+            }
+
+    def _lookup(self, path, max_age):
+        with self._lock:
+            slot = self._slots.get(path)
+            entry = slot["entry"] if slot else None
+            if entry is None or time.monotonic() - entry["computed_at"] > max_age:
+                return None
+            signature = entry["signature"]
+        if _signature(path) != signature:
+            return None
+        with self._lock:
+            self.hits += 1
+            if path in self._slots:
+                self._slots.move_to_end(path)
+        return _copy(entry["result"])
+
+    def _slot(self, path):
+        """Get or add a repository's slot, evicting the least recently used (lock held)"""
+        slot = self._slots.get(path)
+        if slot is None:
+            slot = self._slots[path] = {"version": 0, "entry": None}
+            while len(self._slots) > self.max_entries:
+                self._slots.popitem(last=False)
+        self._slots.move_to_end(path)
+        return slot
+
+    def _note_watched(self, user_id, events):
+        """File watcher subscriber: invalidate repositories the changed paths fall in"""
+        root = os.path.join(self.storage_path, str(user_id))
+        for event in events:
+            self.invalidate(os.path.join(root, event["path"]))
+
+
+def _signature(path):
+    """Stats of the files under .git whose change means the status changed"""
+    git_dir = os.path.join(path, '.git')
+    names = ["HEAD", "index", "packed-refs"]
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read(1024).strip()
+        if head.startswith("ref: "):
+            names.append(head[len("ref: "):])
+    except OSError:
+        head = None
+
+    signature = [head]
+    for name in names:
+        try:
+            file_stat = os.stat(os.path.join(git_dir, name))
+            signature.append((file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _copy(result):
+    return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_status_cache():
+    """Get the process-wide status cache, or None if status results are not cached"""
+    global _cache
+    config = current_app.config
+    if not config.get('GIT_STATUS_CACHE_ENABLED', True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = StatusCache(
+                config.get('STORAGE_PATH', 'storage'),
+                ttl=config.get('GIT_STATUS_CACHE_TTL', 2.0),
+                watched_max_age=config.get('GIT_STATUS_CACHE_WATCHED_MAX_AGE', 60.0),
+                max_entries=config.get('GIT_STATUS_CACHE_MAX', 256),
+                timeout=config.get('GIT_STATUS_TIMEOUT', 60)
+            )
+    return _cache
+
+
+def peek_status_cache():
+    """Return the cache if it has been created, without creating it"""
+    return _cache
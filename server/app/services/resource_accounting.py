@@ -0,0 +1,222 @@
+# server/app/services/resource_accounting.py
+import logging
+import threading
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# CFS period used to express CPU limits as a quota; quotas (unlike nano_cpus)
+# can be changed on a running container with container.update()
+CPU_PERIOD = 100_000
+
+PHASES = ("queue", "create", "run", "collect")
+
+# Memory figures a run can report; see ResourceMonitor for how they differ
+MEMORY_FIELDS = ("peak_memory", "sampled_memory")
+
+SIZE_UNITS = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def resolve_limits(language, tier="free"):
+    """
+    Work out the execution limits for a run
+    EXECUTION_LIMITS holds the defaults, overridden first by
+    EXECUTION_LANGUAGE_LIMITS[language] and then by EXECUTION_TIER_LIMITS[tier]
+    """
+    config = current_app.config
+    limits = {
+        "memory": "128m",
+        "memory_swap": "256m",
+        "cpus": 0.5,
+        "pids": 64,
+        "timeout": config.get('EXECUTION_TIMEOUT', 30)
+    }
+    limits.update(config.get('EXECUTION_LIMITS', {}))
+    limits.update(config.get('EXECUTION_LANGUAGE_LIMITS', {}).get(language, {}))
+    limits.update(config.get('EXECUTION_TIER_LIMITS', {}).get(tier, {}))
+    return limits
+
+
+def docker_limits(limits, include_pids=True):
+    """
+    Translate limits into docker-py container options
+    pids_limit can only be set at creation, so leave it out for container.update()
+    """
+    options = {
+        "mem_limit": limits["memory"],
+        "memswap_limit": limits["memory_swap"],
+        "cpu_period": CPU_PERIOD,
+        "cpu_quota": int(float(limits["cpus"]) * CPU_PERIOD)
+    }
+    if include_pids:
+        options["pids_limit"] = limits["pids"]
+    return options
+
+
+def parse_size(value):
+    """Convert a Docker-style size such as '128m' or 1048576 into bytes"""
+    text = str(value).strip().lower()
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+class ResourceMonitor:
+    """
+    Samples a container's CPU and memory use while code runs
+    cpu_time is how much the container's cumulative CPU usage grew between
+    start() and stop(). sampled_memory is the largest working set seen in
+    the samples, taken every interval seconds plus one at stop(); it is not
+    a peak, and for a run shorter than the interval it is only the working
+    set left at the end. peak_memory is the cgroup's own high-water mark
+    (cgroup v1 max_usage), reported only for containers created for this
+    run, since a pooled container's mark includes earlier runs and cannot
+    be reset from outside. Otherwise it is None.
+    """
+
+    def __init__(self, container, interval=0.25, fresh=False):
+        self.container = container
+        self.interval = interval
+        self.fresh = fresh
+        self._stop = threading.Event()
+        self._thread = None
+        self._baseline = None
+        self._cpu = None
+        self._sampled_memory = None
+        self._peak_memory = None
+        self.samples = 0
+
+    def start(self):
+        if self.fresh:
+            self._baseline = 0
+        else:
+            self._baseline = self._sample()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return {'cpu_time', 'sampled_memory', 'peak_memory', 'samples'}"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        # The container may already have exited, in which case this adds nothing
+        self._sample()
+
+        cpu_time = None
+        if self._cpu is not None and self._baseline is not None:
+            cpu_time = round(max(0, self._cpu - self._baseline) / 1e9, 3)
+        return {
+            "cpu_time": cpu_time,
+            "sampled_memory": self._sampled_memory,
+            "peak_memory": self._peak_memory,
+            "samples": self.samples
+        }
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        """Record one stats snapshot and return its cumulative CPU usage in ns"""
+        try:
+            try:
+                stats = self.container.stats(stream=False, one_shot=True)
+            except TypeError:
+                # docker-py releases without one_shot support
+                stats = self.container.stats(stream=False)
+        except Exception as e:
+            logger.debug(f"Stats unavailable for {self.container.short_id}: {str(e)}")
+            return None
+
+        cpu = stats.get("cpu_stats", {}).get("cpu_usage", {}).get("total_usage")
+        memory_stats = stats.get("memory_stats", {})
+        usage = memory_stats.get("usage")
+        if not cpu and not usage:
+            return None
+
+        self.samples += 1
+        if cpu:
+            self._cpu = max(self._cpu or 0, cpu)
+
+        if usage:
+            # Exclude reclaimable page cache, as `docker stats` does
+            details = memory_stats.get("stats", {})
+            inactive = details.get("inactive_file", details.get("total_inactive_file", 0))
+            self._sampled_memory = max(self._sampled_memory or 0, usage - inactive)
+            if self.fresh and memory_stats.get("max_usage"):
+                self._peak_memory = max(self._peak_memory or 0, memory_stats["max_usage"])
+        return cpu
+
+
+class ResourceAccounting:
+    """
+    Aggregates per-run resource figures by language and tier for capacity planning
+    peak_memory and sampled_memory are kept apart, as only the first is a
+    true peak; see ResourceMonitor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def record(self, language, tier, phases, usage):
+        with self._lock:
+            for key in (("language", language), ("tier", tier)):
+                group = self._groups.setdefault(key, {
+                    "runs": 0,
+                    "cpu_runs": 0,
+                    "cpu_time_total": 0.0,
+                    "cpu_time_max": 0.0,
+                    "memory": {field: {"runs": 0, "total": 0, "max": 0} for field in MEMORY_FIELDS},
+                    "phases": {phase: 0.0 for phase in PHASES}
+                })
+                group["runs"] += 1
+                if usage.get("cpu_time") is not None:
+                    group["cpu_runs"] += 1
+                    group["cpu_time_total"] += usage["cpu_time"]
+                    group["cpu_time_max"] = max(group["cpu_time_max"], usage["cpu_time"])
+                for field in MEMORY_FIELDS:
+                    if usage.get(field) is not None:
+                        memory = group["memory"][field]
+                        memory["runs"] += 1
+                        memory["total"] += usage[field]
+                        memory["max"] = max(memory["max"], usage[field])
+                for phase in PHASES:
+                    group["phases"][phase] += phases.get(phase) or 0.0
+
+    def stats(self):
+        """Totals, averages and maxima per language and per tier"""
+        with self._lock:
+            summary = {"languages": {}, "tiers": {}}
+            for (kind, name), group in self._groups.items():
+                runs = group["runs"]
+                summary["languages" if kind == "language" else "tiers"][name] = entry = {
+                    "runs": runs,
+                    "cpu_time": {
+                        "total": round(group["cpu_time_total"], 3),
+                        "avg": round(group["cpu_time_total"] / group["cpu_runs"], 3)
+                        if group["cpu_runs"] else None,
+                        "max": round(group["cpu_time_max"], 3)
+                    },
+                    "phases": {
+                        phase: {"total": round(total, 3), "avg": round(total / runs, 3)}
+                        for phase, total in group["phases"].items()
+                    }
+                }
+                for field, memory in group["memory"].items():
+                    entry[field] = {
+                        "runs": memory["runs"],
+                        "avg": memory["total"] // memory["runs"] if memory["runs"] else None,
+                        "max": memory["max"]
+                    }
+            return summary
+
+
+_accounting = ResourceAccounting()
+
+
+def get_resource_accounting():
+    """Get the process-wide resource accounting aggregator"""
+    return _accounting
@@ -0,0 +1,124 @@
+# server/app/services/result_cache.py
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class ResultCache:
+    """
+    In-memory LRU cache of execution results
+    Entries expire after ttl seconds; the least recently used entries are
+    dropped once the cache holds more than max_entries or max_bytes.
+    """
+
+    def __init__(self, ttl=300, max_entries=1000, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+
+    @staticmethod
+    def make_key(language, image_id, code, input_data, limits=None):
+        """
+        Key a run by language, exact image digest, code, input and the limits it ran under
+        A run that succeeded under one tier's limits may fail under another's.
+        """
+        digest = hashlib.sha256()
+        for part in (language, image_id, code, input_data, json.dumps(limits, sort_keys=True)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return a copy of the cached result for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] < time.time():
+                self._remove(key)
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[2])
+
+    def put(self, key, result):
+        """Cache a result if it came from a deterministic, successful run"""
+        if result.get("exit_code") != 0 or result.get("timed_out"):
+            with self._lock:
+                self.skipped += 1
+            return False
+
+        size = len(result.get("stdout", "")) + len(result.get("stderr", "")) + 512
+        if size > self.max_bytes:
+            with self._lock:
+                self.skipped += 1
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + self.ttl, size, copy.deepcopy(result))
+            self._bytes += size
+            self.stores += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def stats(self):
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+    def _remove(self, key):
+        """Drop an entry (lock held)"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Get the process-wide result cache, creating it from app config on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = current_app.config
+            _cache = ResultCache(
+                ttl=config.get('RESULT_CACHE_TTL', 300),
+                max_entries=config.get('RESULT_CACHE_MAX_ENTRIES', 1000),
+                max_bytes=config.get('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+            )
+    return _cache
+
+
+def peek_result_cache():
+    """Return the result cache if it has been created, without creating it"""
+    return _cache
@@ -0,0 +1,826 @@
+# server/app/services/search_index.py
+import atexit
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from fnmatch import fnmatch
+
+from flask import current_app
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from app.services.cold_tier import decode as decode_cold
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    in_base INTEGER NOT NULL DEFAULT 0,
+    trigrams BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram INTEGER PRIMARY KEY,
+    ids BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS delta (
+    trigram INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Bytes sniffed for a NUL to decide a file is binary and not worth indexing
+BINARY_SNIFF_BYTES = 8192
+
+# Files indexed per transaction while reconciling
+BATCH_SIZE = 200
+
+# How long past its deadline a regex worker may take to answer before it is killed
+KILL_GRACE = 0.25
+
+
+def pack_ids(values):
+    return array("I", sorted(values)).tobytes()
+
+
+def unpack_ids(blob):
+    values = array("I")
+    values.frombytes(blob)
+    return values
+
+
+def trigrams(data):
+    """Distinct byte trigrams of data, ASCII-lowercased and packed into ints"""
+    data = data.lower()
+    return {int.from_bytes(data[i:i + 3], "big") for i in range(len(data) - 2)}
+
+
+def required_literals(pattern):
+    """
+    Literal runs that any match of a regex must contain
+    Only literals outside groups count, and an optional or repeated
+    character ends a run. Returns None for a top-level alternation, where
+    no run is required.
+    """
+    runs = []
+    run = ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        literal = None
+        if char == "\\":
+            escaped = pattern[i + 1:i + 2]
+            i += 2
+            if escaped and not escaped.isalnum():
+                literal = escaped
+        elif char == "[":
+            # Skip the whole character class
+            i += 1
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+        elif char == "(":
+            depth += 1
+            i += 1
+        elif char == ")":
+            depth -= 1
+            i += 1
+        elif char == "|" and depth == 0:
+            return None
+        elif char == "{":
+            i = pattern.find("}", i) + 1 or len(pattern)
+        else:
+            i += 1
+            if char not in ".^$*+?|":
+                literal = char
+
+        if literal is None or depth > 0:
+            runs.append(run)
+            run = ""
+            continue
+
+        quantifier = pattern[i:i + 1]
+        if quantifier in ("*", "?", "{"):
+            # Optional or counted, so it may be absent from a match
+            runs.append(run)
+            run = ""
+        elif quantifier == "+":
+            runs.append(run + literal)
+            run = ""
+        else:
+            run += literal
+
+    runs.append(run)
+    return [run for run in runs if len(run) >= 3]
+
+
+def nested_repeats(pattern):
+    """
+    Whether a regex repeats without bound something that itself repeats without bound
+    Patterns like (a+)+ backtrack exponentially on lines that almost match,
+    and a running match cannot be interrupted to honour a time budget.
+    """
+    def parts(value):
+        if isinstance(value, sre_parse.SubPattern):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                yield from parts(item)
+
+    def walk(items, repeated):
+        for op, value in items:
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and value[1] == sre_parse.MAXREPEAT:
+                if repeated or walk(value[2], True):
+                    return True
+            elif any(walk(part, repeated) for part in parts(value)):
+                return True
+        return False
+
+    return walk(sre_parse.parse(pattern), False)
+
+
+def scan_file(root, path, compiled, limit, context=0, max_file_bytes=1024 * 1024,
+              max_line_length=None, deadline=None):
+    """
+    Up to limit matches of a compiled pattern in one file
+    Returns (matches, finished); finished is False if deadline passed
+    before the file was done. Only the first max_line_length characters of
+    a line are searched. Unreadable and binary files have no matches.
+    """
+    try:
+        with open(os.path.join(root, path), "rb") as f:
+            data = decode_cold(f.read(max_file_bytes + 1), max_file_bytes)
+    except OSError:
+        return [], True
+    if data is None or b"\0" in data[:BINARY_SNIFF_BYTES]:
+        return [], True
+    lines = data.decode("utf-8", errors="replace").splitlines()
+
+    matches = []
+    for number, line in enumerate(lines):
+        if deadline is not None and time.time() > deadline:
+            return matches, False
+        found = compiled.search(line[:max_line_length] if max_line_length else line)
+        if not found:
+            continue
+        matches.append({
+            "path": path,
+            "line": number + 1,
+            "column": found.start() + 1,
+            "text": line,
+            "before": lines[max(0, number - context):number] if context else [],
+            "after": lines[number + 1:number + 1 + context] if context else []
+        })
+        if len(matches) >= limit:
+            break
+    return matches, True
+
+
+def _scan_worker(connection):
+    """Regex worker process: takes a pattern, then answers one scan_file() call per path"""
+    options = None
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == "pattern":
+            _, pattern, flags, root, context, max_file_bytes, max_line_length = message
+            options = (root, re.compile(pattern, flags), context, max_file_bytes, max_line_length)
+            continue
+        path, limit, deadline = message
+        root, compiled, context, max_file_bytes, max_line_length = options
+        try:
+            result = scan_file(root, path, compiled, limit, context, max_file_bytes, max_line_length, deadline)
+        except Exception:
+            result = ([], True)
+        connection.send(result)
+
+
+class RegexScanner:
+    """
+    Runs regex searches in worker processes that are killed when they overrun
+    A match in Python's re cannot be interrupted, so a pattern that
+    backtracks badly, such as (a|a)*b or .*.*.*x, would otherwise hold a
+    request thread and the GIL for as long as it likes. Workers stop between
+    lines once the deadline passes; one still busy KILL_GRACE seconds later
+    is stuck inside a match and is killed. Workers are reused between
+    searches, and at most max_workers scans run at once.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+
+        self.scans = 0
+        self.killed = 0
+
+    def scan(self, root, paths, pattern, flags, limit, context=0, max_file_bytes=1024 * 1024,
+             max_line_length=None, deadline=None):
+        """Search paths in order like SearchIndex.search(); returns (matches, files_scanned, truncated)"""
+        matches = []
+        scanned = 0
+        if not paths:
+            return matches, scanned, False
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.time())):
+            return matches, scanned, True
+
+        worker = None
+        try:
+            worker = self._checkout()
+            _, connection = worker
+            connection.send(("pattern", pattern, flags, root, context, max_file_bytes, max_line_length))
+            for path in paths:
+                if len(matches) >= limit or time.time() > deadline:
+                    return matches, scanned, True
+                scanned += 1
+                connection.send((path, limit - len(matches), deadline))
+                if not connection.poll(max(0.0, deadline - time.time()) + KILL_GRACE):
+                    # Stuck inside a single match; only killing the process stops it
+                    self._kill(worker)
+                    worker = None
+                    return matches, scanned, True
+                found, finished = connection.recv()
+                matches += found
+                if not finished:
+                    return matches, scanned, True
+            return matches, scanned, False
+        except (EOFError, OSError) as e:
+            logger.warning(f"Regex search worker failed: {str(e)}")
+            if worker is not None:
+                self._kill(worker)
+                worker = None
+            return matches, scanned, True
+        finally:
+            if worker is not None:
+                self._checkin(worker)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "idle_workers": len(self._idle),
+                "max_workers": self.max_workers,
+                "scans": self.scans,
+                "killed": self.killed
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._kill(worker, count=False)
+
+    def _checkout(self):
+        with self._lock:
+            self.scans += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker[0].is_alive():
+                    return worker
+        parent_end, child_end = self._context.Pipe()
+        process = self._context.Process(target=_scan_worker, args=(child_end,),
+                                        name="regex-search", daemon=True)
+        process.start()
+        child_end.close()
+        return process, parent_end
+
+    def _checkin(self, worker):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(worker)
+                return
+        self._kill(worker, count=False)
+
+    def _kill(self, worker, count=True):
+        process, connection = worker
+        process.kill()
+        process.join(1)
+        connection.close()
+        if count:
+            with self._lock:
+                self.killed += 1
+
+
+class SearchIndex:
+    """
+    Persistent trigram index over one user's storage root
+    The index lives in an SQLite database outside the user's storage. Each
+    text file is reduced to its set of ASCII-lowercased byte trigrams.
+    Queries open only the files that contain every trigram of the query's
+    required literals, then confirm matches line by line.
+
+    Posting lists (trigram -> packed file IDs) are built in bulk by
+    compact(). Files written since then are "dirty": their base postings
+    are ignored and their trigrams sit in a small delta table instead. The
+    storage service keeps that delta current through note_change().
+    reconcile() picks up changes made behind its back by comparing sizes
+    and mtimes, and compacts once the delta grows. Bulk changes skip the
+    delta; those files are scanned by every query until the compaction
+    that note_change() or reconcile() starts for them has run.
+    """
+
+    def __init__(self, root, db_path, ignore=(), max_file_bytes=1024 * 1024, refresh_interval=300,
+                 compact_threshold=500):
+        self.root = root
+        self.db_path = db_path
+        self.ignore = [pattern for pattern in ignore if pattern]
+        self.max_file_bytes = max_file_bytes
+        self.refresh_interval = refresh_interval
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._reconcile_lock = threading.Lock()
+        self.last_reconciled = None
+        self.last_compacted = None
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = self._connect()
+        self._db.executescript(SCHEMA)
+
+        # File IDs and paths are small enough to keep in memory, which spares
+        # queries a join; dirty IDs are those whose base postings are stale,
+        # unlisted ones the dirty IDs that have no delta rows either
+        self._paths = {}
+        self._dirty = set()
+        for file_id, path, in_base in self._db.execute("SELECT id, path, in_base FROM files"):
+            self._paths[file_id] = path
+            if not in_base:
+                self._dirty.add(file_id)
+        listed = {row[0] for row in self._db.execute("SELECT DISTINCT file_id FROM delta")}
+        self._unlisted = self._dirty - listed
+        self.ready = bool(self._paths)
+
+    def search(self, query, regex=False, case_sensitive=False, glob=None, limit=100,
+               context=0, time_budget=2.0, max_line_length=None, scanner=None):
+        """
+        Find lines matching query
+        Returns matches (path, line, column, text and up to context lines
+        before and after) in path order, stopping at limit matches or when
+        time_budget seconds have passed, checked before every line. Regex
+        queries only look at the first max_line_length characters of a line
+        and run on scanner, a RegexScanner, when one is given, which enforces
+        the budget even inside a match. Until the first build finishes, every
+        file is scanned and indexed is False.
+        """
+        start_time = time.time()
+        deadline = start_time + time_budget
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            compiled = re.compile(query if regex else re.escape(query), flags)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {str(e)}")
+        if regex and nested_repeats(query):
+            raise ValueError("Regular expression nests unbounded repeats such as (a+)+; "
+                             "simplify it, for example to a+")
+
+        literals = (required_literals(query) if regex else [query]) or []
+        if not case_sensitive or regex and "(?" in query:
+            # ASCII lowercasing cannot fold other scripts, so only all-ASCII runs filter
+            literals = [literal for literal in literals if literal.isascii()]
+        wanted = set()
+        for literal in literals:
+            wanted |= trigrams(literal.encode("utf-8"))
+
+        indexed = self.ready
+        if indexed:
+            paths = self._candidates(wanted)
+        else:
+            paths = sorted(path for path, _ in self._walk(""))
+        if glob:
+            paths = [path for path in paths
+                     if fnmatch(path, glob) or fnmatch(os.path.basename(path), glob)]
+
+        if regex and scanner is not None:
+            matches, scanned, truncated = scanner.scan(
+                self.root, paths, query, flags, limit, context, self.max_file_bytes, max_line_length, deadline)
+        else:
+            matches = []
+            scanned = 0
+            truncated = False
+            for path in paths:
+                if len(matches) >= limit or time.time() > deadline:
+                    truncated = True
+                    break
+                scanned += 1
+                found, finished = scan_file(self.root, path, compiled, limit - len(matches), context,
+                                            self.max_file_bytes, max_line_length if regex else None,
+                                            deadline)
+                matches += found
+                if not finished:
+                    truncated = True
+                    break
+
+        return {
+            "matches": matches,
+            "indexed": indexed,
+            "candidates": len(paths),
+            "files_scanned": scanned,
+            "truncated": truncated,
+            "took": round(time.time() - start_time, 3)
+        }
+
+    def note_change(self, path):
+        """Reindex a file or directory that was written, or drop it if it was deleted"""
+        full_path = os.path.join(self.root, path)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            if self._sync(path):
+                threading.Thread(target=self._compact_quietly, daemon=True).start()
+        elif os.path.lexists(full_path):
+            self._index_files([path])
+        else:
+            self._remove(path)
+
+    def reconcile(self):
+        """Bring the index in line with the files on disk, reindexing only what changed"""
+        with self._reconcile_lock:
+            self._sync("")
+            if self._meta("compaction_pending") not in (None, "0") or len(self._dirty) > self.compact_threshold:
+                self.compact()
+            self.ready = True
+            self.last_reconciled = time.time()
+
+    def reconcile_if_due(self):
+        """Start a background reconcile if the index was never checked or is stale"""
+        due = (self.last_reconciled is None
+               or time.time() - self.last_reconciled >= self.refresh_interval)
+        if due and not self._reconcile_lock.locked():
+            self.last_reconciled = time.time()
+            threading.Thread(target=self._reconcile_quietly, daemon=True).start()
+
+    def compact(self):
+        """
+        Rebuild the posting lists from every file's trigrams and empty the delta
+        Runs on its own connection so queries keep using the old postings
+        until the rebuilt ones are committed.
+        """
+        start_time = time.time()
+        db = self._connect()
+        try:
+            postings = {}
+            versions = []
+            db.execute("BEGIN")
+            pending = db.execute("SELECT value FROM meta WHERE key = 'compaction_pending'").fetchone()
+            for file_id, version, blob in db.execute(
+                    "SELECT id, version, trigrams FROM files ORDER BY id"):
+                versions.append((file_id, version))
+                for trigram in unpack_ids(blob):
+                    ids = postings.get(trigram)
+                    if ids is None:
+                        ids = postings[trigram] = array("I")
+                    ids.append(file_id)
+            db.execute("COMMIT")
+
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM postings")
+                db.executemany("INSERT INTO postings (trigram, ids) VALUES (?, ?)",
+                               ((trigram, ids.tobytes()) for trigram, ids in postings.items()))
+                # Files rewritten since the snapshot keep their delta rows
+                db.executemany("UPDATE files SET in_base = 1 WHERE id = ? AND version = ?", versions)
+                db.execute("DELETE FROM delta WHERE file_id IN (SELECT id FROM files WHERE in_base = 1)")
+                # A bulk write that started after the snapshot leaves its marker behind
+                if pending:
+                    db.execute("UPDATE meta SET value = '0' WHERE key = 'compaction_pending' AND value = ?",
+                               pending)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._dirty = {row[0] for row in self._db.execute("SELECT id FROM files WHERE in_base = 0")}
+            self._unlisted &= self._dirty
+        self.last_compacted = time.time()
+        logger.info(f"Compacted search index {self.db_path}: {len(versions)} files, "
+                    f"{len(postings)} trigrams in {time.time() - start_time:.1f}s")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._paths),
+                "dirty": len(self._dirty),
+                "unlisted": len(self._unlisted),
+                "ready": self.ready,
+                "db_bytes": os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+                "last_reconciled": self.last_reconciled,
+                "last_compacted": self.last_compacted
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=30000")
+        return db
+
+    def _reconcile_quietly(self):
+        try:
+            self.reconcile()
+        except Exception as e:
+            logger.warning(f"Search index refresh failed for {self.root}: {str(e)}")
+
+    def _compact_quietly(self):
+        """Compact after a bulk change unless a reconcile has done so meanwhile"""
+        try:
+            with self._reconcile_lock:
+                if self._meta("compaction_pending") not in (None, "0"):
+                    self.compact()
+        except Exception as e:
+            logger.warning(f"Search index compaction failed for {self.root}: {str(e)}")
+
+    def _meta(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _candidates(self, wanted):
+        """Paths of indexed files containing every trigram in wanted"""
+        with self._lock:
+            if not wanted:
+                return sorted(self._paths.values())
+
+            # Intersect the base posting lists, shortest first
+            blobs = []
+            for trigram in wanted:
+                row = self._db.execute("SELECT ids FROM postings WHERE trigram = ?",
+                                       (trigram,)).fetchone()
+                blobs.append(row[0] if row else b"")
+            blobs.sort(key=len)
+            base = set(unpack_ids(blobs[0]))
+            for blob in blobs[1:]:
+                if not base:
+                    break
+                base.intersection_update(unpack_ids(blob))
+            base -= self._dirty
+
+            # Files written since the last compaction are matched through the delta
+            delta = None
+            if self._dirty:
+                for trigram in wanted:
+                    found = {row[0] for row in self._db.execute(
+                        "SELECT file_id FROM delta WHERE trigram = ?", (trigram,))}
+                    delta = found if delta is None else delta & found
+                    if not delta:
+                        break
+
+            # Files indexed in bulk have no delta rows and are scanned until compacted
+            ids = base | (delta or set()) | self._unlisted
+            return sorted(self._paths[file_id] for file_id in ids if file_id in self._paths)
+
+    def _sync(self, path):
+        """
+        Reconcile the indexed files at and below a directory with the disk
+        Returns True if so many files changed that they were left for compact().
+        """
+        on_disk = dict(self._walk(path))
+        prefix = path + os.sep if path else ""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                (path, len(prefix), prefix)
+            ).fetchall()
+        indexed = {row[0]: (row[1], row[2]) for row in rows}
+
+        for stale in set(indexed) - set(on_disk):
+            self._remove(stale)
+
+        changed = [file_path for file_path, signature in on_disk.items()
+                   if indexed.get(file_path) != signature]
+        # Large changes, such as the first build, skip the delta and compact instead
+        bulk = len(changed) > self.compact_threshold
+        if bulk:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) "
+                                 "VALUES ('compaction_pending', ?)", (str(time.time_ns()),))
+        for offset in range(0, len(changed), BATCH_SIZE):
+            self._index_files(changed[offset:offset + BATCH_SIZE], with_delta=not bulk)
+        return bulk
+
+    def _walk(self, path):
+        """Yield (path, (size, mtime_ns)) for files worth indexing under a directory"""
+        full_path = os.path.join(self.root, path) if path else self.root
+        try:
+            with os.scandir(full_path) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return
+
+        for entry in entries:
+            if any(fnmatch(entry.name, pattern) for pattern in self.ignore):
+                continue
+            entry_path = os.path.join(path, entry.name) if path else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(entry_path)
+            elif entry.is_file(follow_symlinks=False):
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if entry_stat.st_size <= self.max_file_bytes:
+                    yield entry_path, (entry_stat.st_size, entry_stat.st_mtime_ns)
+
+    def _index_files(self, paths, with_delta=True):
+        """(Re)index files in one transaction, dropping any that are binary, too large or gone"""
+        indexed = []
+        removed = []
+        for path in paths:
+            file_info = self._read_trigrams(path)
+            if file_info is None:
+                removed.append(path)
+            else:
+                indexed.append((path,) + file_info)
+
+        for path in removed:
+            self._remove(path)
+        if not indexed:
+            return
+
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for path, size, mtime_ns, file_trigrams in indexed:
+                    row = self._db.execute("SELECT id, in_base, trigrams FROM files WHERE path = ?",
+                                           (path,)).fetchone()
+                    blob = pack_ids(file_trigrams)
+                    if row:
+                        file_id, in_base, old_blob = row
+                        if not in_base:
+                            self._db.executemany("DELETE FROM delta WHERE trigram = ? AND file_id = ?",
+                                                 ((trigram, file_id) for trigram in unpack_ids(old_blob)))
+                        self._db.execute(
+                            "UPDATE files SET size = ?, mtime_ns = ?, version = version + 1, "
+                            "in_base = 0, trigrams = ? WHERE id = ?",
+                            (size, mtime_ns, blob, file_id))
+                    else:
+                        file_id = self._db.execute(
+                            "INSERT INTO files (path, size, mtime_ns, trigrams) VALUES (?, ?, ?, ?)",
+                            (path, size, mtime_ns, blob)
+                        ).lastrowid
+                    if with_delta:
+                        self._db.executemany("INSERT INTO delta (trigram, file_id) VALUES (?, ?)",
+                                             ((trigram, file_id) for trigram in file_trigrams))
+                    self._paths[file_id] = path
+                    self._dirty.add(file_id)
+                    if with_delta:
+                        self._unlisted.discard(file_id)
+                    else:
+                        self._unlisted.add(file_id)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _read_trigrams(self, path):
+        """Return (size, mtime_ns, trigrams) for a text file, or None if it should not be indexed"""
+        if any(fnmatch(part, pattern) for part in path.split(os.sep) for pattern in self.ignore):
+            return None
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                file_stat = os.fstat(f.fileno())
+                if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size > self.max_file_bytes:
+                    return None
+                # Cold files are indexed by their uncompressed content
+                data = decode_cold(f.read(self.max_file_bytes + 1), self.max_file_bytes)
+        except OSError:
+            return None
+
+        if data is None or b"\0" in data[:BINARY_SNIFF_BYTES] or len(data) > self.max_file_bytes:
+            return None
+        return file_stat.st_size, file_stat.st_mtime_ns, trigrams(data)
+
+    def _remove(self, path):
+        """Drop a file, or every file under a directory, from the index"""
+        prefix = path + os.sep
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, in_base, trigrams FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (path, len(prefix), prefix)).fetchall()
+                for file_id, in_base, blob in rows:
+                    if not in_base:
+                        self._db.executemany("DELETE FROM delta WHERE trigram = ? AND file_id = ?",
+                                             ((trigram, file_id) for trigram in unpack_ids(blob)))
+                    # Base postings may still list the ID; it is dropped from _paths below
+                    self._db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            for file_id, _, _ in rows:
+                self._paths.pop(file_id, None)
+                self._dirty.discard(file_id)
+                self._unlisted.discard(file_id)
+
+
+class SearchIndexRegistry:
+    """Keeps the most recently used workspace search indexes open, closing the rest"""
+
+    def __init__(self, index_dir, max_open=32, **index_options):
+        self.index_dir = index_dir
+        self.max_open = max_open
+        self.index_options = index_options
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def get(self, user_id, root):
+        """Open (or reuse) the index for a user's storage root"""
+        key = str(user_id)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                db_name = re.sub(r"[^A-Za-z0-9_-]", "_", key) + ".sqlite3"
+                index = SearchIndex(root, os.path.join(self.index_dir, db_name), **self.index_options)
+                self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_open:
+                _, evicted = self._indexes.popitem(last=False)
+                evicted.close()
+            return index
+
+    def peek(self, user_id):
+        """Get a user's index only if it is currently open"""
+        with self._lock:
+            return self._indexes.get(str(user_id))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_search_indexes():
+    """Get the process-wide search index registry, creating it from app config on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            config = current_app.config
+            _registry = SearchIndexRegistry(
+                config.get('SEARCH_INDEX_DIR'),
+                max_open=config.get('SEARCH_MAX_OPEN_INDEXES', 32),
+                ignore=config.get('FILE_TREE_IGNORE', ['.git', 'node_modules', '__pycache__']),
+                max_file_bytes=config.get('SEARCH_MAX_FILE_BYTES', 1024 * 1024),
+                refresh_interval=config.get('SEARCH_INDEX_REFRESH_INTERVAL', 300)
+            )
+    return _registry
+
+
+def peek_search_indexes():
+    """Return the registry if it has been created, without creating it"""
+    return _registry
+
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+
+def get_regex_scanner():
+    """Get the process-wide regex scanner, or None if regex searches run in the request thread"""
+    global _scanner
+    workers = current_app.config.get('SEARCH_REGEX_WORKERS', 2)
+    if not workers:
+        return None
+    with _scanner_lock:
+        if _scanner is None:
+            _scanner = RegexScanner(max_workers=workers)
+            atexit.register(_scanner.shutdown)
+    return _scanner
+
+
+def peek_regex_scanner():
+    """Return the scanner if it has been created, without creating it"""
+    return _scanner
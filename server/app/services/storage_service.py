@@ -1,13 +1,53 @@
 # server/app/services/storage_service.py
+import json
+import mmap
 import os
 import shutil
+import stat
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from fnmatch import fnmatch
 from pathlib import Path
 from flask import current_app
 import logging
 from app.models.user import User
+from app.services.blob_store import get_blob_store, peek_blob_store
+from app.services.cold_tier import get_cold_tier, peek_cold_tier
+from app.services.file_watcher import get_file_watcher, peek_file_watcher
+from app.services.repo_status import peek_status_cache
+from app.services.quota_service import get_quota_tracker, peek_quota_tracker, measure_usage, project_of
+from app.services.search_index import (
+    BINARY_SNIFF_BYTES, get_regex_scanner, get_search_indexes, peek_search_indexes
+)
+from app.services.workspace_index import (
+    RACY_WINDOW,
+    describe_entry,
+    get_workspace_indexes,
+    listing_etag,
+    peek_workspace_indexes
+)
+from app.services.write_buffer import get_write_coalescer, peek_write_coalescer
+from app.utils.file_helpers import get_file_type
+from app.utils.text_patch import apply_edits, apply_unified_diff
 
 logger = logging.getLogger(__name__)
 
+class PreconditionFailedError(Exception):
+    """Raised when a conditional write finds the file changed since the client read it"""
+
+# Read-modify-write cycles on the same path are serialized through one of these
+_path_locks = [threading.Lock() for _ in range(64)]
+
+# Permissions for newly written files, as open() would create them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_save_stats = {"patches": 0, "patch_conflicts": 0, "patch_bytes_received": 0, "patched_file_bytes": 0}
+_save_stats_lock = threading.Lock()
+
 def get_user_storage_path(user_id):
     """Get the absolute path to a user's storage directory"""
     base_path = current_app.config.get('STORAGE_PATH', 'storage')
@@ -29,34 +69,299 @@ def validate_path(user_id, path):
     
     return full_path
 
+def get_workspace_index(user_id):
+    """Get the metadata index for a user's storage, or None if indexing is disabled"""
+    if not current_app.config.get('WORKSPACE_INDEX_ENABLED', True):
+        return None
+    return get_workspace_indexes().get(user_id, get_user_storage_path(user_id))
+
+def relative_storage_path(user_id, full_path):
+    """Turn a validated absolute path back into a normalized storage-relative one"""
+    path = os.path.relpath(full_path, get_user_storage_path(user_id))
+    return "" if path == "." else path
+
+def note_change(user_id, full_path):
+    """Tell the user's indexes, the git status cache and anyone watching that a path changed"""
+    path = relative_storage_path(user_id, full_path)
+    _update_indexes(user_id, [path])
+    status_cache = peek_status_cache()
+    if status_cache:
+        status_cache.invalidate(full_path)
+    watcher = peek_file_watcher()
+    if watcher:
+        watcher.publish(user_id, path)
+
+def _update_indexes(user_id, paths):
+    for registry in (peek_workspace_indexes(), peek_search_indexes()):
+        index = registry.peek(user_id) if registry else None
+        if not index:
+            continue
+        for path in paths:
+            try:
+                index.note_change(path)
+            except Exception as e:
+                # An index that missed a change is corrected by its next refresh
+                logger.warning(f"Failed to update index for {path}: {str(e)}")
+
+def _note_watched(user_id, events):
+    """File watcher subscriber: bring the indexes up to date with changes made outside the storage service"""
+    _update_indexes(user_id, [event["path"] for event in events if event["origin"] == "filesystem"])
+
+def _get_file_watcher():
+    """The file watcher, or None if changes are not watched"""
+    return get_file_watcher(on_change=_note_watched)
+
+def open_change_stream(user_id, path=""):
+    """
+    Open a stream of change batches for a user's storage at or below path
+    Returns None if the file watcher is disabled.
+    """
+    try:
+        full_path = validate_path(user_id, path)
+        ensure_user_path_exists(user_id)
+        watcher = _get_file_watcher()
+        if watcher is None:
+            return None
+        return watcher.open_stream(user_id, relative_storage_path(user_id, full_path))
+    except Exception as e:
+        logger.error(f"Error opening change stream: {str(e)}")
+        raise
+
+def usage_before_change(user_id, full_path):
+    """Measure a path ahead of a change for charge_usage(), or None if quotas are off"""
+    tracker = get_quota_tracker()
+    if not tracker:
+        return None
+    # A first scan landing between the two measurements would count the change twice
+    tracker.track(user_id)
+    return measure_usage(full_path)
+
+def charge_usage(user_id, full_path, before):
+    """Move the user's quota counters by how much a path grew or shrank since usage_before_change()"""
+    tracker = get_quota_tracker()
+    if tracker and before is not None:
+        after = measure_usage(full_path)
+        tracker.adjust(user_id, relative_storage_path(user_id, full_path),
+                       after[0] - before[0], after[1] - before[1])
+
+def check_quota(user_id, full_path, bytes_delta, inodes_delta, user_scope=True):
+    """Raise QuotaExceededError if growing a path by these amounts would pass a quota"""
+    tracker = get_quota_tracker()
+    if tracker:
+        tracker.check(user_id, relative_storage_path(user_id, full_path), bytes_delta, inodes_delta,
+                      user_scope=user_scope)
+
+def _check_write_quota(user_id, full_path, content):
+    """Check the quota for replacing or creating a file with content"""
+    try:
+        old_size, new_inodes = os.lstat(full_path).st_size, 0
+    except FileNotFoundError:
+        old_size, new_inodes = 0, 1
+    check_quota(user_id, full_path, len(content.encode('utf-8')) - old_size, new_inodes)
+
+def _missing_ancestor(full_path):
+    """The topmost directory of full_path that does not exist yet, or None"""
+    missing = None
+    while not os.path.exists(full_path):
+        missing = full_path
+        full_path = os.path.dirname(full_path)
+    return missing
+
+def file_etag(full_path, file_stat=None):
+    """
+    Strong validator for a file's content
+    Built from inode, size and mtime, so no content is read. A file
+    modified within the last second also gets a checksum of its content,
+    since a second same-size write inside the filesystem's timestamp
+    granularity would leave the rest unchanged.
+    """
+    file_stat = file_stat or os.stat(full_path)
+    etag = f"{file_stat.st_ino:x}-{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"
+    if time.time() - file_stat.st_mtime < RACY_WINDOW:
+        checksum = 0
+        with open(full_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                checksum = zlib.crc32(chunk, checksum)
+        etag += f"-{checksum:08x}"
+    return etag
+
+def _path_lock(full_path):
+    return _path_locks[hash(full_path) % len(_path_locks)]
+
+def _write_atomic(full_path, content):
+    """
+    Replace a file's content atomically
+    The text goes to a temp file in the same directory, is fsynced and is
+    renamed over the target, so readers see the old or the new content and
+    never a truncated mix. An existing file's permissions are kept. With
+    the blob store on, the temp file is a link to the content's blob.
+    """
+    directory = os.path.dirname(full_path)
+    try:
+        mode = stat.S_IMODE(os.stat(full_path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    data = content.encode('utf-8')
+    store = get_blob_store()
+    blob = None
+    if store and len(data) >= store.min_bytes:
+        temp_path, blob = store.stage(directory, data, mode)
+    else:
+        temp_path = _write_temp(directory, data, mode)
+    try:
+        os.replace(temp_path, full_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    if store:
+        store.record(full_path, blob, len(data))
+
+def _write_temp(directory, data, mode):
+    """Write data to a new fsynced temp file in directory"""
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def deduplicate_tree(full_path):
+    """Link the files at or below a path to their blobs, if the blob store is on"""
+    store = get_blob_store()
+    return store.adopt_tree(full_path) if store else None
+
+def get_dedup_stats(user_id):
+    """How much of a user's storage is shared with other files through the blob store, or None if it is off"""
+    store = get_blob_store()
+    return store.stats(user_id) if store else None
+
+def _forget_blobs(full_path):
+    store = get_blob_store()
+    if store:
+        store.forget(full_path)
+
+def _forget_cold(full_path):
+    tier = _get_cold_tier()
+    if tier:
+        tier.forget(full_path)
+
+def _write_file(full_path, content, user_id):
+    """Write a save atomically and update the indexes and quota counters"""
+    before = usage_before_change(user_id, full_path)
+    with _path_lock(full_path):
+        _write_atomic(full_path, content)
+    charge_usage(user_id, full_path, before)
+    note_change(user_id, full_path)
+
+def _get_write_coalescer():
+    """The write coalescer, or None if saves are written straight away"""
+    if not current_app.config.get('FILE_WRITE_COALESCE_ENABLED', False):
+        return None
+    return get_write_coalescer(_write_file)
+
+def flush_pending_writes(full_path):
+    """Write out held saves at or below a validated path before it is read"""
+    coalescer = peek_write_coalescer()
+    if coalescer:
+        coalescer.flush(full_path)
+
+def _discard_pending(full_path):
+    """Drop held saves at or below a path that is about to be replaced or deleted"""
+    coalescer = peek_write_coalescer()
+    if coalescer:
+        coalescer.discard(full_path)
+
+def _get_cold_tier():
+    """The cold tier, or None if cold files are not compressed"""
+    return get_cold_tier(lock_for=_path_lock, on_change=_note_tiered)
+
+def start_cold_tier():
+    """Create the cold tier, which starts its background passes, if it is enabled"""
+    return _get_cold_tier()
+
+def _note_tiered(full_path, bytes_delta):
+    """Account for the cold tier compressing or thawing a file"""
+    storage_path = os.path.abspath(current_app.config.get('STORAGE_PATH', 'storage'))
+    user_id = os.path.relpath(full_path, storage_path).split(os.sep)[0]
+    tracker = get_quota_tracker()
+    if tracker:
+        tracker.adjust(user_id, relative_storage_path(user_id, full_path), bytes_delta, 0)
+    note_change(user_id, full_path)
+
+def materialize(full_path):
+    """Make the content at or below a path readable straight from disk, for code that reads it directly"""
+    flush_pending_writes(full_path)
+    tier = _get_cold_tier()
+    if tier:
+        tier.thaw_tree(full_path)
+
+def _with_logical_sizes(user_id, full_path, entries, children_only=True):
+    """Report cold files among listing entries (and their children) with their uncompressed size"""
+    tier = _get_cold_tier()
+    cold = tier.cold_entries(full_path, children_only=children_only) if tier else None
+    if not cold:
+        return entries
+    return [_logical_entry(user_id, entry, cold) for entry in entries]
+
+def _logical_entry(user_id, entry, cold):
+    if entry.get("children"):
+        entry = dict(entry, children=[_logical_entry(user_id, child, cold) for child in entry["children"]])
+    row = cold.get(os.path.join(str(user_id), entry["path"]))
+    # A file rewritten since it was compressed no longer matches its mtime and size
+    if row and entry["type"] == "file" and (entry["mtime"], entry["size"]) == tuple(row[:2]):
+        entry = dict(entry, size=row[2], compressed_size=row[1])
+    return entry
+
+def get_listing_etag(user_id, path=""):
+    """Strong validator for a directory listing, or None if the directory does not exist"""
+    try:
+        user_path = ensure_user_path_exists(user_id)
+        target_path = validate_path(user_id, path) if path else user_path
+        flush_pending_writes(target_path)
+
+        index = get_workspace_index(user_id)
+        if index:
+            return index.directory_etag(relative_storage_path(user_id, target_path))
+        entries = _scan_directory(target_path, path)
+        return listing_etag(entries) if entries is not None else None
+    except Exception as e:
+        logger.error(f"Error computing listing etag: {str(e)}")
+        raise
+
 def list_files(user_id, path=""):
     """List files in a directory"""
     try:
         user_path = ensure_user_path_exists(user_id)
-        target_path = os.path.join(user_path, path) if path else user_path
-        
-        if not os.path.exists(target_path):
+        target_path = validate_path(user_id, path) if path else user_path
+        flush_pending_writes(target_path)
+
+        index = get_workspace_index(user_id)
+        if index:
+            entries = index.list_directory(relative_storage_path(user_id, target_path))
+        else:
+            entries = _scan_directory(target_path, path)
+
+        if entries is None:
             return {"files": [], "directories": []}
+        entries = _with_logical_sizes(user_id, target_path, entries)
 
-        files = []
-        directories = []
-
-        for item in os.listdir(target_path):
-            item_path = os.path.join(path, item) if path else item
-            full_path = os.path.join(target_path, item)
-            
-            if os.path.isfile(full_path):
-                files.append({
-                    "name": item,
-                    "path": item_path,
-                    "type": "file"
-                })
-            elif os.path.isdir(full_path):
-                directories.append({
-                    "name": item,
-                    "path": item_path,
-                    "type": "directory"
-                })
+        files = [entry for entry in entries if entry["type"] != "directory"]
+        directories = [entry for entry in entries if entry["type"] == "directory"]
 
         return {
             "files": sorted(files, key=lambda x: x["name"]),
@@ -66,6 +371,162 @@ def list_files(user_id, path=""):
         logger.error(f"Error listing files: {str(e)}")
         raise
 
+def _scan_directory(target_path, path):
+    """Read one directory level without the index, or None if it does not exist"""
+    if not os.path.isdir(target_path):
+        return None
+    entries = []
+    with os.scandir(target_path) as it:
+        for entry in it:
+            node = _tree_node(entry, path)
+            if node:
+                entries.append(node)
+    return entries
+
+def get_file_info(user_id, path):
+    """Get size, mtime, type and language for a file or directory"""
+    try:
+        full_path = validate_path(user_id, path)
+        flush_pending_writes(full_path)
+
+        index = get_workspace_index(user_id)
+        if index:
+            info = index.lookup(relative_storage_path(user_id, full_path))
+        else:
+            parent, name = os.path.split(relative_storage_path(user_id, full_path))
+            try:
+                info = describe_entry(name, parent, os.lstat(full_path)) if name else None
+            except FileNotFoundError:
+                info = None
+
+        if info is None:
+            raise FileNotFoundError(f"File not found: {path}")
+        return _with_logical_sizes(user_id, full_path, [info], children_only=False)[0]
+    except Exception as e:
+        logger.error(f"Error getting file info: {str(e)}")
+        raise
+
+def search_files(user_id, query, regex=False, case_sensitive=False, glob=None, limit=None,
+                 context=0):
+    """
+    Search the contents of a user's files
+    Literal or regex queries, optionally restricted to paths matching a
+    glob, with up to context lines around each match
+    """
+    try:
+        config = current_app.config
+        if not query:
+            raise ValueError("Search query is required")
+        if len(query) > config.get('SEARCH_MAX_QUERY_LENGTH', 1000):
+            raise ValueError("Search query is too long")
+        if regex and len(query) > config.get('SEARCH_MAX_PATTERN_LENGTH', 200):
+            raise ValueError("Regular expression is too long")
+        max_results = config.get('SEARCH_MAX_RESULTS', 500)
+        limit = max(1, min(int(limit or 100), max_results))
+        context = max(0, min(int(context or 0), config.get('SEARCH_MAX_CONTEXT', 5)))
+
+        user_path = ensure_user_path_exists(user_id)
+        flush_pending_writes(user_path)
+        index = get_search_indexes().get(user_id, user_path)
+        index.reconcile_if_due()
+
+        result = index.search(query, regex=regex, case_sensitive=case_sensitive, glob=glob,
+                              limit=limit, context=context,
+                              time_budget=config.get('SEARCH_TIME_BUDGET', 2.0),
+                              max_line_length=config.get('SEARCH_MAX_LINE_LENGTH', 4096),
+                              scanner=get_regex_scanner() if regex else None)
+        result["query"] = query
+        return result
+    except Exception as e:
+        logger.error(f"Error searching files: {str(e)}")
+        raise
+
+def list_tree(user_id, path="", max_depth=None, ignore=None, offset=0, limit=None):
+    """
+    List a directory tree in one pass using os.scandir
+    Directories come first, then files, each sorted by name, and every entry
+    carries its size and mtime from a single stat call. Subdirectories are
+    expanded up to max_depth levels. Names matching an ignore pattern are skipped.
+    offset and limit page through the requested directory; deeper
+    directories show their first limit children and set has_more if more exist.
+    """
+    try:
+        config = current_app.config
+        depth_cap = config.get('FILE_TREE_MAX_DEPTH', 8)
+        max_depth = max(1, min(int(max_depth or depth_cap), depth_cap))
+        page_size = config.get('FILE_TREE_PAGE_SIZE', 500)
+        limit = max(1, min(int(limit or page_size), page_size))
+        offset = max(0, int(offset or 0))
+        if ignore is None:
+            ignore = config.get('FILE_TREE_IGNORE', ['.git', 'node_modules', '__pycache__'])
+        ignore = [pattern for pattern in ignore if pattern]
+
+        user_path = ensure_user_path_exists(user_id)
+        full_path = validate_path(user_id, path) if path else user_path
+        flush_pending_writes(full_path)
+
+        if not os.path.isdir(full_path):
+            raise FileNotFoundError(f"Directory not found: {path}")
+
+        state = {"remaining": config.get('FILE_TREE_MAX_ENTRIES', 10000), "truncated": False}
+        entries, total = _scan_tree(full_path, path, 1, max_depth, ignore, offset, limit, state)
+        entries = _with_logical_sizes(user_id, full_path, entries, children_only=max_depth == 1)
+
+        return {
+            "path": path,
+            "entries": entries,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "has_more": offset + len(entries) < total,
+            "truncated": state["truncated"]
+        }
+    except Exception as e:
+        logger.error(f"Error listing tree: {str(e)}")
+        raise
+
+def _scan_tree(full_path, path, depth, max_depth, ignore, offset, limit, state):
+    """Scan one directory for list_tree, recursing into subdirectories"""
+    with os.scandir(full_path) as it:
+        items = [entry for entry in it
+                 if not any(fnmatch(entry.name, pattern) for pattern in ignore)]
+
+    # is_dir() answers from the directory listing itself, so sorting costs no stat calls
+    items.sort(key=lambda entry: (not entry.is_dir(follow_symlinks=False), entry.name))
+
+    nodes = []
+    for entry in items[offset:offset + limit]:
+        if state["remaining"] <= 0:
+            state["truncated"] = True
+            break
+
+        node = _tree_node(entry, path)
+        if node is None:
+            continue
+        state["remaining"] -= 1
+
+        if node["type"] == "directory":
+            node["children"] = None
+            if depth < max_depth:
+                try:
+                    children, total = _scan_tree(entry.path, node["path"], depth + 1, max_depth,
+                                                 ignore, 0, limit, state)
+                    node["children"] = children
+                    node["total"] = total
+                    node["has_more"] = len(children) < total
+                except PermissionError:
+                    pass
+        nodes.append(node)
+
+    return nodes, len(items)
+
+def _tree_node(entry, path):
+    """Describe a DirEntry, or None if it vanished since the directory was read"""
+    try:
+        return describe_entry(entry.name, path, entry.stat(follow_symlinks=False))
+    except FileNotFoundError:
+        return None
+
 def create_file(user_id, directory, name, content=""):
     """Create a new file"""
     try:
@@ -75,50 +536,263 @@ def create_file(user_id, directory, name, content=""):
         relative_path = os.path.join(directory, name) if directory else name
         full_path = validate_path(user_id, relative_path)
         
+        _check_write_quota(user_id, full_path, content)
+
         # Create parent directories if they don't exist
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        created = _missing_ancestor(os.path.dirname(full_path))
+        if created:
+            check_quota(user_id, created, 0, 1)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            charge_usage(user_id, created, (0, 0))
         
-        # Write the file
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # Write the file, replacing any held save of an earlier file at this path
+        _discard_pending(full_path)
+        _write_file(full_path, content, user_id)
         
-        return {"message": "File created successfully", "path": relative_path}
+        return {"message": "File created successfully", "path": relative_path,
+                "etag": file_etag(full_path)}
     except Exception as e:
         logger.error(f"Error creating file: {str(e)}")
         raise
 
-def read_file(user_id, path):
-    """Read file content"""
+def get_file_source(user_id, path):
+    """
+    Resolve a file for raw streaming
+    Returns its absolute path, size, MIME type and whether it is binary,
+    judged by extension and then by a NUL byte near the start
+    """
     try:
         full_path = validate_path(user_id, path)
-        
-        if not os.path.exists(full_path):
+        materialize(full_path)
+
+        if not os.path.isfile(full_path):
             raise FileNotFoundError(f"File not found: {path}")
-        
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        return {"content": content, "path": path}
+
+        file_type = get_file_type(full_path)
+        binary = file_type['binary']
+        if not binary:
+            with open(full_path, 'rb') as f:
+                binary = b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+        file_stat = os.stat(full_path)
+        return {
+            "full_path": os.path.abspath(full_path),
+            "path": path,
+            "size": file_stat.st_size,
+            "etag": file_etag(full_path, file_stat),
+            "mime": file_type['mime'] if binary else 'text/plain; charset=utf-8',
+            "binary": binary
+        }
+    except Exception as e:
+        logger.error(f"Error resolving file: {str(e)}")
+        raise
+
+def read_file(user_id, path, offset=None, length=None, start_line=None, end_line=None):
+    """
+    Read file content as text
+    offset/length select a byte range and start_line/end_line (1-based,
+    inclusive) a line range; only that part of the file is read, up to
+    FILE_READ_MAX_BYTES, and has_more tells whether the file goes on.
+    Without a range the whole file is returned if it fits.
+    """
+    try:
+        config = current_app.config
+        max_bytes = config.get('FILE_READ_MAX_BYTES', 2 * 1024 * 1024)
+        full_path = validate_path(user_id, path)
+        materialize(full_path)
+
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f"File not found: {path}")
+
+        with open(full_path, 'rb') as f:
+            file_stat = os.fstat(f.fileno())
+            size = file_stat.st_size
+            result = {"path": path, "size": size, "etag": file_etag(full_path, file_stat)}
+
+            if start_line is not None or end_line is not None:
+                start_line = max(1, int(start_line or 1))
+                max_lines = config.get('FILE_READ_MAX_LINES', 10000)
+                end_line = int(end_line) if end_line is not None else start_line + max_lines - 1
+                if end_line < start_line:
+                    raise ValueError("end_line must not be before start_line")
+                end_line = min(end_line, start_line + max_lines - 1)
+                start, end, last_line = _line_span(f, size, start_line, end_line)
+                if end - start > max_bytes:
+                    raise ValueError("Line range is too large to read at once; request fewer lines")
+                result["start_line"] = start_line
+                result["end_line"] = last_line
+            else:
+                start = max(0, int(offset or 0))
+                if length is None and start == 0 and size > max_bytes:
+                    raise ValueError("File is too large to read at once; request a range")
+                end = start + max(0, int(length)) if length is not None else size
+
+            end = min(end, size, start + max_bytes)
+            f.seek(start)
+            data = f.read(max(0, end - start))
+
+        content, consumed = _decode_text(data, at_eof=start + len(data) >= size)
+        result.update({
+            "content": content,
+            "offset": start,
+            "length": consumed,
+            "has_more": start + consumed < size
+        })
+        return result
     except Exception as e:
         logger.error(f"Error reading file: {str(e)}")
         raise
 
-def update_file(user_id, path, content):
-    """Update file content"""
+def _line_span(f, size, start_line, end_line):
+    """
+    Byte offsets of a 1-based inclusive line range, and the last line it reaches
+    Newlines are found through an mmap, so lines before the range are
+    skipped without being read into Python.
+    """
+    if size == 0:
+        return 0, 0, start_line - 1
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        for _ in range(start_line - 1):
+            newline = mm.find(b"\n", start)
+            if newline == -1:
+                return size, size, start_line - 1
+            start = newline + 1
+
+        end = start
+        line = start_line - 1
+        while line < end_line and end < size:
+            newline = mm.find(b"\n", end)
+            end = size if newline == -1 else newline + 1
+            line += 1
+        return start, end, line
+
+def _decode_text(data, at_eof):
+    """Decode UTF-8, holding back a character split by the end of the range"""
+    if not at_eof:
+        # Back up over at most one incomplete multi-byte sequence
+        for back in range(1, min(4, len(data)) + 1):
+            byte = data[-back]
+            if byte & 0xC0 != 0x80:
+                width = 2 if byte >= 0xC0 else 1
+                width = 3 if byte >= 0xE0 else width
+                width = 4 if byte >= 0xF0 else width
+                if width > back:
+                    data = data[:-back]
+                break
+    return data.decode('utf-8', errors='replace'), len(data)
+
+def update_file(user_id, path, content, if_match=None):
+    """
+    Update file content
+    if_match is a list of ETags the client last saw ("*" for any); the
+    write is refused with PreconditionFailedError if the file has changed.
+    With write coalescing on, unconditional saves are held briefly and
+    merged with later saves of the same file; they return no ETag.
+    """
     try:
         full_path = validate_path(user_id, path)
         
         if not os.path.exists(full_path):
             raise FileNotFoundError(f"File not found: {path}")
+
+        _check_write_quota(user_id, full_path, content)
+        coalescer = _get_write_coalescer()
+        if coalescer and if_match is None:
+            coalescer.submit(full_path, content, user_id)
+            return {"message": "File update accepted", "path": path, "etag": None, "buffered": True}
+
+        flush_pending_writes(full_path)
+        before = usage_before_change(user_id, full_path)
+        with _path_lock(full_path):
+            if if_match is not None and "*" not in if_match and file_etag(full_path) not in if_match:
+                raise PreconditionFailedError(f"File has changed since it was read: {path}")
+            _write_atomic(full_path, content)
+        charge_usage(user_id, full_path, before)
+        note_change(user_id, full_path)
         
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        return {"message": "File updated successfully", "path": path}
+        return {"message": "File updated successfully", "path": path, "etag": file_etag(full_path)}
     except Exception as e:
         logger.error(f"Error updating file: {str(e)}")
         raise
 
+def patch_file(user_id, path, base_etag, edits=None, diff=None):
+    """
+    Apply edits or a unified diff to a file
+    The changes must be made against the version identified by base_etag;
+    if the file has changed since, PreconditionFailedError is raised and
+    nothing is written. The result is written atomically.
+    """
+    try:
+        if (edits is None) == (diff is None):
+            raise ValueError("Provide either edits or a diff")
+        if edits is not None and not isinstance(edits, list):
+            raise ValueError("edits must be a list")
+        if diff is not None and not isinstance(diff, str):
+            raise ValueError("diff must be a string")
+        if not base_etag:
+            raise ValueError("A base ETag is required")
+
+        full_path = validate_path(user_id, path)
+        materialize(full_path)
+
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f"File not found: {path}")
+
+        with _path_lock(full_path):
+            with open(full_path, 'rb') as f:
+                if file_etag(full_path, os.fstat(f.fileno())) != base_etag:
+                    with _save_stats_lock:
+                        _save_stats["patch_conflicts"] += 1
+                    raise PreconditionFailedError(f"File has changed since it was read: {path}")
+                text = f.read().decode('utf-8')
+
+            if edits is not None:
+                content = apply_edits(text, edits)
+            else:
+                content = apply_unified_diff(text, diff)
+            _check_write_quota(user_id, full_path, content)
+            before = usage_before_change(user_id, full_path)
+            _write_atomic(full_path, content)
+        charge_usage(user_id, full_path, before)
+        note_change(user_id, full_path)
+
+        received = len(diff.encode('utf-8')) if diff is not None else len(json.dumps(edits).encode('utf-8'))
+        size = len(content.encode('utf-8'))
+        with _save_stats_lock:
+            _save_stats["patches"] += 1
+            _save_stats["patch_bytes_received"] += received
+            _save_stats["patched_file_bytes"] += size
+
+        return {"message": "File patched successfully", "path": path, "size": size,
+                "etag": file_etag(full_path)}
+    except Exception as e:
+        logger.error(f"Error patching file: {str(e)}")
+        raise
+
+def get_storage_stats():
+    """Get counters for the storage subsystem"""
+    with _save_stats_lock:
+        saves = dict(_save_stats)
+    # A full save would have sent the whole patched file instead of the patch
+    saves["patch_bytes_saved"] = saves["patched_file_bytes"] - saves["patch_bytes_received"]
+    workspace_indexes = peek_workspace_indexes()
+    coalescer = peek_write_coalescer()
+    quota_tracker = peek_quota_tracker()
+    blob_store = peek_blob_store()
+    cold_tier = peek_cold_tier()
+    file_watcher = peek_file_watcher()
+    return {
+        "saves": saves,
+        "write_coalescing": coalescer.stats() if coalescer else None,
+        "workspace_index": workspace_indexes.stats() if workspace_indexes else None,
+        "quota": quota_tracker.stats() if quota_tracker else None,
+        "blob_store": blob_store.stats() if blob_store else None,
+        "cold_tier": cold_tier.stats() if cold_tier else None,
+        "file_watcher": file_watcher.stats() if file_watcher else None
+    }
+
 def delete_file(user_id, path):
     """Delete a file"""
     try:
@@ -127,7 +801,13 @@ def delete_file(user_id, path):
         if not os.path.exists(full_path):
             raise FileNotFoundError(f"File not found: {path}")
         
+        _discard_pending(full_path)
+        before = usage_before_change(user_id, full_path)
         os.remove(full_path)
+        _forget_blobs(full_path)
+        _forget_cold(full_path)
+        charge_usage(user_id, full_path, before)
+        note_change(user_id, full_path)
         return {"message": "File deleted successfully", "path": path}
     except Exception as e:
         logger.error(f"Error deleting file: {str(e)}")
@@ -140,7 +820,12 @@ def create_directory(user_id, parent_path, name):
         relative_path = os.path.join(parent_path, name) if parent_path else name
         full_path = validate_path(user_id, relative_path)
         
-        os.makedirs(full_path, exist_ok=True)
+        created = _missing_ancestor(full_path)
+        if created:
+            check_quota(user_id, created, 0, 1)
+            os.makedirs(full_path, exist_ok=True)
+            charge_usage(user_id, created, (0, 0))
+        note_change(user_id, full_path)
         return {"message": "Directory created successfully", "path": relative_path}
     except Exception as e:
         logger.error(f"Error creating directory: {str(e)}")
@@ -154,8 +839,272 @@ def delete_directory(user_id, path):
         if not os.path.exists(full_path):
             raise FileNotFoundError(f"Directory not found: {path}")
         
+        _discard_pending(full_path)
+        before = usage_before_change(user_id, full_path)
         shutil.rmtree(full_path)
+        _forget_blobs(full_path)
+        _forget_cold(full_path)
+        charge_usage(user_id, full_path, before)
+        note_change(user_id, full_path)
         return {"message": "Directory deleted successfully", "path": path}
     except Exception as e:
         logger.error(f"Error deleting directory: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+BULK_OPERATIONS = ("create", "update", "delete", "mkdir", "move", "copy")
+
+def bulk_operations(user_id, operations, atomic=False):
+    """
+    Run an ordered list of file operations in one call
+    Each operation is {"op", "path"} plus "content" for create/update and
+    "to" for move/copy. Every path is validated up front against one
+    storage root. With atomic set, an invalid path fails the whole batch
+    and the first failing operation undoes all the ones before it;
+    otherwise each operation succeeds or fails on its own.
+    """
+    try:
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("operations must be a non-empty list")
+        max_operations = current_app.config.get('BULK_MAX_OPERATIONS', 1000)
+        if len(operations) > max_operations:
+            raise ValueError(f"At most {max_operations} operations are allowed per request")
+
+        resolve = _path_resolver(user_id)
+        plans = []
+        for number, operation in enumerate(operations):
+            try:
+                plans.append(_plan_operation(operation, resolve))
+            except ValueError as e:
+                if atomic:
+                    raise ValueError(f"Operation {number}: {str(e)}")
+                plans.append(e)
+
+        # Replaced and deleted files are parked here until the batch is over
+        batch = {
+            "trash": os.path.join(os.path.dirname(resolve("")), ".bulk", uuid.uuid4().hex),
+            "stashed": 0,
+            "undo": [],
+            "touched": [],
+            "removed": [],
+            "usage": []
+        }
+        results = []
+        failed = False
+        try:
+            for number, (operation, plan) in enumerate(zip(operations, plans)):
+                result = {
+                    "index": number,
+                    "op": operation.get("op") if isinstance(operation, dict) else None,
+                    "path": operation.get("path") if isinstance(operation, dict) else None
+                }
+                if failed:
+                    result["status"] = "skipped"
+                elif isinstance(plan, Exception):
+                    result.update(status="error", error=str(plan))
+                else:
+                    try:
+                        result.update(_apply_charged(plan, batch, user_id))
+                        result["status"] = "ok"
+                    except Exception as e:
+                        result.update(status="error", error=str(e))
+                        failed = atomic
+                results.append(result)
+
+            if failed:
+                _undo_batch(batch)
+                tracker = get_quota_tracker()
+                for scope, bytes_delta, inodes_delta in batch["usage"]:
+                    tracker.adjust(user_id, relative_storage_path(user_id, scope), -bytes_delta, -inodes_delta)
+                for result in results:
+                    if result["status"] == "ok":
+                        result["status"] = "rolled_back"
+                        result.pop("etag", None)
+            else:
+                # Only once nothing can be rolled back, as undo restores the old paths
+                for full_path in batch["removed"]:
+                    _forget_blobs(full_path)
+                    _forget_cold(full_path)
+        finally:
+            shutil.rmtree(batch["trash"], ignore_errors=True)
+            for full_path in batch["touched"]:
+                note_change(user_id, full_path)
+
+        return {
+            "results": results,
+            "succeeded": sum(1 for result in results if result["status"] == "ok"),
+            "failed": sum(1 for result in results if result["status"] == "error"),
+            "atomic": atomic,
+            "rolled_back": failed
+        }
+    except Exception as e:
+        logger.error(f"Error running bulk operations: {str(e)}")
+        raise
+
+def _path_resolver(user_id):
+    """Validate many paths against one user's storage root, looking it up only once"""
+    root = os.path.normpath(ensure_user_path_exists(user_id))
+
+    def resolve(path):
+        if not isinstance(path, str):
+            raise ValueError("Paths must be strings")
+        full_path = os.path.normpath(os.path.join(root, path))
+        if full_path != root and not full_path.startswith(root + os.sep):
+            raise ValueError("Invalid path: Access denied")
+        return full_path
+
+    return resolve
+
+def _plan_operation(operation, resolve):
+    """Check one bulk operation's shape and resolve its paths"""
+    if not isinstance(operation, dict):
+        raise ValueError("Each operation must be an object")
+    op = operation.get("op")
+    if op not in BULK_OPERATIONS:
+        raise ValueError(f"Unknown operation: {op}")
+    if not operation.get("path"):
+        raise ValueError("path is required")
+
+    plan = {"op": op, "path": operation["path"], "full_path": resolve(operation["path"])}
+    if plan["full_path"] == resolve(""):
+        raise ValueError("The storage root cannot be modified")
+    if op in ("create", "update"):
+        content = operation.get("content", "" if op == "create" else None)
+        if not isinstance(content, str):
+            raise ValueError("content must be a string")
+        plan["content"] = content
+    if op in ("move", "copy"):
+        if not operation.get("to"):
+            raise ValueError("to is required")
+        plan["to"] = operation["to"]
+        plan["target"] = resolve(operation["to"])
+        if plan["target"] == resolve(""):
+            raise ValueError("The storage root cannot be modified")
+        if plan["target"].startswith(plan["full_path"] + os.sep):
+            raise ValueError(f"Cannot {op} a directory into itself")
+    return plan
+
+def _apply_charged(plan, batch, user_id):
+    """Apply a bulk operation within the quota, charging the usage it adds or frees as it goes"""
+    full_path = plan["full_path"]
+    op = plan["op"]
+    if op in ("create", "update") and not os.path.isdir(full_path):
+        _check_write_quota(user_id, full_path, plan["content"])
+    if op in ("create", "mkdir"):
+        created = _missing_ancestor(full_path if op == "mkdir" else os.path.dirname(full_path))
+        if created:
+            check_quota(user_id, created, 0, 1)
+    if op == "copy" and os.path.lexists(full_path):
+        check_quota(user_id, plan["target"], *measure_usage(full_path))
+    if op == "move" and os.path.lexists(full_path):
+        # A move leaves the user's total alone but can grow the project it lands in
+        source_project = project_of(relative_storage_path(user_id, full_path))
+        if project_of(relative_storage_path(user_id, plan["target"])) != source_project:
+            check_quota(user_id, plan["target"], *measure_usage(full_path), user_scope=False)
+
+    scopes = [_missing_ancestor(full_path) or full_path]
+    if "target" in plan:
+        scopes.append(_missing_ancestor(plan["target"]) or plan["target"])
+    befores = [(scope, usage_before_change(user_id, scope)) for scope in scopes]
+
+    result = _apply_operation(plan, batch)
+
+    tracker = get_quota_tracker()
+    for scope, before in befores:
+        if before is not None:
+            after = measure_usage(scope)
+            batch["usage"].append((scope, after[0] - before[0], after[1] - before[1]))
+            tracker.adjust(user_id, relative_storage_path(user_id, scope),
+                           after[0] - before[0], after[1] - before[1])
+    return result
+
+def _apply_operation(plan, batch):
+    """Apply one planned bulk operation, recording how to undo it"""
+    op = plan["op"]
+    full_path = plan["full_path"]
+    undo = batch["undo"]
+
+    if op in ("create", "update"):
+        if os.path.isdir(full_path):
+            raise ValueError(f"Is a directory: {plan['path']}")
+        exists = os.path.exists(full_path)
+        if op == "update" and not exists:
+            raise FileNotFoundError(f"File not found: {plan['path']}")
+        _discard_pending(full_path)
+        if not exists:
+            _make_parents(os.path.dirname(full_path), batch)
+        with _path_lock(full_path):
+            if exists:
+                # A hard link keeps the old content for undo while the new one is renamed in
+                stash = _stash_path(batch)
+                os.link(full_path, stash)
+                undo.append(lambda: os.replace(stash, full_path))
+            else:
+                undo.append(lambda: os.remove(full_path))
+            _write_atomic(full_path, plan["content"])
+        batch["touched"].append(full_path)
+        return {"etag": file_etag(full_path)}
+
+    if op == "delete":
+        if not os.path.lexists(full_path):
+            raise FileNotFoundError(f"Not found: {plan['path']}")
+        _discard_pending(full_path)
+        stash = _stash_path(batch)
+        os.rename(full_path, stash)
+        undo.append(lambda: os.rename(stash, full_path))
+        batch["touched"].append(full_path)
+        batch["removed"].append(full_path)
+        return {}
+
+    if op == "mkdir":
+        if os.path.exists(full_path) and not os.path.isdir(full_path):
+            raise ValueError(f"A file already exists at {plan['path']}")
+        _make_parents(full_path, batch)
+        return {}
+
+    # move and copy
+    target = plan["target"]
+    if not os.path.lexists(full_path):
+        raise FileNotFoundError(f"Not found: {plan['path']}")
+    if os.path.lexists(target):
+        raise ValueError(f"Destination already exists: {plan['to']}")
+    materialize(full_path)
+    _make_parents(os.path.dirname(target), batch)
+    if op == "move":
+        os.rename(full_path, target)
+        undo.append(lambda: os.rename(target, full_path))
+        batch["touched"].append(full_path)
+        batch["removed"].append(full_path)
+    elif os.path.isdir(full_path) and not os.path.islink(full_path):
+        shutil.copytree(full_path, target, symlinks=True)
+        undo.append(lambda: shutil.rmtree(target))
+        deduplicate_tree(target)
+    else:
+        shutil.copy2(full_path, target, follow_symlinks=False)
+        undo.append(lambda: os.remove(target))
+        deduplicate_tree(target)
+    batch["touched"].append(target)
+    return {"to": plan["to"]}
+
+def _make_parents(directory, batch):
+    """Create a directory and its missing parents, recording each one for undo"""
+    missing = []
+    while not os.path.isdir(directory):
+        missing.append(directory)
+        directory = os.path.dirname(directory)
+    for created in reversed(missing):
+        os.mkdir(created)
+        batch["undo"].append(lambda created=created: os.rmdir(created))
+        batch["touched"].append(created)
+
+def _stash_path(batch):
+    os.makedirs(batch["trash"], exist_ok=True)
+    batch["stashed"] += 1
+    return os.path.join(batch["trash"], str(batch["stashed"]))
+
+def _undo_batch(batch):
+    """Reverse a failed atomic batch, newest change first"""
+    for undo in reversed(batch["undo"]):
+        try:
+            undo()
+        except Exception as e:
+            logger.error(f"Error rolling back bulk operation: {str(e)}")
@@ -0,0 +1,263 @@
+# server/app/services/workspace_index.py
+import hashlib
+import logging
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.utils.file_helpers import get_file_type
+
+logger = logging.getLogger(__name__)
+
+# Directories modified this recently are rescanned on every use, since a
+# second change within the filesystem's timestamp granularity would not
+# move their mtime again
+RACY_WINDOW = 1.0
+
+
+class WorkspaceIndex:
+    """
+    In-memory metadata for one user's storage root
+    Directory listings are scanned on first use and remembered with the
+    directory's own mtime, so using one again costs a single stat and only
+    directories that changed are rescanned. Storage service writes and
+    deletes update entries in place through note_change(). File sizes and
+    mtimes come from the last scan or note_change(), so in-place edits made
+    behind the storage service's back show up once their directory changes.
+    """
+
+    def __init__(self, root, max_directories=5000):
+        self.root = root
+        self.max_directories = max_directories
+        self._lock = threading.RLock()
+        self._dirs = OrderedDict()  # relative directory path ("" for the root) -> listing
+
+        self.hits = 0
+        self.scans = 0
+        self.evicted = 0
+
+    def list_directory(self, path=""):
+        """Entries of a directory, or None if it does not exist"""
+        with self._lock:
+            listing = self._listing(path)
+            if listing is None:
+                return None
+            return [dict(entry) for entry in listing["entries"].values()]
+
+    def lookup(self, path):
+        """Metadata for one file or directory, or None if it does not exist"""
+        parent, name = os.path.split(path)
+        if not name:
+            return None
+        with self._lock:
+            listing = self._listing(parent)
+            entry = listing["entries"].get(name) if listing else None
+            return dict(entry) if entry else None
+
+    def directory_etag(self, path=""):
+        """
+        Strong validator for a directory's listing, or None if it does not exist
+        Computed once per listing and kept until the listing changes.
+        """
+        with self._lock:
+            listing = self._listing(path)
+            if listing is None:
+                return None
+            if listing["etag"] is None:
+                listing["etag"] = listing_etag(listing["entries"].values())
+            return listing["etag"]
+
+    def note_change(self, path):
+        """
+        Refresh one path after the storage service created, wrote or deleted it
+        The parent listing is patched rather than rescanned; a deleted
+        directory drops every cached listing beneath it.
+        """
+        parent, name = os.path.split(path)
+        with self._lock:
+            try:
+                parent_stat = os.stat(self._full_path(parent))
+            except (FileNotFoundError, NotADirectoryError):
+                self._drop(parent)
+                return
+            try:
+                entry = describe_entry(name, parent, os.lstat(self._full_path(path)))
+            except FileNotFoundError:
+                entry = None
+
+            if entry is None or entry["type"] != "directory":
+                self._drop(path)
+
+            listing = self._dirs.get(parent)
+            if listing is None:
+                return
+            if entry is None:
+                listing["entries"].pop(name, None)
+            else:
+                listing["entries"][name] = entry
+            listing["mtime_ns"] = parent_stat.st_mtime_ns
+            listing["racy"] = _is_racy(parent_stat)
+            listing["etag"] = None
+
+    def invalidate(self, path=""):
+        """Forget cached listings at and below path"""
+        with self._lock:
+            self._drop(path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directories": len(self._dirs),
+                "entries": sum(len(listing["entries"]) for listing in self._dirs.values()),
+                "hits": self.hits,
+                "scans": self.scans,
+                "evicted": self.evicted
+            }
+
+    def _listing(self, path):
+        """Get a directory's listing, rescanning it if its mtime moved (lock held)"""
+        full_path = self._full_path(path)
+        try:
+            dir_stat = os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            self._drop(path)
+            return None
+        if not stat.S_ISDIR(dir_stat.st_mode):
+            return None
+
+        listing = self._dirs.get(path)
+        if listing and listing["mtime_ns"] == dir_stat.st_mtime_ns and not listing["racy"]:
+            self.hits += 1
+            self._dirs.move_to_end(path)
+            return listing
+
+        self.scans += 1
+        with os.scandir(full_path) as it:
+            entries = {dir_entry.name: _index_entry(dir_entry, path) for dir_entry in it}
+        entries = {name: entry for name, entry in entries.items() if entry is not None}
+        listing = {
+            "mtime_ns": dir_stat.st_mtime_ns,
+            "racy": _is_racy(dir_stat),
+            "entries": entries,
+            "etag": None
+        }
+        self._dirs[path] = listing
+        self._dirs.move_to_end(path)
+        while len(self._dirs) > self.max_directories:
+            self._dirs.popitem(last=False)
+            self.evicted += 1
+        return listing
+
+    def _drop(self, path):
+        """Remove cached listings for path and its subdirectories (lock held)"""
+        prefix = path + os.sep if path else ""
+        for cached in [cached for cached in self._dirs if cached == path or cached.startswith(prefix)]:
+            del self._dirs[cached]
+
+    def _full_path(self, path):
+        return os.path.join(self.root, path) if path else self.root
+
+
+def _index_entry(dir_entry, parent):
+    """Describe a DirEntry, or None if it vanished since the directory was read"""
+    try:
+        return describe_entry(dir_entry.name, parent, dir_entry.stat(follow_symlinks=False))
+    except FileNotFoundError:
+        return None
+
+
+def describe_entry(name, parent, entry_stat):
+    """Build a metadata entry from an lstat result; symlinks are described but never followed"""
+    if stat.S_ISLNK(entry_stat.st_mode):
+        entry_type = "symlink"
+    elif stat.S_ISDIR(entry_stat.st_mode):
+        entry_type = "directory"
+    else:
+        entry_type = "file"
+
+    return {
+        "name": name,
+        "path": os.path.join(parent, name) if parent else name,
+        "type": entry_type,
+        "size": entry_stat.st_size if entry_type == "file" else None,
+        "mtime": entry_stat.st_mtime,
+        "language": get_file_type(name)["language"] if entry_type == "file" else None
+    }
+
+
+def listing_etag(entries):
+    """Hash of the names, types, sizes and mtimes in a directory listing"""
+    digest = hashlib.sha1()
+    for entry in sorted(entries, key=lambda entry: entry["name"]):
+        digest.update(f'{entry["name"]}\0{entry["type"]}\0{entry["size"]}\0{entry["mtime"]}\n'.encode())
+    return digest.hexdigest()[:32]
+
+
+def _is_racy(dir_stat):
+    return time.time() - dir_stat.st_mtime < RACY_WINDOW
+
+
+class WorkspaceIndexRegistry:
+    """Keeps indexes for the most recently used workspaces, evicting the rest"""
+
+    def __init__(self, max_workspaces=64, max_directories=5000):
+        self.max_workspaces = max_workspaces
+        self.max_directories = max_directories
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self.evicted = 0
+
+    def get(self, user_id, root):
+        """Get the index for a user's storage root, creating it on first use"""
+        key = str(user_id)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or index.root != root:
+                index = WorkspaceIndex(root, max_directories=self.max_directories)
+                self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_workspaces:
+                self._indexes.popitem(last=False)
+                self.evicted += 1
+            return index
+
+    def peek(self, user_id):
+        """Get a user's index only if it is currently held"""
+        with self._lock:
+            return self._indexes.get(str(user_id))
+
+    def stats(self):
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return {
+            "workspaces": len(indexes),
+            "max_workspaces": self.max_workspaces,
+            "evicted": self.evicted,
+            "directories": sum(index.stats()["directories"] for index in indexes)
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_workspace_indexes():
+    """Get the process-wide workspace index registry, creating it from app config on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            config = current_app.config
+            _registry = WorkspaceIndexRegistry(
+                max_workspaces=config.get('WORKSPACE_INDEX_MAX_WORKSPACES', 64),
+                max_directories=config.get('WORKSPACE_INDEX_MAX_DIRECTORIES', 5000)
+            )
+    return _registry
+
+
+def peek_workspace_indexes():
+    """Return the registry if it has been created, without creating it"""
+    return _registry
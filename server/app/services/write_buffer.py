@@ -0,0 +1,185 @@
+# server/app/services/write_buffer.py
+import atexit
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class WriteCoalescer:
+    """
+    Merges rapid saves of the same file into one disk write
+    A save is held for delay seconds and a later save of the same path
+    replaces it and restarts the wait, bounded by max_delay from the first
+    held save so a user who never pauses still gets periodic writes.
+    flush() writes held saves out at once and must be called before
+    anything reads the files; discard() drops them before a delete.
+    """
+
+    def __init__(self, writer, delay=0.5, max_delay=2.0, app=None):
+        self.writer = writer  # writer(full_path, content, context)
+        self.delay = delay
+        self.max_delay = max(delay, max_delay)
+        self.app = app
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = {}  # full path -> {"content", "context", "first", "due"}
+        self._writing = set()
+        # Held saves are popped and written under their path's stripe, so
+        # two writers can never land versions of one file out of order
+        self._stripes = [threading.Lock() for _ in range(32)]
+        self._closed = False
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, full_path, content, context=None):
+        """Hold a save, replacing any save of the same path still waiting"""
+        now = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+            entry = self._pending.get(full_path)
+            if entry:
+                self.coalesced += 1
+                entry["content"] = content
+                entry["context"] = context
+                entry["due"] = min(now + self.delay, entry["first"] + self.max_delay)
+            else:
+                self._pending[full_path] = {
+                    "content": content,
+                    "context": context,
+                    "first": now,
+                    "due": now + self.delay
+                }
+            self._wakeup.notify()
+
+    def flush(self, full_path):
+        """Write out held saves for a path and everything under it, waiting for writes in progress"""
+        for path in self._matching(full_path):
+            self._write(path)
+
+    def flush_all(self):
+        with self._lock:
+            paths = list(self._pending)
+        for path in paths:
+            self._write(path)
+
+    def discard(self, full_path):
+        """Drop held saves for a path and everything under it"""
+        for path in self._matching(full_path):
+            with self._stripe(path):
+                with self._lock:
+                    self._pending.pop(path, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "written": self.written,
+                "failed": self.failed,
+                "delay": self.delay,
+                "max_delay": self.max_delay
+            }
+
+    def shutdown(self):
+        """Write every held save and stop the background thread"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout=5)
+        self.flush_all()
+
+    def _matching(self, full_path):
+        prefix = full_path.rstrip(os.sep) + os.sep
+        with self._lock:
+            # Paths being written are included so callers wait for those writes too
+            return [path for path in set(self._pending) | self._writing
+                    if path == full_path or path.startswith(prefix)]
+
+    def _stripe(self, full_path):
+        return self._stripes[hash(full_path) % len(self._stripes)]
+
+    def _write(self, full_path):
+        with self._stripe(full_path):
+            with self._lock:
+                entry = self._pending.pop(full_path, None)
+                if entry is None:
+                    return
+                self._writing.add(full_path)
+            try:
+                self.writer(full_path, entry["content"], entry["context"])
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Error writing buffered save of {full_path}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._writing.discard(full_path)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    now = time.monotonic()
+                    due = [path for path, entry in self._pending.items() if entry["due"] <= now]
+                    if due:
+                        break
+                    next_due = min((entry["due"] for entry in self._pending.values()), default=None)
+                    self._wakeup.wait(None if next_due is None else next_due - now)
+                if self._closed:
+                    return
+
+            if self.app is not None:
+                with self.app.app_context():
+                    for path in due:
+                        self._write(path)
+            else:
+                for path in due:
+                    self._write(path)
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_write_coalescer(writer):
+    """Get the process-wide write coalescer, creating it from app config on first use"""
+    global _coalescer
+    with _coalescer_lock:
+        if _coalescer is None:
+            config = current_app.config
+            _coalescer = WriteCoalescer(
+                writer,
+                delay=config.get('FILE_WRITE_COALESCE_DELAY', 0.5),
+                max_delay=config.get('FILE_WRITE_COALESCE_MAX_DELAY', 2.0),
+                app=current_app._get_current_object()
+            )
+            atexit.register(_coalescer.shutdown)
+    return _coalescer
+
+
+def shutdown_write_coalescer():
+    """Write out every held save and forget the coalescer"""
+    global _coalescer
+    with _coalescer_lock:
+        coalescer, _coalescer = _coalescer, None
+    if coalescer:
+        coalescer.shutdown()
+
+
+def peek_write_coalescer():
+    """Return the coalescer if it has been created, without creating it"""
+    return _coalescer
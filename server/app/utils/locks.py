@@ -0,0 +1,137 @@
+# server/app/utils/locks.py
+import threading
+import weakref
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Any number of readers or one writer
+    Writers are preferred: once one is waiting, new readers queue behind it,
+    so a steady stream of reads cannot hold a write off forever. The thread
+    holding the write lock may take it, or the read lock, again.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self, timeout=None):
+        """Take the read lock; returns False if timeout seconds pass first"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            if not self._cond.wait_for(lambda: self._writer is None and not self._waiting_writers, timeout):
+                return False
+            self._readers += 1
+            return True
+
+    def release_read(self):
+        with self._cond:
+            if self._writer == threading.get_ident():
+                self._write_depth -= 1
+                return
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self, timeout=None):
+        """Take the write lock; returns False if timeout seconds pass first"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            self._waiting_writers += 1
+            try:
+                acquired = self._cond.wait_for(lambda: self._writer is None and not self._readers, timeout)
+            finally:
+                self._waiting_writers -= 1
+            if not acquired:
+                # Readers held back for this writer may go ahead
+                self._cond.notify_all()
+                return False
+            self._writer = me
+            self._write_depth = 1
+            return True
+
+    def release_write(self):
+        with self._cond:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self, timeout=None):
+        """Hold the read lock for a block; raises TimeoutError if it cannot be taken in time"""
+        if not self.acquire_read(timeout):
+            raise TimeoutError("Timed out waiting for a read lock")
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self, timeout=None):
+        """Hold the write lock for a block; raises TimeoutError if it cannot be taken in time"""
+        if not self.acquire_write(timeout):
+            raise TimeoutError("Timed out waiting for a write lock")
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def state(self):
+        with self._cond:
+            return {
+                "readers": self._readers,
+                "writing": self._writer is not None,
+                "waiting_writers": self._waiting_writers
+            }
+
+
+class LockTable:
+    """
+    Read/write locks created on demand per key
+    A key's lock is dropped once nothing holds or waits on it, so the
+    table only ever contains the keys in use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = weakref.WeakValueDictionary()
+
+    def get(self, key):
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = ReadWriteLock()
+                self._locks[key] = lock
+            return lock
+
+    @contextmanager
+    def read(self, key, timeout=None):
+        with self.get(key).read(timeout):
+            yield
+
+    @contextmanager
+    def write(self, key, timeout=None):
+        with self.get(key).write(timeout):
+            yield
+
+    def stats(self):
+        with self._lock:
+            locks = list(self._locks.values())
+        states = [lock.state() for lock in locks]
+        return {
+            "keys": len(states),
+            "readers": sum(state["readers"] for state in states),
+            "writers": sum(1 for state in states if state["writing"]),
+            "waiting_writers": sum(state["waiting_writers"] for state in states)
+        }
@@ -0,0 +1,8 @@
+# server/app/utils/sse.py
+import json
+
+
+def format_events(events):
+    """Format (event, data) tuples as server-sent events"""
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,128 @@
+# server/app/utils/text_patch.py
+import re
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def apply_edits(text, edits):
+    """
+    Apply range edits to text
+    Each edit has start_line, start_column, end_line, end_column (1-based,
+    end exclusive, counted in characters) and the replacement text. All
+    ranges refer to the original text and must not overlap.
+    """
+    line_starts = [0]
+    for i, char in enumerate(text):
+        if char == "\n":
+            line_starts.append(i + 1)
+
+    def offset(line, column, number):
+        if not isinstance(line, int) or not isinstance(column, int) or line < 1 or column < 1:
+            raise ValueError(f"Edit {number}: positions must be 1-based integers")
+        if line > len(line_starts):
+            raise ValueError(f"Edit {number}: line {line} is past the end of the file")
+        start = line_starts[line - 1]
+        end = line_starts[line] - 1 if line < len(line_starts) else len(text)
+        if column - 1 > end - start:
+            raise ValueError(f"Edit {number}: column {column} is past the end of line {line}")
+        return start + column - 1
+
+    spans = []
+    for number, edit in enumerate(edits, 1):
+        if not isinstance(edit, dict):
+            raise ValueError(f"Edit {number} must be an object")
+        replacement = edit.get("text", "")
+        if not isinstance(replacement, str):
+            raise ValueError(f"Edit {number}: text must be a string")
+        start = offset(edit.get("start_line"), edit.get("start_column"), number)
+        end = offset(edit.get("end_line"), edit.get("end_column"), number)
+        if end < start:
+            raise ValueError(f"Edit {number}: range ends before it starts")
+        spans.append((start, end, replacement, number))
+
+    spans.sort(key=lambda span: (span[0], span[1]))
+    pieces = []
+    position = 0
+    for start, end, replacement, number in spans:
+        if start < position:
+            raise ValueError(f"Edit {number} overlaps another edit")
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def apply_unified_diff(text, diff):
+    """
+    Apply a unified diff to text
+    File headers (---/+++) are optional. Every context and removed line
+    must match the text exactly at the hunk's stated position; there is no
+    fuzzy matching.
+    """
+    lines = _split_lines(text)
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise ValueError("Diff contains no hunks")
+
+    output = []
+    position = 0
+    for number, (old_start, old_count, body) in enumerate(hunks, 1):
+        # A hunk that only adds lines names the line before the insertion
+        start = old_start - 1 if old_count else old_start
+        if start < position or start > len(lines):
+            raise ValueError(f"Hunk {number} is out of order or past the end of the file")
+        output.extend(lines[position:start])
+        position = start
+
+        for kind, content in body:
+            if kind in " -":
+                if position >= len(lines) or lines[position] != content:
+                    raise ValueError(f"Hunk {number} does not apply at line {position + 1}")
+                position += 1
+            if kind in " +":
+                output.append(content)
+
+    output.extend(lines[position:])
+    return "".join(output)
+
+
+def _parse_hunks(diff):
+    """Split a unified diff into (old_start, old_count, [(kind, line)]) hunks"""
+    hunks = []
+    body = None
+    for raw in _split_lines(diff):
+        header = HUNK_HEADER.match(raw)
+        if header:
+            old_count = int(header.group(2)) if header.group(2) is not None else 1
+            body = []
+            hunks.append((int(header.group(1)), old_count, body))
+        elif body is None:
+            # File headers and anything else before the first hunk
+            continue
+        elif raw.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it
+            if body:
+                kind, content = body[-1]
+                body[-1] = (kind, content.rstrip("\r\n"))
+        elif raw[:1] in (" ", "-", "+"):
+            content = raw[1:]
+            if not content.endswith("\n"):
+                content += "\n"
+            body.append((raw[0], content))
+        elif raw.strip() == "":
+            # Some tools drop the leading space of blank context lines
+            body.append((" ", "\n"))
+        else:
+            raise ValueError(f"Unexpected line in diff: {raw.rstrip()[:80]}")
+    return hunks
+
+
+def _split_lines(text):
+    """Split on \n only, keeping line endings; str.splitlines also breaks on \f, \x1c and others"""
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
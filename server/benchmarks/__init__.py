@@ -0,0 +1,5 @@
+# server/benchmarks/__init__.py
+"""
+Benchmarks for the Cloud IDE backend
+Run from the server directory, e.g. `python -m benchmarks.injection_benchmark`
+"""
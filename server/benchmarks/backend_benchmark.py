@@ -0,0 +1,58 @@
+# server/benchmarks/backend_benchmark.py
+"""
+Compare execution backends on the same programs
+
+Runs each language's program through every selected backend and reports
+latency percentiles, mean create/run phase times and the CPU time and peak
+memory each engine measured. The docker backend needs a running daemon;
+the local backend needs the language toolchains on the host PATH.
+
+Usage: python -m benchmarks.backend_benchmark [--runs 20] [--backends docker,local]
+                                              [--languages python,javascript]
+"""
+import argparse
+
+from benchmarks.harness import PROGRAMS, make_app, print_table, run_series, summarize
+from app.services.execution_backends import BACKENDS, shutdown_execution_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--languages", default=",".join(sorted(PROGRAMS)))
+    parser.add_argument("--no-pool", action="store_true",
+                        help="use single-use containers for the docker backend")
+    args = parser.parse_args()
+
+    app = make_app(CONTAINER_POOL_ENABLED=not args.no_pool)
+    rows = []
+    for backend in args.backends.split(","):
+        app.config['EXECUTION_BACKEND'] = backend
+        # Give a fresh container pool time to fill before measuring
+        settle = 5 if backend == "docker" and not args.no_pool else 0.0
+        for language in args.languages.split(","):
+            row = summarize(run_series(app, language, args.runs, settle=settle))
+            row["name"] = f"{backend}/{language}"
+            for field in ("peak_memory", "sampled_memory"):
+                if row[field] is not None:
+                    row[field] = row[field] / (1024 * 1024)
+            rows.append(row)
+
+    print_table(rows, [
+        ("name", "backend", 20, ""),
+        ("mean", "mean", 9, ".3f"),
+        ("p50", "p50", 9, ".3f"),
+        ("p95", "p95", 9, ".3f"),
+        ("create", "create", 9, ".3f"),
+        ("run", "run", 9, ".3f"),
+        ("cpu_time", "cpu s", 9, ".3f"),
+        ("peak_memory", "peak MiB", 10, ".1f"),
+        ("sampled_memory", "sampled MiB", 13, ".1f"),
+        ("errors", "errors", 8, "d")
+    ])
+    shutdown_execution_backend()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# server/benchmarks/cold_tier_benchmark.py
+"""
+Measure what the cold file tier saves and what it costs to read back
+
+Builds a synthetic workspace of source, JSON, log and binary files in a
+temporary storage directory, then for each codec reports the bytes the
+tier saves, how long a compression pass takes, and read_file latency for
+hot files, for the first read of a cold file (which thaws it) and for
+the read after that. Needs no Docker daemon.
+
+Usage: python -m benchmarks.cold_tier_benchmark [--files 500] [--codecs gzip,zstd]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.harness import make_app, print_table
+from app.services.cold_tier import get_cold_tier, shutdown_cold_tier, zstandard
+from app.services.storage_service import read_file
+
+USER_ID = "benchmark"
+
+
+def source_file(rng, lines):
+    names = ["value", "total", "items", "result", "config", "handler", "request", "index"]
+    body = []
+    for number in range(lines):
+        name = rng.choice(names)
+        body.append(f"    {name}_{number % 17} = compute_{rng.choice(names)}({name}, {rng.randint(0, 999)})\n")
+    return "def function():\n" + "".join(body) + "    return None\n"
+
+
+def json_file(rng, records):
+    return json.dumps([{"id": i, "name": f"item-{rng.randint(0, 99999)}", "tags": ["a", "b", "c"][:i % 4],
+                        "active": bool(i % 2)} for i in range(records)], indent=2)
+
+
+def log_file(rng, lines):
+    levels = ["INFO", "DEBUG", "WARNING"]
+    return "".join(f"2024-01-01 12:{i % 60:02d}:{rng.randint(0, 59):02d} {rng.choice(levels)} "
+                   f"request {rng.randint(0, 10 ** 6)} handled in {rng.random():.3f}s\n" for i in range(lines))
+
+
+def build_workspace(user_path, files, seed=1):
+    """Write files of mixed kinds and sizes; returns their storage-relative paths"""
+    rng = random.Random(seed)
+    paths = []
+    for number in range(files):
+        kind = number % 4
+        path = os.path.join(f"project{number % 5}", f"dir{number % 13}", f"file{number}")
+        full_path = os.path.join(user_path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if kind == 3:
+            # Already-compressed data, such as images, that the tier should leave alone
+            with open(full_path, "wb") as f:
+                f.write(rng.randbytes(rng.randint(4096, 65536)))
+        else:
+            content = (source_file(rng, rng.randint(50, 2000)) if kind == 0 else
+                       json_file(rng, rng.randint(50, 1000)) if kind == 1 else
+                       log_file(rng, rng.randint(100, 3000)))
+            with open(full_path, "w") as f:
+                f.write(content)
+        paths.append(path)
+
+    # Age everything past the cold threshold
+    old = time.time() - 86400
+    for path in paths:
+        os.utime(os.path.join(user_path, path), (old, old))
+    return paths
+
+
+def disk_bytes(root):
+    return sum(os.lstat(os.path.join(directory, name)).st_size
+               for directory, _, names in os.walk(root) for name in names)
+
+
+def time_reads(paths):
+    """Milliseconds per read_file call, sorted"""
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        read_file(USER_ID, path, offset=0, length=2 * 1024 * 1024)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_codec(codec, files):
+    storage_path = tempfile.mkdtemp(prefix="cold-tier-benchmark-")
+    app = make_app(STORAGE_PATH=storage_path, COLD_TIER_ENABLED=True, COLD_TIER_CODEC=codec,
+                   COLD_TIER_AFTER=3600, COLD_TIER_INTERVAL=0, QUOTA_ENABLED=False,
+                   WORKSPACE_INDEX_ENABLED=False)
+    try:
+        with app.app_context():
+            shutdown_cold_tier()
+            user_path = os.path.join(storage_path, USER_ID)
+            paths = build_workspace(user_path, files)
+            logical = disk_bytes(user_path)
+            hot = time_reads(paths)
+
+            # Reads refresh access times, so age the files again before the pass
+            old = time.time() - 86400
+            for path in paths:
+                os.utime(os.path.join(user_path, path), (old, old))
+
+            tier = get_cold_tier()
+            start = time.perf_counter()
+            result = tier.run()
+            pass_time = time.perf_counter() - start
+            physical = disk_bytes(user_path)
+
+            cold = time_reads(paths)
+            warm = time_reads(paths)
+            shutdown_cold_tier()
+    finally:
+        shutil.rmtree(storage_path, ignore_errors=True)
+
+    return {
+        "codec": codec,
+        "files": len(paths),
+        "compressed": result["files"],
+        "logical_mib": logical / (1024 * 1024),
+        "physical_mib": physical / (1024 * 1024),
+        "saved_pct": 100.0 * (logical - physical) / logical if logical else 0.0,
+        "pass_s": pass_time,
+        "hot_p50": percentile(hot, 0.5),
+        "cold_p50": percentile(cold, 0.5),
+        "cold_p95": percentile(cold, 0.95),
+        "rehot_p50": percentile(warm, 0.5)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--codecs", default="gzip,zstd")
+    args = parser.parse_args()
+
+    rows = []
+    for codec in args.codecs.split(","):
+        if codec == "zstd" and zstandard is None:
+            print("zstandard is not installed; skipping zstd")
+            continue
+        rows.append(run_codec(codec, args.files))
+
+    print_table(rows, [
+        ("codec", "codec", 8, ""),
+        ("files", "files", 7, "d"),
+        ("compressed", "cold", 7, "d"),
+        ("logical_mib", "MiB", 9, ".2f"),
+        ("physical_mib", "on disk", 9, ".2f"),
+        ("saved_pct", "saved %", 9, ".1f"),
+        ("pass_s", "pass s", 9, ".3f"),
+        ("hot_p50", "hot ms", 9, ".3f"),
+        ("cold_p50", "thaw p50", 10, ".3f"),
+        ("cold_p95", "thaw p95", 10, ".3f"),
+        ("rehot_p50", "after ms", 10, ".3f")
+    ])
+
+
+if __name__ == "__main__":
+    main()
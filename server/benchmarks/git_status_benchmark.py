@@ -0,0 +1,151 @@
+# server/benchmarks/git_status_benchmark.py
+"""
+Compare git status strategies on a large repository
+
+Builds a throwaway repository with many committed files, then leaves some
+modified, deleted, staged and untracked. Times the original GitPython
+status (is_dirty, untracked_files and two index diffs, four scans of the
+tree), the single `git status --porcelain=v2` run, and a cached lookup.
+Checks that the two uncached strategies agree. Needs the git command
+line; the GitPython row is skipped if GitPython is not installed.
+
+Usage: python -m benchmarks.git_status_benchmark [--files 20000] [--runs 10]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from benchmarks.harness import print_table
+from app.services.repo_status import StatusCache, read_status
+
+try:
+    import git
+except ImportError:
+    git = None
+
+
+def run_git(path, *args):
+    subprocess.run(["git", *args], cwd=path, check=True, capture_output=True)
+
+
+def build_repository(path, files, per_directory=200):
+    """Commit files spread over directories, then leave a mix of changes behind"""
+    run_git(path, "init", "-q")
+    run_git(path, "config", "user.email", "benchmark@cloud-ide.example.com")
+    run_git(path, "config", "user.name", "benchmark")
+    paths = []
+    for number in range(files):
+        directory = os.path.join(path, f"src{number // per_directory}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module{number}.py"), "w") as f:
+            f.write(f"VALUE = {number}\n" * 20)
+        paths.append(os.path.join(directory, f"module{number}.py"))
+    run_git(path, "add", ".")
+    run_git(path, "commit", "-q", "-m", "initial")
+
+    changed = max(1, files // 200)
+    for full_path in paths[:changed]:
+        with open(full_path, "a") as f:
+            f.write("CHANGED = True\n")
+    for full_path in paths[changed:2 * changed]:
+        os.remove(full_path)
+    for full_path in paths[2 * changed:3 * changed]:
+        with open(full_path, "a") as f:
+            f.write("STAGED = True\n")
+        run_git(path, "add", os.path.relpath(full_path, path))
+    os.makedirs(os.path.join(path, "scratch"), exist_ok=True)
+    for number in range(changed):
+        with open(os.path.join(path, "scratch", f"note{number}.txt"), "w") as f:
+            f.write("untracked\n")
+
+
+def gitpython_status(path):
+    """The status implementation this benchmark measures against"""
+    repo = git.Repo(path)
+    try:
+        modified_files, staged_files, deleted_files = [], [], []
+        for item in repo.index.diff(None):
+            if item.change_type == 'M':
+                modified_files.append(item.a_path)
+            elif item.change_type == 'D':
+                deleted_files.append(item.a_path)
+        for item in repo.index.diff('HEAD'):
+            staged_files.append(item.a_path)
+        return {
+            "branch": repo.active_branch.name,
+            "is_dirty": repo.is_dirty(),
+            "untracked_files": repo.untracked_files,
+            "modified_files": modified_files,
+            "staged_files": staged_files,
+            "deleted_files": deleted_files
+        }
+    finally:
+        repo.close()
+
+
+def time_runs(function, runs):
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    }, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="git-status-benchmark-")
+    try:
+        start = time.perf_counter()
+        build_repository(path, args.files)
+        print(f"Built a repository of {args.files} files in {time.perf_counter() - start:.1f}s")
+
+        rows = []
+        porcelain_timing, porcelain = time_runs(lambda: read_status(path), args.runs)
+        if git is not None:
+            timing, legacy = time_runs(lambda: gitpython_status(path), args.runs)
+            rows.append(dict(timing, strategy="gitpython"))
+            for key in porcelain:
+                if key == "is_dirty" or key == "branch":
+                    same = legacy[key] == porcelain[key]
+                else:
+                    same = sorted(legacy[key]) == sorted(porcelain[key])
+                if not same:
+                    print(f"Results differ in {key}: {legacy[key]!r} != {porcelain[key]!r}")
+        else:
+            print("GitPython is not installed; skipping the GitPython strategy")
+        rows.append(dict(porcelain_timing, strategy="porcelain v2"))
+
+        cache = StatusCache(path, ttl=3600)
+        cache.get("benchmark", path)
+        timing, _ = time_runs(lambda: cache.get("benchmark", path), args.runs)
+        rows.append(dict(timing, strategy="cached"))
+
+        print(f"{len(porcelain['modified_files'])} modified, {len(porcelain['deleted_files'])} deleted, "
+              f"{len(porcelain['staged_files'])} staged, {len(porcelain['untracked_files'])} untracked")
+        print_table(rows, [
+            ("strategy", "strategy", 16, ""),
+            ("mean", "mean ms", 12, ".2f"),
+            ("p50", "p50 ms", 12, ".2f"),
+            ("p95", "p95 ms", 12, ".2f")
+        ])
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# server/benchmarks/harness.py
+"""
+Shared helpers for the execution benchmarks
+
+Every execution backend reports results with the same schema, so the
+benchmarks build an app, time execute_code() runs and summarise latency,
+phases and resource use the same way whichever engine is configured.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+from app.config import Config
+from app.services.execution_backends import shutdown_execution_backend
+from app.services.executor_service import execute_code
+
+PROGRAMS = {
+    "python": "import sys\nprint(sum(int(x) for x in sys.stdin.read().split()))\n",
+    "javascript": "let d='';process.stdin.on('data',c=>d+=c).on('end',()=>"
+                  "console.log(d.split(/\\s+/).filter(Boolean).map(Number).reduce((a,b)=>a+b,0)));\n",
+    "java": "import java.util.*;\npublic class Main { public static void main(String[] a) {"
+            " Scanner s = new Scanner(System.in); long t = 0; while (s.hasNextLong()) t += s.nextLong();"
+            " System.out.println(t); } }\n"
+}
+
+BENCHMARK_INPUT = "1 2 3"
+
+
+def make_app(**overrides):
+    """Build a bare app from Config with caching off, so every run really executes"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['RESULT_CACHE_ENABLED'] = False
+    app.config['JAVA_COMPILE_CACHE_ENABLED'] = False
+    app.config.update(overrides)
+    return app
+
+
+def run_series(app, language, runs, warmup=1, settle=0.0, before_measure=None):
+    """
+    Execute the language's program runs times under the app's current config
+    The backend is rebuilt first so it picks up config changes; warm-up runs
+    and the settle delay (e.g. for pool warming) are not measured, and
+    before_measure() is called just before the measured runs start.
+    Returns the list of (wall_time, result) pairs
+    """
+    code = PROGRAMS[language]
+    with app.app_context():
+        shutdown_execution_backend()
+        for _ in range(warmup):
+            execute_code("benchmark", language, code, BENCHMARK_INPUT)
+        if settle:
+            time.sleep(settle)
+        if before_measure:
+            before_measure()
+
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = execute_code("benchmark", language, code, BENCHMARK_INPUT)
+            samples.append((time.perf_counter() - start, result))
+    return samples
+
+
+def summarize(samples):
+    """Latency percentiles, error count and mean phase and resource figures"""
+    timings = sorted(wall for wall, _ in samples)
+    results = [result for _, result in samples]
+
+    def mean_of(values):
+        values = [value for value in values if value is not None]
+        return statistics.mean(values) if values else None
+
+    return {
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "errors": sum(1 for result in results if result.get("exit_code") != 0),
+        "create": mean_of(result["phases"]["create"] for result in results),
+        "run": mean_of(result["phases"]["run"] for result in results),
+        "cpu_time": mean_of(result["resources"]["cpu_time"] for result in results),
+        "peak_memory": mean_of(result["resources"]["peak_memory"] for result in results),
+        "sampled_memory": mean_of(result["resources"]["sampled_memory"] for result in results)
+    }
+
+
+def print_table(rows, columns):
+    """Print rows (dicts) as a fixed-width table; columns are (key, header, width, format)"""
+    print("".join(f"{header:<{width}}" if index == 0 else f"{header:>{width}}"
+                  for index, (_, header, width, _) in enumerate(columns)))
+    for row in rows:
+        cells = []
+        for index, (key, _, width, spec) in enumerate(columns):
+            value = row.get(key)
+            text = "-" if value is None else format(value, spec)
+            cells.append(f"{text:<{width}}" if index == 0 else f"{text:>{width}}")
+        print("".join(cells))
@@ -0,0 +1,71 @@
+# server/benchmarks/injection_benchmark.py
+"""
+Compare code injection modes for single-use execution containers
+
+Runs the same small program through the bind-mount, put_archive and
+stdin/tmpfs paths (and the warm pool for reference) and reports latency
+percentiles plus the number of host temp directories each mode created.
+Requires a running Docker daemon.
+
+Usage: python -m benchmarks.injection_benchmark [--runs 20] [--language python]
+"""
+import argparse
+import tempfile
+
+from benchmarks.harness import PROGRAMS, make_app, print_table, run_series, summarize
+from app.services.container_pool import INJECTION_MODES
+from app.services.execution_backends import shutdown_execution_backend
+
+created_temp_dirs = []
+_mkdtemp = tempfile.mkdtemp
+
+
+def _counting_mkdtemp(*args, **kwargs):
+    path = _mkdtemp(*args, **kwargs)
+    created_temp_dirs.append(path)
+    return path
+
+
+tempfile.mkdtemp = _counting_mkdtemp
+
+
+def run_mode(app, language, runs, mode, pooled):
+    app.config['EXECUTION_INJECTION_MODE'] = mode
+    app.config['CONTAINER_POOL_ENABLED'] = pooled
+
+    # Count only the measured runs, not the warm-up
+    def reset_count():
+        del created_temp_dirs[:]
+
+    samples = run_series(app, language, runs, settle=5 if pooled else 0.0,
+                         before_measure=reset_count)
+    row = summarize(samples)
+    row["mode"] = f"pool/{mode}" if pooled else mode
+    row["temp_dirs"] = len(created_temp_dirs)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--language", choices=sorted(PROGRAMS), default="python")
+    args = parser.parse_args()
+
+    app = make_app(EXECUTION_BACKEND="docker")
+    rows = [run_mode(app, args.language, args.runs, mode, pooled=False) for mode in INJECTION_MODES]
+    rows.append(run_mode(app, args.language, args.runs, "archive", pooled=True))
+    rows.append(run_mode(app, args.language, args.runs, "stdin", pooled=True))
+
+    print_table(rows, [
+        ("mode", "mode", 16, ""),
+        ("mean", "mean", 10, ".3f"),
+        ("p50", "p50", 10, ".3f"),
+        ("p95", "p95", 10, ".3f"),
+        ("errors", "errors", 8, "d"),
+        ("temp_dirs", "temp dirs", 11, "d")
+    ])
+    shutdown_execution_backend()
+
+
+if __name__ == "__main__":
+    main()
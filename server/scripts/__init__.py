@@ -0,0 +1,5 @@
+# server/scripts/__init__.py
+"""
+Maintenance scripts for the Cloud IDE backend
+Run from the server directory, e.g. `python -m scripts.migrate_blob_store`
+"""
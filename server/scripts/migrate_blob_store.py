@@ -0,0 +1,100 @@
+# server/scripts/migrate_blob_store.py
+"""
+Move existing user storage into the content-addressed blob store
+
+Hashes every file under STORAGE_PATH (or only the given users) and
+replaces duplicates with hard links to a shared blob, then prints what
+was saved and the resulting dedup ratio. Safe to run while the server is
+up and to run again; files already linked to their blob are skipped.
+With --dry-run nothing is changed and only the potential saving is shown.
+
+Usage: python -m scripts.migrate_blob_store [--user 1 --user 2] [--dry-run]
+"""
+import argparse
+import os
+import stat
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+from app.config import Config
+from app.services.blob_store import file_digest, get_blob_store, shutdown_blob_store
+
+
+def user_ids(storage_path, only):
+    if only:
+        return only
+    # .blobs, .bulk and other dot directories are not user storage
+    return sorted(name for name in os.listdir(storage_path)
+                  if not name.startswith(".") and os.path.isdir(os.path.join(storage_path, name)))
+
+
+def estimate(root, min_bytes, seen):
+    """
+    Files, total bytes and bytes duplicates would save, without changing anything
+    seen carries the contents found so far, so duplicates of files in
+    earlier users' storage count too, as they would in the store.
+    """
+    files = total = saved = 0
+    for directory, dirs, names in os.walk(root):
+        if os.path.basename(directory) == ".git":
+            dirs[:] = [name for name in dirs if name == "objects"]
+            continue
+        for name in names:
+            full_path = os.path.join(directory, name)
+            file_stat = os.lstat(full_path)
+            if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < min_bytes:
+                continue
+            key = (file_digest(full_path), stat.S_IMODE(file_stat.st_mode))
+            files += 1
+            total += file_stat.st_size
+            if key in seen:
+                saved += file_stat.st_size
+            seen.add(key)
+    return {"files": files, "bytes": total, "bytes_saved": saved}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--user", action="append", dest="users", help="migrate only this user ID")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['BLOB_STORE_ENABLED'] = True
+    app.config['BLOB_STORE_GC_INTERVAL'] = 0
+    storage_path = app.config['STORAGE_PATH']
+
+    with app.app_context():
+        if args.dry_run:
+            seen = set()
+            totals = {"files": 0, "bytes": 0, "bytes_saved": 0}
+            for user_id in user_ids(storage_path, args.users):
+                result = estimate(os.path.join(storage_path, user_id), app.config['BLOB_STORE_MIN_BYTES'], seen)
+                print(f"user {user_id}: {result['files']} files, {result['bytes']} bytes, "
+                      f"{result['bytes_saved']} bytes would be saved")
+                for key in totals:
+                    totals[key] += result[key]
+            physical = totals["bytes"] - totals["bytes_saved"]
+            ratio = round(totals["bytes"] / physical, 3) if physical else None
+            print(f"total: {totals['files']} files, {totals['bytes']} bytes, "
+                  f"{totals['bytes_saved']} bytes would be saved, dedup ratio {ratio}")
+            return
+
+        store = get_blob_store()
+        for user_id in user_ids(storage_path, args.users):
+            result = store.adopt_tree(os.path.join(storage_path, user_id))
+            print(f"user {user_id}: {result['files']} files, {result['deduplicated']} linked to "
+                  f"existing blobs, {result['bytes_saved']} bytes saved")
+        store.gc()
+        stats = store.stats()
+        print(f"store: {stats['blobs']} blobs, {stats['logical_bytes']} logical bytes, "
+              f"{stats['physical_bytes']} physical bytes, dedup ratio {stats['dedup_ratio']}")
+        shutdown_blob_store()
+
+
+if __name__ == "__main__":
+    main()
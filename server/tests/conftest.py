@@ -0,0 +1,6 @@
+# server/tests/conftest.py
+import os
+import sys
+
+# Let tests import the app package however pytest is started
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
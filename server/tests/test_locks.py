@@ -0,0 +1,76 @@
+# server/tests/test_locks.py
+import threading
+
+from app.utils.locks import LockTable, ReadWriteLock
+
+
+def in_thread(target):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target()))
+    thread.start()
+    thread.join(5)
+    return result[0]
+
+
+def test_writer_may_take_the_lock_again_and_read():
+    lock = ReadWriteLock()
+    with lock.write():
+        with lock.write(timeout=0.1):
+            with lock.read(timeout=0.1):
+                assert lock.state() == {"readers": 0, "writing": True, "waiting_writers": 0}
+        assert lock.state()["writing"]
+        assert not in_thread(lambda: lock.acquire_read(timeout=0.05))
+    assert lock.state()["writing"] is False
+    assert in_thread(lambda: lock.acquire_write(timeout=0.05))
+
+
+def test_readers_share_the_lock_and_hold_writers_off():
+    lock = ReadWriteLock()
+    with lock.read():
+        assert in_thread(lambda: lock.acquire_read(timeout=0.05))
+        lock.release_read()
+        assert not in_thread(lambda: lock.acquire_write(timeout=0.05))
+    assert in_thread(lambda: lock.acquire_write(timeout=0.05))
+
+
+def test_waiting_writer_holds_new_readers_back():
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with lock.write():
+            acquired.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(100):
+            if lock.state()["waiting_writers"]:
+                break
+            threading.Event().wait(0.01)
+        assert lock.state()["waiting_writers"] == 1
+        # The existing reader keeps its lock, but a new one has to wait
+        assert not in_thread(lambda: lock.acquire_read(timeout=0.05))
+        lock.release_read()
+        assert acquired.wait(5)
+    finally:
+        release.set()
+        thread.join(5)
+    assert lock.state() == {"readers": 0, "writing": False, "waiting_writers": 0}
+
+
+def test_writer_that_times_out_lets_readers_through():
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    assert not in_thread(lambda: lock.acquire_write(timeout=0.05))
+    assert in_thread(lambda: lock.acquire_read(timeout=0.05))
+
+
+def test_lock_table_drops_unused_keys():
+    table = LockTable()
+    with table.write("a"), table.read("b"):
+        assert table.stats() == {"keys": 2, "readers": 1, "writers": 1, "waiting_writers": 0}
+    assert table.stats()["keys"] == 0
@@ -0,0 +1,76 @@
+# server/tests/test_repo_status.py
+import subprocess
+
+from app.services.repo_status import parse_porcelain_v2, read_status
+
+SCHEMA = {"branch", "is_dirty", "untracked_files", "modified_files", "staged_files", "deleted_files"}
+
+
+def porcelain(*records):
+    return "".join(record + "\0" for record in records)
+
+
+def test_parses_branch_and_each_kind_of_change():
+    status = parse_porcelain_v2(porcelain(
+        "# branch.oid 1f2e3d4c5b6a",
+        "# branch.head feature/status",
+        "1 .M N... 100644 100644 100644 aaaa bbbb src/edited.py",
+        "1 .D N... 100644 100644 000000 aaaa aaaa gone.txt",
+        "1 A. N... 000000 100644 100644 0000 cccc new file.txt",
+        "1 MM N... 100644 100644 100644 aaaa cccc both.py",
+        "2 R. N... 100644 100644 100644 aaaa aaaa R100 renamed.py",
+        "original.py",
+        "u UU N... 100644 100644 100644 100644 aaaa bbbb cccc conflict.py",
+        "? notes.md",
+    ))
+    assert set(status) == SCHEMA
+    assert status["branch"] == "feature/status"
+    assert status["is_dirty"]
+    assert status["untracked_files"] == ["notes.md"]
+    assert status["modified_files"] == ["src/edited.py", "both.py", "conflict.py"]
+    assert status["staged_files"] == ["new file.txt", "both.py", "renamed.py"]
+    assert status["deleted_files"] == ["gone.txt"]
+
+
+def test_detached_head_has_no_branch():
+    status = parse_porcelain_v2(porcelain("# branch.oid 1f2e3d4c5b6a", "# branch.head (detached)"))
+    assert status["branch"] is None
+    assert not status["is_dirty"]
+
+
+def test_untracked_files_alone_do_not_make_the_repository_dirty():
+    status = parse_porcelain_v2(porcelain("# branch.head main", "? a.txt", "? dir/b.txt"))
+    assert not status["is_dirty"]
+    assert status["untracked_files"] == ["a.txt", "dir/b.txt"]
+
+
+def git(path, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   cwd=path, check=True, capture_output=True)
+
+
+def test_matches_the_gitpython_status_schema(tmp_path):
+    # Expected values are what git_status built from GitPython: active_branch,
+    # is_dirty(), untracked_files, index.diff(None) M/D and index.diff('HEAD')
+    git(tmp_path, "init", "-q", "-b", "main")
+    for name in ("modified.txt", "deleted.txt", "staged.txt"):
+        (tmp_path / name).write_text(f"{name}\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "initial")
+
+    (tmp_path / "modified.txt").write_text("changed\n")
+    (tmp_path / "deleted.txt").unlink()
+    (tmp_path / "staged.txt").write_text("changed\n")
+    (tmp_path / "added.txt").write_text("added\n")
+    git(tmp_path, "add", "staged.txt", "added.txt")
+    (tmp_path / "untracked").mkdir()
+    (tmp_path / "untracked" / "file.txt").write_text("untracked\n")
+
+    assert read_status(str(tmp_path)) == {
+        "branch": "main",
+        "is_dirty": True,
+        "untracked_files": ["untracked/file.txt"],
+        "modified_files": ["modified.txt"],
+        "staged_files": ["added.txt", "staged.txt"],
+        "deleted_files": ["deleted.txt"]
+    }
@@ -0,0 +1,81 @@
+# server/tests/test_search_index.py
+import time
+
+import pytest
+
+from app.services.search_index import RegexScanner, SearchIndex, nested_repeats, required_literals
+
+
+@pytest.fixture
+def index(tmp_path):
+    root = tmp_path / "storage"
+    root.mkdir()
+    index = SearchIndex(str(root), str(tmp_path / "index" / "search.sqlite3"))
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def scanner():
+    scanner = RegexScanner(max_workers=1)
+    yield scanner
+    scanner.shutdown()
+
+
+@pytest.mark.parametrize("pattern, literals", [
+    (r"def main", ["def main"]),
+    (r"foo\.bar\d+baz", ["foo.bar", "baz"]),
+    (r"hello+world", ["hello", "world"]),
+    (r"colou?r_name", ["colo", "r_name"]),
+    (r"ab(cde)fgh", ["fgh"]),
+    (r"x[abc]yzw", ["yzw"]),
+    (r"abc{2}defg", ["defg"]),
+    (r"\bword\b", ["word"]),
+    (r"abc|xyz", None),
+])
+def test_required_literals(pattern, literals):
+    assert required_literals(pattern) == literals
+
+
+@pytest.mark.parametrize("pattern, nested", [
+    (r"(a+)+", True),
+    (r"(a*)*b", True),
+    (r"(?:x+y)*", True),
+    (r"a+b+", False),
+    (r"(a{1,3})+", False),
+    (r"(a|a)*b", False),
+])
+def test_nested_repeats(pattern, nested):
+    assert nested_repeats(pattern) is nested
+
+
+@pytest.mark.parametrize("pattern, line", [
+    (r"(a|a)*b", "a" * 26),
+    (r".*.*.*x", "y" * 4096),
+])
+def test_backtracking_regex_is_stopped_at_the_budget(index, scanner, pattern, line):
+    with open(f"{index.root}/slow.txt", "w") as f:
+        f.write(line + "\n")
+
+    start = time.time()
+    result = index.search(pattern, regex=True, time_budget=0.5, max_line_length=4096, scanner=scanner)
+
+    assert time.time() - start < 5
+    assert result["truncated"]
+    assert result["matches"] == []
+    assert scanner.stats()["killed"] == 1
+
+
+def test_scanner_worker_is_reused_after_a_clean_search(index, scanner):
+    with open(f"{index.root}/main.py", "w") as f:
+        f.write("print('hello')\nhelp()\n")
+
+    for _ in range(2):
+        result = index.search(r"hel+o", regex=True, time_budget=5.0, scanner=scanner)
+        assert not result["truncated"]
+        assert [(match["line"], match["column"]) for match in result["matches"]] == [(1, 8)]
+
+    stats = scanner.stats()
+    assert stats["scans"] == 2
+    assert stats["killed"] == 0
+    assert stats["idle_workers"] == 1
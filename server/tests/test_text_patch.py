@@ -0,0 +1,69 @@
+# server/tests/test_text_patch.py
+import pytest
+
+from app.utils.text_patch import apply_edits, apply_unified_diff
+
+
+def edit(start_line, start_column, end_line, end_column, text):
+    return {"start_line": start_line, "start_column": start_column,
+            "end_line": end_line, "end_column": end_column, "text": text}
+
+
+def test_edits_refer_to_the_original_text():
+    text = "alpha\nbeta\ngamma\n"
+    edits = [edit(3, 1, 3, 6, "GAMMA"), edit(1, 1, 1, 1, "# "), edit(2, 5, 3, 1, "\n\n")]
+    assert apply_edits(text, edits) == "# alpha\nbeta\n\nGAMMA\n"
+
+
+def test_edit_may_end_at_the_end_of_a_file_without_a_newline():
+    assert apply_edits("one\ntwo", [edit(2, 1, 2, 4, "three")]) == "one\nthree"
+
+
+@pytest.mark.parametrize("edits, message", [
+    ([edit(1, 0, 1, 1, "")], "1-based"),
+    ([edit(4, 1, 4, 1, "")], "past the end of the file"),
+    ([edit(1, 7, 1, 7, "")], "past the end of line 1"),
+    ([edit(1, 3, 1, 2, "")], "ends before it starts"),
+    ([edit(1, 1, 1, 4, "x"), edit(1, 3, 1, 5, "y")], "overlaps"),
+    (["not an edit"], "must be an object"),
+])
+def test_invalid_edits_are_rejected(edits, message):
+    with pytest.raises(ValueError, match=message):
+        apply_edits("alpha\nbeta\n", edits)
+
+
+def test_unified_diff_with_several_hunks():
+    text = "".join(f"line {n}\n" for n in range(1, 11))
+    diff = (
+        "--- a/file.txt\n"
+        "+++ b/file.txt\n"
+        "@@ -1,3 +1,3 @@\n"
+        " line 1\n"
+        "-line 2\n"
+        "+line two\n"
+        " line 3\n"
+        "@@ -8,3 +8,4 @@\n"
+        " line 8\n"
+        " line 9\n"
+        "+line 9.5\n"
+        " line 10\n"
+    )
+    expected = text.replace("line 2\n", "line two\n").replace("line 9\n", "line 9\nline 9.5\n")
+    assert apply_unified_diff(text, diff) == expected
+
+
+def test_unified_diff_insertion_and_missing_newline():
+    assert apply_unified_diff("a\nb\n", "@@ -1,0 +2 @@\n+inserted\n") == "a\ninserted\nb\n"
+    diff = "@@ -2 +2 @@\n-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n"
+    assert apply_unified_diff("a\nb", diff) == "a\nc"
+
+
+@pytest.mark.parametrize("diff, message", [
+    ("--- a/file.txt\n+++ b/file.txt\n", "no hunks"),
+    ("@@ -1 +1 @@\n-x\n+y\n", "does not apply at line 1"),
+    ("@@ -2 +2 @@\n-b\n+B\n@@ -1 +1 @@\n-a\n+A\n", "out of order"),
+    ("@@ -1 +1 @@\n-a\n*a\n", "Unexpected line"),
+])
+def test_invalid_diffs_are_rejected(diff, message):
+    with pytest.raises(ValueError, match=message):
+        apply_unified_diff("a\nb\n", diff)